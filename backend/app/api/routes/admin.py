@@ -7,6 +7,7 @@
 # Description:
 # - Permet aux super-administrateurs de creer ou supprimer des utilisateurs.
 # - Reutilise AuthService pour la creation afin de beneficier des workflows existants.
+# - Recharge a chaud le trousseau de cles des messages (rotation).
 ############################################################
 """
 
@@ -20,8 +21,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from ...config import settings
+from ...core.executors import CRYPTO, offload
+from ...core.keyring import get_keyring
+from ...core.principal import publish_invalidation
 from ...dependencies import get_auth_service, get_audit_service, get_current_user, get_db
-from ...schemas.admin import AdminUserCreateRequest, AdminUserCreateResponse, AdminUserDeleteResponse
+from ...schemas.admin import (
+    AdminUserCreateRequest,
+    AdminUserCreateResponse,
+    AdminUserDeleteResponse,
+    KeyringReloadResponse,
+)
 from ...schemas.user import UserOut
 from ...services.auth_service import AuthService
 from ...services.audit_service import AuditService
@@ -121,7 +130,29 @@ async def delete_user_as_admin(
     )
     await db.delete(target)
     await db.commit()
+    await publish_invalidation(user_ids=[target.id])
 
     remove_avatar_file(avatar_url)
 
     return AdminUserDeleteResponse()
+
+
+@router.post("/keyring/reload", response_model=KeyringReloadResponse, status_code=status.HTTP_200_OK)
+async def reload_message_keyring(
+    current_user: UserAccount = Depends(get_current_user),
+    audit: AuditService = Depends(get_audit_service),
+) -> KeyringReloadResponse:
+    """Relit les cles de messages du processus courant (les autres workers : SIGHUP)."""
+    _require_superadmin(current_user)
+    keyring = get_keyring()
+    # Chargement PEM des cles RSA hors de la boucle d'evenements.
+    key_ids = await offload(CRYPTO, keyring.reload)
+    active = keyring.active
+    await audit.record(
+        "admin.keyring.reload",
+        user_id=str(current_user.id),
+        resource_type="keyring",
+        resource_id=active.key_id if active else None,
+    )
+    await audit.session.commit()
+    return KeyringReloadResponse(active_key_id=active.key_id if active else None, key_ids=key_ids)
@@ -159,7 +159,7 @@ async def login(
 async def refresh_tokens(payload: RefreshRequest, service: AuthService = Depends(get_auth_service)) -> AuthSession:
     """Recrée un couple de tokens à partir d'un refresh valide."""
     auth_result = await service.refresh_session(payload.refresh_token)
-    await service.session.commit()
+    await service.commit()
     return _build_auth_session(auth_result)
 
 
@@ -167,7 +167,7 @@ async def refresh_tokens(payload: RefreshRequest, service: AuthService = Depends
 async def logout(payload: RefreshRequest, service: AuthService = Depends(get_auth_service)) -> LogoutResponse:
     """Révoque un refresh token et sa session associée."""
     await service.revoke_refresh_token(payload.refresh_token)
-    await service.session.commit()
+    await service.commit()
     return LogoutResponse()
 
 
@@ -179,5 +179,5 @@ async def logout_all(
     """Révoque toutes les sessions de l'utilisateur courant."""
     current_session_id = getattr(current_user, "current_session_id", None)
     revoked = await service.revoke_all_tokens(current_user, keep_session_id=current_session_id)
-    await service.session.commit()
+    await service.commit()
     return LogoutAllResponse(revoked_count=revoked)
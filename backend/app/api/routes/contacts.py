@@ -96,7 +96,7 @@ async def create_contact(
 ) -> ContactOut:
     """Cree une demande de contact et retourne la representation enrichie."""
     contact_link = await service.create_contact(current_user, target_email=payload.email, alias=payload.alias)
-    await service.session.commit()
+    await service.commit()
     return _to_contact_out(contact_link)
 
 
@@ -109,7 +109,7 @@ async def update_contact_status(
 ) -> ContactOut:
     """Met a jour le statut d'un contact (block/accept/etc.)."""
     contact_link = await service.update_status(current_user, contact_id, payload.status)
-    await service.session.commit()
+    await service.commit()
     return _to_contact_out(contact_link)
 
 
@@ -122,7 +122,7 @@ async def update_contact_alias(
 ) -> ContactOut:
     """Modifie l'alias associe a un contact."""
     contact_link = await service.update_alias(current_user, contact_id, payload.alias)
-    await service.session.commit()
+    await service.commit()
     return _to_contact_out(contact_link)
 
 
@@ -134,5 +134,5 @@ async def delete_contact(
 ) -> dict[str, str]:
     """Supprime le lien de contact pour les deux utilisateurs."""
     await service.delete_contact(current_user, contact_id)
-    await service.session.commit()
+    await service.commit()
     return {"detail": "Contact deleted"}
@@ -22,12 +22,11 @@ from __future__ import annotations
 
 import json
 import uuid
+from datetime import datetime
 
 from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Query, Response, UploadFile, status
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from ...core.pagination import decode_cursor, encode_cursor
 from ...dependencies import get_attachment_service, get_conversation_service, get_current_user
 from ...schemas.conversation import (
     AttachmentUploadResponse,
@@ -46,7 +45,7 @@ from ...schemas.conversation import (
 )
 from ...services.attachment_service import AttachmentService
 from ...services.conversation import ConversationService
-from app.models import Conversation, ConversationMember, UserAccount
+from app.models import Conversation, MembershipState, UserAccount
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
@@ -80,11 +79,18 @@ def _member_to_schema(link) -> ConversationMemberOut:
     )
 
 
-def _conversation_to_schema(conversation, *, block_state: dict | None = None) -> ConversationOut:
-    """Assemble la vue conversation pour l'API en injectant etats de blocage."""
-    members = [_member_to_schema(member) for member in conversation.members]
+def _conversation_to_schema(
+    conversation,
+    *,
+    members: list,
+    member_count: int,
+    block_state: dict | None = None,
+    entry: dict | None = None,
+) -> ConversationOut:
+    """Assemble la vue conversation pour l'API (apercu des membres, etat inbox et blocage)."""
     metadata = dict(conversation.extra_metadata or {})
     blocked_view = block_state or {}
+    inbox = entry or {}
     return ConversationOut(
         id=conversation.id,
         title=conversation.title,
@@ -92,41 +98,99 @@ def _conversation_to_schema(conversation, *, block_state: dict | None = None) ->
         type=conversation.type,
         created_at=conversation.created_at,
         archived=bool(metadata.get("archived", False)),
-        members=members,
+        members=[_member_to_schema(member) for member in members],
+        member_count=member_count,
+        last_activity_at=inbox.get("last_activity_at"),
+        last_message_preview=inbox.get("last_message_preview"),
+        unread_count=inbox.get("unread_count", 0),
         blocked_by_viewer=bool(blocked_view.get("blocked_by_me")),
         blocked_by_other=bool(blocked_view.get("blocked_by_other")),
     )
 
 
-def _invite_to_schema(invite) -> ConversationInviteOut:
-    return ConversationInviteOut.model_validate(invite, from_attributes=True)
+async def _conversation_card(service: ConversationService, user: UserAccount, conversation: Conversation) -> ConversationOut:
+    """Vue d'une conversation isolee (creation, mise a jour, invitation) avec apercu des membres."""
+    member_count, members = (await service.member_previews([conversation.id]))[conversation.id]
+    block_state = (await service.get_block_states(user, [conversation])).get(conversation.id)
+    return _conversation_to_schema(conversation, members=members, member_count=member_count, block_state=block_state)
+
+
+def _decode_keyset_cursor(cursor: str, kind: str) -> tuple[datetime, uuid.UUID]:
+    """Traduit un curseur opaque (horodatage, identifiant) de liste ou de roster."""
+    try:
+        data = decode_cursor(cursor, kind)
+        return datetime.fromisoformat(data["t"]), uuid.UUID(data["i"])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.") from exc
+
+
+def _decode_message_cursor(cursor: str) -> tuple[int | None, int | None]:
+    """Traduit un curseur opaque de messages en bornes (before, after) sur stream_position."""
+    try:
+        data = decode_cursor(cursor, "messages")
+        direction = data["d"]
+        position = int(data["p"])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.") from exc
+    if direction == "before":
+        return position, None
+    if direction == "after":
+        return None, position
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.")
+
+
+def _apply_pagination_headers(response: Response, meta: dict) -> None:
+    """Expose les metadonnees de navigation (positions brutes + curseurs opaques) en en-tetes."""
+    next_before = meta.get("next_before")
+    next_after = meta.get("next_after")
+    has_before = bool(meta.get("has_more_before"))
+    has_after = bool(meta.get("has_more_after"))
+    if next_before is not None:
+        response.headers["X-Pagination-Before"] = str(next_before)
+    if next_after is not None:
+        response.headers["X-Pagination-After"] = str(next_after)
+    response.headers["X-Pagination-Has-Before"] = "true" if has_before else "false"
+    response.headers["X-Pagination-Has-After"] = "true" if has_after else "false"
+    if has_before and next_before is not None:
+        response.headers["X-Pagination-Before-Cursor"] = encode_cursor("messages", d="before", p=next_before)
+    if next_after is not None:
+        # Toujours fourni : permet au client de reprendre le flux apres une reconnexion.
+        response.headers["X-Pagination-After-Cursor"] = encode_cursor("messages", d="after", p=next_after)
 
 
-async def _fetch_conversation_with_members(session: AsyncSession, conversation_id: uuid.UUID) -> Conversation:
-    """Charge une conversation avec ses membres/profils ou leve 404."""
-    stmt = (
-        select(Conversation)
-        .options(
-            selectinload(Conversation.members).selectinload(ConversationMember.user).selectinload(UserAccount.profile)
-        )
-        .where(Conversation.id == conversation_id)
-    )
-    result = await session.execute(stmt)
-    conversation = result.scalar_one_or_none()
-    if conversation is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation introuvable.")
-    return conversation
+def _invite_to_schema(invite) -> ConversationInviteOut:
+    return ConversationInviteOut.model_validate(invite, from_attributes=True)
 
 
 @router.get("/", response_model=list[ConversationOut])
 async def list_conversations(
+    response: Response,
     current_user: UserAccount = Depends(get_current_user),
     service: ConversationService = Depends(get_conversation_service),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="Curseur opaque renvoye dans X-Pagination-Before-Cursor"),
 ) -> list[ConversationOut]:
-    """Liste les conversations actives de l'utilisateur avec etat de blocage."""
-    conversations = await service.list_conversations(current_user)
+    """Liste paginee (activite decroissante) des conversations actives avec apercu des membres."""
+    before = _decode_keyset_cursor(cursor, "conversations") if cursor else None
+    entries, has_more = await service.list_conversations(current_user, limit=limit, before=before)
+    conversations = [entry["conversation"] for entry in entries]
     block_states = await service.get_block_states(current_user, conversations)
-    return [_conversation_to_schema(conv, block_state=block_states.get(conv.id)) for conv in conversations]
+    response.headers["X-Pagination-Has-Before"] = "true" if has_more else "false"
+    if has_more and entries:
+        last = entries[-1]
+        response.headers["X-Pagination-Before-Cursor"] = encode_cursor(
+            "conversations", t=last["last_activity_at"].isoformat(), i=str(last["conversation"].id)
+        )
+    return [
+        _conversation_to_schema(
+            entry["conversation"],
+            members=entry["members"],
+            member_count=entry["member_count"],
+            block_state=block_states.get(entry["conversation"].id),
+            entry=entry,
+        )
+        for entry in entries
+    ]
 
 
 @router.post("/", response_model=ConversationOut, status_code=status.HTTP_201_CREATED)
@@ -141,10 +205,8 @@ async def create_conversation(
         participant_ids=payload.participant_ids,
         conv_type=payload.type,
     )
-    await service.session.commit()
-    hydrated = await _fetch_conversation_with_members(service.session, conversation.id)
-    block_state = (await service.get_block_states(current_user, [hydrated])).get(hydrated.id)
-    return _conversation_to_schema(hydrated, block_state=block_state)
+    await service.commit()
+    return await _conversation_card(service, current_user, conversation)
 
 
 @router.patch("/{conversation_id}", response_model=ConversationOut)
@@ -161,27 +223,34 @@ async def update_conversation(
         topic=payload.topic,
         archived=payload.archived,
     )
-    await service.session.commit()
-    hydrated = await _fetch_conversation_with_members(service.session, conversation.id)
-    block_state = (await service.get_block_states(current_user, [hydrated])).get(hydrated.id)
-    return _conversation_to_schema(hydrated, block_state=block_state)
+    await service.commit()
+    return await _conversation_card(service, current_user, conversation)
 
 
 @router.get("/{conversation_id}/messages", response_model=list[MessageOut])
 async def list_messages(
     conversation_id: uuid.UUID,
+    response: Response,
     current_user: UserAccount = Depends(get_current_user),
     service: ConversationService = Depends(get_conversation_service),
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="Curseur opaque renvoye dans les en-tetes X-Pagination-*-Cursor"),
+    before: int | None = Query(None, ge=1, description="Position de flux exclusive (messages plus anciens)"),
+    after: int | None = Query(None, ge=0, description="Position de flux exclusive (messages plus recents)"),
 ) -> list[MessageOut]:
-    """Récupère les messages d'une conversation avec pagination simple."""
+    """Récupère une page de messages (keyset sur stream_position) et expose la navigation en en-têtes."""
+    if cursor:
+        before, after = _decode_message_cursor(cursor)
     membership = await service.ensure_membership(conversation_id, current_user.id)
-    messages, _meta = await service.list_messages(conversation_id, limit=limit, member=membership)
-    payloads = []
-    for message in messages:
-        data = await service.serialize_message(message, viewer_membership=membership)
-        payloads.append(MessageOut(**data))
-    return payloads
+    payloads, meta = await service.list_message_payloads(
+        conversation_id,
+        limit=limit,
+        before=before,
+        after=after,
+        member=membership,
+    )
+    _apply_pagination_headers(response, meta)
+    return [MessageOut(**data) for data in payloads]
 
 
 @router.get("/{conversation_id}/messages/search", response_model=list[MessageOut])
@@ -210,7 +279,7 @@ async def post_message(
     service: ConversationService = Depends(get_conversation_service),
 ) -> MessageOut:
     attachment_tokens = [item.upload_token for item in payload.attachments] if payload.attachments else None
-    message, payload = await service.post_message(
+    _, payload = await service.post_message(
         conversation_id=conversation_id,
         author=current_user,
         content=payload.content,
@@ -219,8 +288,7 @@ async def post_message(
         reply_to_id=payload.reply_to_message_id,
         forward_message_id=payload.forward_message_id,
     )
-    await service.session.commit()
-    await service.session.refresh(message)
+    await service.commit()
     return MessageOut(**payload)
 
 
@@ -265,7 +333,7 @@ async def edit_message(
         user=current_user,
         content=payload.content,
     )
-    await service.session.commit()
+    await service.commit()
     await service.session.refresh(message)
     data = await service.serialize_message(message, viewer_membership=membership)
     return MessageOut(**data)
@@ -285,7 +353,7 @@ async def delete_message(
         membership=membership,
         user=current_user,
     )
-    await service.session.commit()
+    await service.commit()
     await service.session.refresh(message)
     data = await service.serialize_message(message, viewer_membership=membership)
     return MessageOut(**data)
@@ -298,7 +366,7 @@ async def leave_conversation(
     service: ConversationService = Depends(get_conversation_service),
 ) -> Response:
     await service.leave_conversation(conversation_id, current_user)
-    await service.session.commit()
+    await service.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -309,7 +377,7 @@ async def delete_conversation(
     service: ConversationService = Depends(get_conversation_service),
 ) -> Response:
     await service.delete_conversation(conversation_id, actor=current_user)
-    await service.session.commit()
+    await service.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -321,7 +389,7 @@ async def mark_read(
     service: ConversationService = Depends(get_conversation_service),
 ) -> Response:
     await service.mark_messages_read(current_user, conversation_id, payload.message_ids)
-    await service.session.commit()
+    await service.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -340,7 +408,7 @@ async def pin_message(
         membership=membership,
     )
     payload = await service.serialize_message(message, viewer_membership=membership)
-    await service.session.commit()
+    await service.commit()
     return MessageOut(**payload)
 
 
@@ -359,7 +427,7 @@ async def unpin_message(
         membership=membership,
     )
     payload = await service.serialize_message(message, viewer_membership=membership)
-    await service.session.commit()
+    await service.commit()
     return MessageOut(**payload)
 
 
@@ -381,10 +449,32 @@ async def update_reaction(
         membership=membership,
     )
     data = await service.serialize_message(message, viewer_membership=membership)
-    await service.session.commit()
+    await service.commit()
     return MessageOut(**data)
 
 
+@router.get("/{conversation_id}/members", response_model=list[ConversationMemberOut])
+async def list_members(
+    conversation_id: uuid.UUID,
+    response: Response,
+    current_user: UserAccount = Depends(get_current_user),
+    service: ConversationService = Depends(get_conversation_service),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = Query(None, description="Curseur opaque renvoye dans X-Pagination-After-Cursor"),
+    state: MembershipState | None = Query(None, description="Filtre sur le statut des membres"),
+) -> list[ConversationMemberOut]:
+    """Roster complet d'une conversation, pagine par anciennete (joined_at, user_id)."""
+    after = _decode_keyset_cursor(cursor, "members") if cursor else None
+    members, has_more = await service.list_members(conversation_id, current_user, limit=limit, after=after, state=state)
+    response.headers["X-Pagination-Has-After"] = "true" if has_more else "false"
+    if has_more and members:
+        last = members[-1]
+        response.headers["X-Pagination-After-Cursor"] = encode_cursor(
+            "members", t=last.joined_at.isoformat(), i=str(last.user_id)
+        )
+    return [_member_to_schema(member) for member in members]
+
+
 @router.patch("/{conversation_id}/members/{user_id}", response_model=ConversationMemberOut)
 async def update_member(
     conversation_id: uuid.UUID,
@@ -401,7 +491,7 @@ async def update_member(
         state=payload.state,
         muted_until=payload.muted_until,
     )
-    await service.session.commit()
+    await service.commit()
     await service.session.refresh(membership)
     return _member_to_schema(membership)
 
@@ -430,7 +520,7 @@ async def create_invite(
         role=payload.role,
         expires_in_hours=payload.expires_in_hours,
     )
-    await service.session.commit()
+    await service.commit()
     await service.session.refresh(invite)
     return _invite_to_schema(invite)
 
@@ -443,7 +533,7 @@ async def revoke_invite(
     service: ConversationService = Depends(get_conversation_service),
 ) -> Response:
     await service.revoke_invite(conversation_id, invite_id, current_user)
-    await service.session.commit()
+    await service.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -454,10 +544,8 @@ async def accept_invite(
     service: ConversationService = Depends(get_conversation_service),
 ) -> ConversationOut:
     conversation = await service.accept_invite(token=token, user=current_user)
-    await service.session.commit()
-    hydrated = await _fetch_conversation_with_members(service.session, conversation.id)
-    block_state = (await service.get_block_states(current_user, [hydrated])).get(hydrated.id)
-    return _conversation_to_schema(hydrated, block_state=block_state)
+    await service.commit()
+    return await _conversation_card(service, current_user, conversation)
 
 
 
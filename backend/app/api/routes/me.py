@@ -17,25 +17,30 @@
 
 from __future__ import annotations
 
+import asyncio
 import uuid
 from datetime import datetime, timezone
-from io import BytesIO
 from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
 from urllib.parse import urlparse
 
 from fastapi import APIRouter, Body, Depends, File, HTTPException, Request, Response, UploadFile, status
-from PIL import Image, UnidentifiedImageError
+from PIL import UnidentifiedImageError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import delete, func, select, update
 
 from ...config import settings
+from ...core.executors import IMAGE, offload
+from ...core.imaging import render_avatar
+from ...core.overview_cache import OverviewCache, invalidate_overview
+from ...core.principal import publish_invalidation
+from ...db.session import async_session_factory
 from ...dependencies import (
     get_audit_service,
-    get_conversation_service,
     get_current_user,
     get_db,
     get_device_service,
-    get_organization_service,
+    get_overview_cache,
     get_security_service,
 )
 from ...schemas.audit import AuditLogEntry
@@ -67,16 +72,13 @@ from ...services.user_admin_service import (
     reassign_conversations_before_delete,
     remove_avatar_file,
 )
-from ...core.security import get_password_hash, verify_password
+from ...core.security import get_password_hash_async, verify_password_async
 from app.models import (
     ContactLink,
     ContactStatus,
     Conversation,
     ConversationMember,
     Device,
-    Message,
-    MessageDelivery,
-    MessageDeliveryState,
     OrganizationMembership,
     UserAccount,
     UserProfile,
@@ -84,12 +86,16 @@ from app.models import (
 
 router = APIRouter(prefix="/me", tags=["me"])
 
+T = TypeVar("T")
+
 
 MEDIA_ROOT = Path(settings.MEDIA_ROOT).resolve()
 AVATAR_DIR = MEDIA_ROOT / "avatars"
 ALLOWED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/webp", "image/gif"}
 MAX_AVATAR_BYTES = settings.AVATAR_MAX_BYTES
 MAX_AVATAR_SIZE = settings.AVATAR_MAX_SIZE
+# Participants nommes par conversation dans le resume de l'overview.
+OVERVIEW_PARTICIPANTS = 4
 
 AVATAR_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -172,6 +178,11 @@ async def _count_contact_stats(db: AsyncSession, user_id: uuid.UUID) -> tuple[in
     return total, pending
 
 
+async def _summarize_device_list(session: AsyncSession, user: UserAccount) -> dict[str, object]:
+    devices = await DeviceService(session).list_devices(user)
+    return _summarize_devices(devices)
+
+
 def _summarize_devices(devices: list[Device]) -> dict[str, object]:
     """Retourne un snapshot des appareils (total, a risque, dernier vu)."""
     total = len(devices)
@@ -186,101 +197,34 @@ def _summarize_devices(devices: list[Device]) -> dict[str, object]:
     return {"total": total, "at_risk": at_risk, "last_seen_at": last_seen_at}
 
 
-async def _summarize_conversations(
-    db: AsyncSession,
-    conversations: list[Conversation],
+def _summarize_inbox(
+    entries: list[dict],
+    previews: dict[uuid.UUID, tuple[int, list[ConversationMember]]],
     user_id: uuid.UUID,
-) -> tuple[list[ConversationSummary], int]:
-    """Construit un resume des conversations recentes et le total des non lus."""
-    if not conversations:
-        return [], 0
-
-    conversation_ids = [conversation.id for conversation in conversations]
-
-    unread_stmt = (
-        select(
-            ConversationMember.conversation_id,
-            func.count(MessageDelivery.id).label("unread"),
-        )
-        .join(MessageDelivery, MessageDelivery.member_id == ConversationMember.id)
-        .where(ConversationMember.user_id == user_id)
-        .where(ConversationMember.conversation_id.in_(conversation_ids))
-        .where(MessageDelivery.state != MessageDeliveryState.READ)
-        .where(MessageDelivery.read_at.is_(None))
-        .group_by(ConversationMember.conversation_id)
-    )
-    unread_result = await db.execute(unread_stmt)
-    unread_map = {row.conversation_id: int(row.unread) for row in unread_result}
-
-    last_messages = await _last_message_map(db, conversation_ids)
-
+) -> list[ConversationSummary]:
+    """Construit le resume des conversations recentes depuis la projection user_inbox."""
     summaries: list[ConversationSummary] = []
-    for conversation in conversations:
-        last_entry = last_messages.get(conversation.id)
-        last_activity = last_entry.created_at if last_entry else conversation.created_at
-        preview = _safe_decode(last_entry.ciphertext) if last_entry else None
-        title = conversation.title or _fallback_conversation_title(conversation, user_id)
-        participants = _conversation_participants(conversation, user_id)
+    for entry in entries:
+        conversation = entry["conversation"]
+        _, members = previews.get(conversation.id, (0, []))
+        participants = _conversation_participants(members, user_id)
         summaries.append(
             ConversationSummary(
                 id=conversation.id,
-                title=title,
+                title=conversation.title or (", ".join(participants) if participants else "Conversation"),
                 type=conversation.type,
-                last_activity_at=last_activity,
-                last_message_preview=preview,
-                unread_count=unread_map.get(conversation.id, 0),
+                last_activity_at=entry["last_activity_at"],
+                last_message_preview=entry["last_message_preview"],
+                unread_count=entry["unread_count"],
                 participants=participants,
             )
         )
+    return summaries
 
-    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
-    summaries.sort(key=lambda item: item.last_activity_at or epoch, reverse=True)
-    total_unread = sum(unread_map.values())
-    return summaries[:5], int(total_unread)
-
-
-async def _last_message_map(db: AsyncSession, conversation_ids: list[uuid.UUID]) -> dict[uuid.UUID, object]:
-    """Recupere le dernier message (id/created_at/ciphertext) pour chaque conversation."""
-    if not conversation_ids:
-        return {}
-
-    ranking = func.row_number().over(
-        partition_by=Message.conversation_id,
-        order_by=Message.created_at.desc(),
-    )
-    subquery = (
-        select(
-            Message.conversation_id.label("conversation_id"),
-            Message.created_at.label("created_at"),
-            Message.ciphertext.label("ciphertext"),
-            ranking.label("row_rank"),
-        )
-        .where(Message.conversation_id.in_(conversation_ids))
-        .subquery()
-    )
-    stmt = select(subquery.c.conversation_id, subquery.c.created_at, subquery.c.ciphertext).where(subquery.c.row_rank == 1)
-    result = await db.execute(stmt)
-    return {row.conversation_id: row for row in result}
-
-
-def _safe_decode(payload: bytes | memoryview | None) -> str | None:
-    if not payload:
-        return None
-    data = bytes(payload)
-    text = data.decode("utf-8", errors="ignore").strip()
-    return text or None
-
-
-def _fallback_conversation_title(conversation: Conversation, current_user_id: uuid.UUID) -> str:
-    participants = _conversation_participants(conversation, current_user_id)
-    if participants:
-        return ", ".join(participants)
-    return "Conversation"
 
-
-def _conversation_participants(conversation: Conversation, current_user_id: uuid.UUID) -> list[str]:
+def _conversation_participants(members: list[ConversationMember], current_user_id: uuid.UUID) -> list[str]:
     names: list[str] = []
-    for member in conversation.members:
+    for member in members:
         if member.user_id == current_user_id:
             continue
         display_name = None
@@ -290,7 +234,7 @@ def _conversation_participants(conversation: Conversation, current_user_id: uuid
             display_name = member.user.email
         if display_name:
             names.append(display_name)
-    return names[:4]
+    return names[:OVERVIEW_PARTICIPANTS]
 
 
 def _build_security_recommendations(stats: OverviewStats, snapshot: dict) -> list[str]:
@@ -340,6 +284,7 @@ async def update_profile(
     current_user: UserAccount = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     audit: AuditService = Depends(get_audit_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> MeProfileOut:
     """Met a jour les champs du profil et trace l'audit."""
     profile = _ensure_profile(current_user, db)
@@ -386,6 +331,7 @@ async def update_profile(
         metadata={"updated": updated_fields},
     )
     await db.commit()
+    await invalidate_overview(overview_cache, current_user.id)
     await db.refresh(profile)
     current_user.profile = profile
     return _build_profile_response(current_user)
@@ -397,6 +343,7 @@ async def upload_avatar(
     current_user: UserAccount = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     audit: AuditService = Depends(get_audit_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> AvatarResponse:
     """Charge un avatar, le redimensionne et met a jour le profil."""
     data = await file.read()
@@ -407,18 +354,14 @@ async def upload_avatar(
     if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format.")
 
+    # Decodage, redimensionnement et PNG optimise dans le pool de processus (hors boucle).
+    filename = f"{uuid.uuid4().hex}.png"
+    output_path = AVATAR_DIR / filename
     try:
-        image = Image.open(BytesIO(data))
+        await offload(IMAGE, render_avatar, data, MAX_AVATAR_SIZE, str(output_path))
     except UnidentifiedImageError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Corrupted image file.") from exc
 
-    image = image.convert("RGBA")
-    image.thumbnail((MAX_AVATAR_SIZE, MAX_AVATAR_SIZE), Image.LANCZOS)
-
-    filename = f"{uuid.uuid4().hex}.png"
-    output_path = AVATAR_DIR / filename
-    image.save(output_path, format="PNG", optimize=True)
-
     profile = _ensure_profile(current_user, db)
     previous_url = profile.avatar_url
     profile.avatar_url = _build_avatar_url(filename)
@@ -426,6 +369,7 @@ async def upload_avatar(
     await db.flush()
     await audit.record("user.avatar.upload", user_id=str(current_user.id), metadata={"filename": filename})
     await db.commit()
+    await invalidate_overview(overview_cache, current_user.id)
     await db.refresh(profile)
     current_user.profile = profile
 
@@ -439,6 +383,7 @@ async def delete_avatar(
     current_user: UserAccount = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     audit: AuditService = Depends(get_audit_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> AvatarResponse:
     """Supprime l'avatar de l'utilisateur et le fichier associe."""
     profile = _ensure_profile(current_user, db)
@@ -451,6 +396,7 @@ async def delete_avatar(
     await db.flush()
     await audit.record("user.avatar.delete", user_id=str(current_user.id))
     await db.commit()
+    await invalidate_overview(overview_cache, current_user.id)
     await db.refresh(profile)
     current_user.profile = profile
 
@@ -459,29 +405,90 @@ async def delete_avatar(
     return AvatarResponse(avatar_url=None)
 
 
+async def _in_session(work: Callable[[AsyncSession], Awaitable[T]]) -> T:
+    """Execute une partie independante de l'overview sur sa propre session du pool."""
+    async with async_session_factory() as session:
+        return await work(session)
+
+
+async def _overview_conversations(
+    session: AsyncSession, user: UserAccount
+) -> tuple[list[ConversationSummary], int, int]:
+    service = ConversationService(session)
+    recent = await service.list_inbox(user, limit=5)
+    # Apercu borne du roster (utilisateur courant compris), jamais la liste complete des membres.
+    previews = await service.member_previews(
+        [entry["conversation"].id for entry in recent], size=OVERVIEW_PARTICIPANTS + 1
+    )
+    conversations_total, unread_total = await service.inbox_totals(user.id)
+    return _summarize_inbox(recent, previews, user.id), conversations_total, unread_total
+
+
+async def _overview_organization(session: AsyncSession, user_id: uuid.UUID) -> OrganizationSummary | None:
+    organization_service = OrganizationService(session)
+    try:
+        membership = await organization_service.get_membership_for_user(user_id)
+    except HTTPException as exc:
+        if exc.status_code not in (status.HTTP_403_FORBIDDEN, status.HTTP_404_NOT_FOUND):
+            raise
+        return None
+    member_count, admin_count = await organization_service.get_member_counts(membership.organization_id)
+    org = membership.organization
+    return OrganizationSummary(
+        id=org.id,
+        name=org.name,
+        slug=org.slug,
+        created_at=org.created_at,
+        member_count=member_count,
+        admin_count=admin_count,
+        membership=OrganizationMembershipInfo(
+            id=membership.id,
+            role=membership.role,
+            joined_at=membership.joined_at,
+            is_admin=organization_service.is_admin_role(membership.role),
+            can_manage_admins=organization_service.can_manage_admins(membership),
+        ),
+    )
+
+
 @router.get("/overview", response_model=OverviewResponse)
 async def get_overview(
     current_user: UserAccount = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-    conversation_service: ConversationService = Depends(get_conversation_service),
     security: SecurityService = Depends(get_security_service),
-    device_service: DeviceService = Depends(get_device_service),
-    organization_service: OrganizationService = Depends(get_organization_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> OverviewResponse:
-    """Construit la vue d'ensemble dashboard (profil, stats, securite, org)."""
-    profile = _build_profile_response(current_user)
-    contacts_total, contacts_pending = await _count_contact_stats(db, current_user.id)
+    """Construit la vue d'ensemble dashboard (profil, stats, securite, org).
+
+    Servie depuis le cache par utilisateur si present ; sinon les parties independantes
+    (contacts, appareils, conversations, organisation) sont calculees en parallele, chacune
+    sur sa propre session, puis l'instantane est mis en cache.
+    """
+    version = None
+    if overview_cache:
+        cached, version = await overview_cache.get(current_user.id)
+        if cached is not None:
+            return OverviewResponse.model_validate(cached)
 
-    devices = await device_service.list_devices(current_user)
-    device_snapshot = _summarize_devices(devices)
-
-    security_snapshot = await security.get_security_snapshot(current_user)
-    conversations = await conversation_service.list_conversations(current_user)
-    conversation_summaries, unread_total = await _summarize_conversations(db, conversations, current_user.id)
+    profile = _build_profile_response(current_user)
+    (
+        (contacts_total, contacts_pending),
+        device_snapshot,
+        (conversation_summaries, conversations_total, unread_total),
+        organization_out,
+        security_snapshot,
+    ) = await asyncio.gather(
+        # 4 sessions du pool en plus de celle de la requete : a reporter dans core/admission.OVERVIEW_DB_SESSIONS.
+        _in_session(lambda session: _count_contact_stats(session, current_user.id)),
+        _in_session(lambda session: _summarize_device_list(session, current_user)),
+        _in_session(lambda session: _overview_conversations(session, current_user)),
+        _in_session(lambda session: _overview_organization(session, current_user.id)),
+        # Etat de securite charge a la demande (load_relations) sur la session de la requete, seule tache a l'utiliser.
+        security.get_security_snapshot(current_user),
+    )
 
     stats = OverviewStats(
         unread_messages=unread_total,
-        conversations=len(conversations),
+        conversations=conversations_total,
         contacts_total=contacts_total,
         contacts_pending=contacts_pending,
         devices_total=device_snapshot["total"],
@@ -508,32 +515,7 @@ async def get_overview(
         status_message=profile.status_message,
     )
 
-    organization_out = None
-    try:
-        membership = await organization_service.get_membership_for_user(current_user.id)
-        member_count, admin_count = await organization_service.get_member_counts(membership.organization_id)
-        org = membership.organization
-        organization_out = OrganizationSummary(
-            id=org.id,
-            name=org.name,
-            slug=org.slug,
-            created_at=org.created_at,
-            member_count=member_count,
-            admin_count=admin_count,
-            membership=OrganizationMembershipInfo(
-                id=membership.id,
-                role=membership.role,
-                joined_at=membership.joined_at,
-                is_admin=organization_service.is_admin_role(membership.role),
-                can_manage_admins=organization_service.can_manage_admins(membership),
-            ),
-        )
-    except HTTPException as exc:
-        if exc.status_code not in (status.HTTP_403_FORBIDDEN, status.HTTP_404_NOT_FOUND):
-            raise
-        organization_out = None
-
-    return OverviewResponse(
+    response = OverviewResponse(
         profile=profile_out,
         stats=stats,
         security=security_out,
@@ -541,6 +523,9 @@ async def get_overview(
         generated_at=datetime.now(timezone.utc),
         organization=organization_out,
     )
+    if overview_cache:
+        await overview_cache.put(current_user.id, response.model_dump(mode="json"), expected_version=version)
+    return response
 
 
 @router.get("/devices", response_model=DeviceListResponse)
@@ -571,7 +556,7 @@ async def register_device(
         ip_address=ip_address,
         user_agent=user_agent,
     )
-    await service.session.commit()
+    await service.commit()
     await service.session.refresh(device)
     return _build_device_response(device)
 
@@ -584,7 +569,7 @@ async def revoke_device(
 ) -> Response:
     """Revoque un appareil et les sessions associees."""
     await service.revoke_device(current_user, device_id)
-    await service.session.commit()
+    await service.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -596,7 +581,7 @@ async def delete_account(
     audit: AuditService = Depends(get_audit_service),
 ) -> Response:
     """Supprime le compte utilisateur apres verification du mot de passe."""
-    if not verify_password(payload.password, current_user.hashed_password):
+    if not await verify_password_async(payload.password, current_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Mot de passe incorrect.")
 
     avatar_url = current_user.profile.avatar_url if current_user.profile else None
@@ -608,6 +593,7 @@ async def delete_account(
     await audit.record("user.account.delete", user_id=str(current_user.id))
     await db.delete(current_user)
     await db.commit()
+    await publish_invalidation(user_ids=[current_user.id])
 
     remove_avatar_file(avatar_url)
 
@@ -624,14 +610,14 @@ async def update_password(
     """Change le mot de passe apres validation de l'ancien."""
     if not payload.old_password or not payload.new_password:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Les mots de passe sont requis.")
-    if not verify_password(payload.old_password, current_user.hashed_password):
+    if not await verify_password_async(payload.old_password, current_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Mot de passe actuel incorrect.")
     if payload.old_password == payload.new_password:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Le nouveau mot de passe doit être différent de l'actuel.",
         )
-    current_user.hashed_password = get_password_hash(payload.new_password)
+    current_user.hashed_password = await get_password_hash_async(payload.new_password)
     await audit.record("user.password.update", user_id=str(current_user.id))
     await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -652,6 +638,7 @@ async def update_security_settings(
     payload: SecuritySettingsUpdate,
     current_user: UserAccount = Depends(get_current_user),
     security: SecurityService = Depends(get_security_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> SecuritySettingsOut:
     """Met a jour les preferences de securite (alertes de connexion)."""
     updated = await security.update_security_preferences(
@@ -659,6 +646,7 @@ async def update_security_settings(
         notification_login=payload.notification_login,
     )
     await security.session.commit()
+    await invalidate_overview(overview_cache, current_user.id)
     return SecuritySettingsOut(**updated)
 
 
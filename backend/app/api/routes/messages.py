@@ -6,16 +6,23 @@
 #
 # Description:
 # - Expose le compteur de messages non lus (total + par conversation).
+# - Marquage global comme lu (toutes conversations actives).
+# - Recherche plein texte classee sur toutes les conversations (curseur keyset).
 # - Sert l'UI pour les badges de notification.
 ############################################################
 """
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+import hashlib
+import uuid
+from datetime import datetime
 
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from ...core.pagination import decode_cursor, encode_cursor
 from ...dependencies import get_conversation_service, get_current_user
-from ...schemas.message import UnreadSummaryResponse
+from ...schemas.message import MarkAllReadResponse, MessageSearchResponse, UnreadSummaryResponse
 from ...services.conversation import ConversationService
 from app.models import UserAccount
 
@@ -32,4 +39,54 @@ async def unread_summary(
     return UnreadSummaryResponse(**summary)
 
 
+@router.post("/read_all", response_model=MarkAllReadResponse)
+async def mark_all_read(
+    current_user: UserAccount = Depends(get_current_user),
+    service: ConversationService = Depends(get_conversation_service),
+) -> MarkAllReadResponse:
+    """Marque comme lus tous les messages de l'utilisateur et retourne les compteurs par conversation."""
+    counts = await service.mark_all_read(current_user)
+    await service.commit()
+    return MarkAllReadResponse(
+        total=sum(counts.values()),
+        conversations=[
+            {"conversation_id": conversation_id, "read": read} for conversation_id, read in counts.items()
+        ],
+    )
+
+
+def _query_digest(query: str) -> str:
+    """Lie un curseur de recherche au terme qui l'a produit (sans l'exposer en clair)."""
+    return hashlib.sha256(query.strip().encode("utf-8")).hexdigest()[:12]
+
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, description="Terme a rechercher"),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: str | None = Query(None, description="Curseur opaque renvoye dans next_cursor"),
+    current_user: UserAccount = Depends(get_current_user),
+    service: ConversationService = Depends(get_conversation_service),
+) -> MessageSearchResponse:
+    """Recherche classee dans toutes les conversations actives de l'utilisateur."""
+    after = None
+    if cursor:
+        try:
+            data = decode_cursor(cursor, "search")
+            if data["q"] != _query_digest(q):
+                raise ValueError("Cursor does not match query")
+            # "r" : rang ts_rank (mode plaintext) ; "t" : date du message (mode blind).
+            key = datetime.fromisoformat(data["t"]) if "t" in data else float(data["r"])
+            after = (key, uuid.UUID(data["i"]))
+        except (KeyError, TypeError, ValueError) as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.") from exc
+    hits, next_after = await service.search_all_messages(user=current_user, query=q, limit=limit, after=after)
+    next_cursor = None
+    if next_after is not None:
+        key, message_id = next_after
+        position = {"t": key.isoformat()} if isinstance(key, datetime) else {"r": repr(key)}
+        next_cursor = encode_cursor("search", q=_query_digest(q), i=str(message_id), **position)
+    return MessageSearchResponse(items=hits, next_cursor=next_cursor)
+
+
 __all__ = ["router"]
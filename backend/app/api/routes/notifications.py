@@ -20,6 +20,7 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, Request, status
 from fastapi.responses import JSONResponse
 
+from ...db.session import load_relations
 from ...dependencies import get_notification_service, get_current_user
 from ...schemas.notification import (
     NotificationPreferenceOut,
@@ -92,6 +93,7 @@ async def send_login_alert_test(
     login_time = datetime.now(timezone.utc)
     ip_address = request.client.host if request.client else None
     user_agent = request.headers.get("user-agent")
+    await load_relations(service.session, current_user, "notification_preferences")
     if not should_send_login_alert(current_user, now_utc=login_time):
         return NotificationTestResponse(
             skipped=True,
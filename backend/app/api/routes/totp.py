@@ -6,7 +6,7 @@
 #
 # Description:
 # - Active/Confirme/Desactive la MFA TOTP pour l'utilisateur courant.
-# - Commit explicite apres mutation de l'etat de securite.
+# - Commit explicite apres mutation de l'etat de securite, puis invalidation de l'overview en cache.
 ############################################################
 """
 
@@ -14,7 +14,8 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends
 
-from ...dependencies import get_current_user, get_security_service
+from ...core.overview_cache import OverviewCache, invalidate_overview
+from ...dependencies import get_current_user, get_overview_cache, get_security_service
 from ...schemas.security import (
     TotpActivateResponse,
     TotpConfirmRequest,
@@ -47,10 +48,12 @@ async def confirm_totp(
     payload: TotpConfirmRequest,
     current_user: UserAccount = Depends(get_current_user),
     security: SecurityService = Depends(get_security_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> TotpConfirmResponse:
     """Valide le code TOTP fourni et génère les codes de récupération."""
     recovery_codes = await security.confirm_totp(current_user, payload.code)
     await security.session.commit()
+    await invalidate_overview(overview_cache, current_user.id)
     return TotpConfirmResponse(
         message="Double authentification activée.",
         recovery_codes=recovery_codes,
@@ -61,8 +64,10 @@ async def confirm_totp(
 async def deactivate_totp(
     current_user: UserAccount = Depends(get_current_user),
     security: SecurityService = Depends(get_security_service),
+    overview_cache: OverviewCache | None = Depends(get_overview_cache),
 ) -> TotpDeactivateResponse:
     """Désactive la double authentification TOTP pour l'utilisateur."""
     await security.deactivate_totp(current_user)
     await security.session.commit()
+    await invalidate_overview(overview_cache, current_user.id)
     return TotpDeactivateResponse(message="Double authentification désactivée.")
\ No newline at end of file
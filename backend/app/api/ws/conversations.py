@@ -8,7 +8,6 @@ import asyncio
 import contextlib
 import json
 import uuid
-from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from sqlalchemy import select
@@ -16,6 +15,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.websockets import WebSocketState
 
 from ...core.redis import RealtimeBroker
+from . import presence
 from ...core.security import decode_token
 from ...dependencies import get_realtime_broker, get_db
 from app.models import ConversationMember
@@ -66,99 +66,37 @@ async def conversation_ws(
 
     redis = broker.redis if broker else None
     channel = f"conversation:{conversation_id}"
-    pubsub = None
+    subscription = None
     if redis is not None:
-        pubsub = redis.pubsub()
-        await pubsub.subscribe(channel)
+        # Connexion pub/sub partagée du processus : pas de connexion Redis par socket.
+        subscription = broker.open_subscription()
+        await subscription.add(channel)
     else:
         await websocket.send_text(json.dumps({"error": "Realtime disabled"}))
 
     await websocket.send_text(json.dumps({"event": "ready", "conversation_id": str(conversation_id)}))
 
-    presence_online_key = f"conversation:{conversation_id}:presence:online"
-    presence_seen_key = f"conversation:{conversation_id}:presence:last_seen"
-
-    async def build_presence_payload() -> dict | None:
-        """Construit un snapshot de présence (online/offline) pour diffusion."""
-        if redis is None:
-            return None
-        snapshot = await redis.hgetall(presence_seen_key)
-        online = set(await redis.smembers(presence_online_key))
-        now_iso = datetime.now(timezone.utc).isoformat()
-        users = []
-        for raw_user_id, last_seen in snapshot.items():
-            users.append(
-                {
-                    "user_id": raw_user_id,
-                    "status": "online" if raw_user_id in online else "offline",
-                    "last_seen": last_seen or now_iso,
-                }
-            )
-        users.sort(key=lambda entry: entry["user_id"])
-        return {
-            "event": "presence:update",
-            "payload": {
-                "conversation_id": str(conversation_id),
-                "timestamp": now_iso,
-                "users": users,
-            },
-        }
-
-    async def broadcast_presence(include_direct: bool = False) -> None:
-        """Diffuse la présence sur le canal conversation et éventuellement au client courant."""
-        if broker is None or redis is None:
-            return
-        payload = await build_presence_payload()
-        if not payload:
-            return
-        await broker.publish_conversation(str(conversation_id), payload)
-        if include_direct:
-            with contextlib.suppress(Exception):
-                await websocket.send_text(json.dumps(payload))
-
     async def mark_presence_online() -> None:
-        """Marque l'utilisateur en ligne et diffuse."""
-        if redis is None:
-            return
-        now_iso = datetime.now(timezone.utc).isoformat()
-        await redis.sadd(presence_online_key, str(user_id))
-        await redis.hset(presence_seen_key, str(user_id), now_iso)
-        await redis.expire(presence_online_key, 3600)
-        await redis.expire(presence_seen_key, 3600)
-        await broadcast_presence(include_direct=True)
-
-    async def mark_presence_offline() -> None:
-        """Marque l'utilisateur hors ligne et diffuse."""
-        if redis is None:
-            return
-        await redis.srem(presence_online_key, str(user_id))
-        await redis.hset(presence_seen_key, str(user_id), datetime.now(timezone.utc).isoformat())
-        await broadcast_presence()
-
-    async def refresh_presence_loop() -> None:
-        """Rafraîchit périodiquement le last_seen tant que la connexion reste ouverte."""
+        """Enregistre la socket (arrivée diffusée en delta) et renvoie le snapshot au client courant."""
         if redis is None:
             return
-        try:
-            while True:
-                await redis.hset(presence_seen_key, str(user_id), datetime.now(timezone.utc).isoformat())
-                await asyncio.sleep(20)
-        except asyncio.CancelledError:
-            pass
+        payload = await presence.presence_tracker.join(broker, conversation_id, user_id)
+        with contextlib.suppress(Exception):
+            await websocket.send_text(json.dumps(payload))
 
     async def sender() -> None:
-        """Écoute le pubsub Redis et pousse vers le WebSocket."""
-        if pubsub is None:
+        """Relaye les messages du canal (hub pub/sub partagé) vers le WebSocket."""
+        if subscription is None:
             return
         try:
-            async for message in pubsub.listen():
-                if message.get("type") != "message":
-                    continue
-                await websocket.send_text(message.get("data"))
+            async for _, data in subscription:
+                await websocket.send_text(data)
         except asyncio.CancelledError:
-            pass
-
-    call_events = {"call:offer", "call:answer", "call:candidate", "call:hangup"}
+            return
+        if subscription.overflowed:
+            # Client trop lent : on ferme, il se reconnectera et rechargera l'historique.
+            with contextlib.suppress(Exception):
+                await websocket.close(code=1013)
 
     async def receiver() -> None:
         """Traite les messages entrants du WebSocket et les relaye via Redis si besoin."""
@@ -169,6 +107,8 @@ async def conversation_ws(
                 except WebSocketDisconnect:
                     break
                 except Exception:
+                    if websocket.application_state == WebSocketState.DISCONNECTED:
+                        break
                     await asyncio.sleep(0)
                     continue
                 try:
@@ -176,31 +116,15 @@ async def conversation_ws(
                 except json.JSONDecodeError:
                     continue
                 event = data.get("event")
-                if event in {"typing:start", "typing:stop"}:
+                relayed = presence.client_event(conversation_id, user_id, data)
+                if relayed is not None:
                     if broker:
-                        payload = {
-                            "event": event,
-                            "payload": {
-                                "conversation_id": str(conversation_id),
-                                "user_id": str(user_id),
-                                "timestamp": datetime.now(timezone.utc).isoformat(),
-                            },
-                        }
-                        await broker.publish_conversation(str(conversation_id), payload)
-                elif event in call_events:
-                    if broker:
-                        payload = dict(data.get("payload") or {})
-                        payload["conversation_id"] = str(conversation_id)
-                        payload["from_user_id"] = str(user_id)
-                        if payload.get("target_user_id"):
-                            payload["target_user_id"] = str(payload["target_user_id"])
-                        await broker.publish_conversation(
-                            str(conversation_id),
-                            {
-                                "event": event,
-                                "payload": payload,
-                            },
-                        )
+                        await broker.publish_conversation(str(conversation_id), relayed)
+                elif event == "presence:snapshot" and redis is not None:
+                    # Roster complet à la demande, envoyé au seul demandeur.
+                    payload = await presence.build_presence_payload(redis, conversation_id)
+                    with contextlib.suppress(Exception):
+                        await websocket.send_text(json.dumps(payload))
                 elif event == "ping":
                     with contextlib.suppress(Exception):
                         await websocket.send_text(json.dumps({"event": "pong"}))
@@ -210,19 +134,16 @@ async def conversation_ws(
     await mark_presence_online()
     send_task = asyncio.create_task(sender())
     recv_task = asyncio.create_task(receiver())
-    presence_task = asyncio.create_task(refresh_presence_loop()) if redis else None
     try:
         await recv_task
     finally:
         send_task.cancel()
-        if presence_task:
-            presence_task.cancel()
         with contextlib.suppress(Exception):
-            if pubsub is not None:
-                await pubsub.unsubscribe(channel)
-                await pubsub.close()
+            if subscription is not None:
+                await subscription.close()
         if redis:
-            await mark_presence_offline()
+            with contextlib.suppress(Exception):
+                await presence.presence_tracker.leave(broker, conversation_id, user_id)
         if websocket.application_state == WebSocketState.CONNECTED:
             with contextlib.suppress(Exception):
                 await websocket.close()
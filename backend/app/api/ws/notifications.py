@@ -1,5 +1,6 @@
 """
 Endpoint WebSocket pour les notifications temps reel d'un utilisateur.
+Historique : le client web consomme le topic "user" de /ws/session.
 """
 
 from __future__ import annotations
@@ -51,22 +52,25 @@ async def notifications_ws(
         return
 
     channel = f"user:{user_id}:events"
-    pubsub = redis.pubsub()
-    await pubsub.subscribe(channel)
+    subscription = broker.open_subscription()
+    await subscription.add(channel)
 
     await websocket.send_text(json.dumps({"event": "ready"}))
 
     async def sender() -> None:
-        """Ecoute le pubsub Redis et retransmet au client WS."""
+        """Relaye les evenements du canal utilisateur (hub pub/sub partage) au client WS."""
         try:
-            async for message in pubsub.listen():
-                if message.get("type") != "message":
-                    continue
-                await websocket.send_text(message.get("data"))
+            async for _, data in subscription:
+                await websocket.send_text(data)
         except WebSocketDisconnect:
             return
         except Exception:
             return
+        if subscription.overflowed:
+            try:
+                await websocket.close(code=1013)
+            except RuntimeError:
+                pass
 
     send_task = None
     try:
@@ -81,8 +85,7 @@ async def notifications_ws(
     finally:
         if send_task:
             send_task.cancel()
-        await pubsub.unsubscribe(channel)
-        await pubsub.close()
+        await subscription.close()
         # Starlette raises if we close an already closed socket. Guard instead.
         if websocket.application_state != WebSocketState.DISCONNECTED:
             try:
@@ -0,0 +1,260 @@
+"""
+Presence et evenements clients partages par les sockets conversation et session.
+
+Stockage par conversation :
+- `conversation:<id>:presence` : sorted set "<user_id>|<worker_id>" -> horodatage du dernier heartbeat
+  (epoch) ; un membre par processus, un utilisateur est en ligne tant qu'un de ses membres a un score
+  plus recent que PRESENCE_TIMEOUT_SECONDS. Une entree laissee par un worker tombe expire d'elle-meme,
+  et la fermeture des sockets d'un worker ne rend pas hors ligne un utilisateur connecte ailleurs.
+- `conversation:<id>:presence:last_seen` : hash user_id -> derniere presence (ISO) des absents.
+
+Un seul tracker par processus : les heartbeats de toutes les sockets sont ecrits en un pipeline
+par intervalle, et seuls les changements (arrivees/departs) sont diffuses ("presence:delta").
+Le roster complet ("presence:update") n'est envoye qu'au client qui le demande.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable
+
+import redis.asyncio as aioredis
+
+from ...core.redis import RealtimeBroker
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_RETENTION_SECONDS = 3600
+PRESENCE_HEARTBEAT_SECONDS = 20
+PRESENCE_TIMEOUT_SECONDS = 3 * PRESENCE_HEARTBEAT_SECONDS
+CALL_EVENTS = {"call:offer", "call:answer", "call:candidate", "call:hangup"}
+TYPING_EVENTS = {"typing:start", "typing:stop"}
+WORKER_ID = uuid.uuid4().hex[:12]
+
+
+def _keys(conversation_id) -> tuple[str, str]:
+    return (
+        f"conversation:{conversation_id}:presence",
+        f"conversation:{conversation_id}:presence:last_seen",
+    )
+
+
+def _member(user_id: str, worker_id: str) -> str:
+    return f"{user_id}|{worker_id}"
+
+
+def _user_of(member: str) -> str:
+    return member.rsplit("|", 1)[0]
+
+
+def _live_users(heartbeats, cutoff: float, *, exclude: str | None = None) -> set[str]:
+    """Utilisateurs ayant au moins un membre vivant (hors `exclude`)."""
+    return {_user_of(member) for member, score in heartbeats if score > cutoff and member != exclude}
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def _event(name: str, conversation_id, users: list[dict], now: float) -> dict:
+    users.sort(key=lambda entry: entry["user_id"])
+    return {
+        "event": name,
+        "payload": {
+            "conversation_id": str(conversation_id),
+            "timestamp": _iso(now),
+            "users": users,
+        },
+    }
+
+
+def _online(user_id: str, now: float) -> dict:
+    return {"user_id": user_id, "status": "online", "last_seen": _iso(now)}
+
+
+def _offline(user_id: str, last_seen: float) -> dict:
+    return {"user_id": user_id, "status": "offline", "last_seen": _iso(last_seen)}
+
+
+async def build_presence_payload(redis: aioredis.Redis, conversation_id, *, now: float | None = None) -> dict:
+    """Snapshot complet (online/offline) d'une conversation, destiné au seul client demandeur."""
+    now = time.time() if now is None else now
+    cutoff = now - PRESENCE_TIMEOUT_SECONDS
+    online_key, seen_key = _keys(conversation_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrange(online_key, 0, -1, withscores=True)
+        pipe.hgetall(seen_key)
+        heartbeats, last_seen = await pipe.execute()
+    users = {
+        raw_user_id: {"user_id": raw_user_id, "status": "offline", "last_seen": seen}
+        for raw_user_id, seen in last_seen.items()
+    }
+    latest: dict[str, float] = {}
+    for member, score in heartbeats:
+        user_id = _user_of(member)
+        latest[user_id] = max(score, latest.get(user_id, score))
+    for raw_user_id, score in latest.items():
+        users[raw_user_id] = {
+            "user_id": raw_user_id,
+            "status": "online" if score > cutoff else "offline",
+            "last_seen": _iso(score),
+        }
+    return _event("presence:update", conversation_id, list(users.values()), now)
+
+
+class PresenceTracker:
+    """Sockets locales par (conversation, utilisateur) et heartbeats groupés du processus."""
+
+    def __init__(self, *, clock: Callable[[], float] = time.time, worker_id: str = WORKER_ID) -> None:
+        self.clock = clock
+        self.worker_id = worker_id
+        self._local: dict[tuple[str, str], int] = {}
+
+    def local_count(self, conversation_id, user_id) -> int:
+        return self._local.get((str(conversation_id), str(user_id)), 0)
+
+    async def join(self, broker: RealtimeBroker, conversation_id, user_id) -> dict:
+        """Enregistre une socket ; diffuse l'arrivée si l'utilisateur n'était pas en ligne. Retourne le snapshot."""
+        redis = broker.redis
+        key = (str(conversation_id), str(user_id))
+        first = key not in self._local
+        self._local[key] = self._local.get(key, 0) + 1
+        now = self.clock()
+        if first:
+            online_key, _ = _keys(conversation_id)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.zrange(online_key, 0, -1, withscores=True)
+                pipe.zadd(online_key, {_member(key[1], self.worker_id): now})
+                pipe.expire(online_key, PRESENCE_RETENTION_SECONDS)
+                previous, _, _ = await pipe.execute()
+            # Arrivée seulement si aucun membre (ce worker compris) n'était vivant pour cet utilisateur.
+            if key[1] not in _live_users(previous, now - PRESENCE_TIMEOUT_SECONDS):
+                delta = _event("presence:delta", conversation_id, [_online(key[1], now)], now)
+                await broker.publish_conversation(key[0], delta)
+        return await build_presence_payload(redis, conversation_id, now=now)
+
+    async def leave(self, broker: RealtimeBroker, conversation_id, user_id) -> None:
+        """Libère une socket ; à la dernière du processus, retire le membre du worker et diffuse le départ
+        si l'utilisateur n'a plus de membre vivant (autre worker, autre appareil)."""
+        key = (str(conversation_id), str(user_id))
+        remaining = self._local.get(key, 0) - 1
+        if remaining > 0:
+            self._local[key] = remaining
+            return
+        self._local.pop(key, None)
+        now = self.clock()
+        online_key, seen_key = _keys(conversation_id)
+        async with broker.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(online_key, _member(key[1], self.worker_id))
+            pipe.zrange(online_key, 0, -1, withscores=True)
+            removed, remaining = await pipe.execute()
+        # Membre déjà purgé : le worker qui l'a expiré a diffusé le départ.
+        if removed and key[1] not in _live_users(remaining, now - PRESENCE_TIMEOUT_SECONDS):
+            async with broker.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(seen_key, key[1], _iso(now))
+                pipe.expire(seen_key, PRESENCE_RETENTION_SECONDS)
+                await pipe.execute()
+            delta = _event("presence:delta", conversation_id, [_offline(key[1], now)], now)
+            await broker.publish_conversation(key[0], delta)
+
+    async def flush(self, broker: RealtimeBroker) -> None:
+        """Un pipeline pour tous les heartbeats locaux, puis purge des entrées expirées des conversations suivies."""
+        if not self._local:
+            return
+        redis = broker.redis
+        now = self.clock()
+        cutoff = now - PRESENCE_TIMEOUT_SECONDS
+        pairs = list(self._local)
+        conversations = sorted({conversation_id for conversation_id, _ in pairs})
+        async with redis.pipeline(transaction=True) as pipe:
+            for conversation_id, user_id in pairs:
+                pipe.zadd(_keys(conversation_id)[0], {_member(user_id, self.worker_id): now})
+            for conversation_id in conversations:
+                online_key = _keys(conversation_id)[0]
+                pipe.expire(online_key, PRESENCE_RETENTION_SECONDS)
+                pipe.zrangebyscore(online_key, "-inf", cutoff, withscores=True)
+                pipe.zremrangebyscore(online_key, "-inf", cutoff)
+                pipe.zrange(online_key, 0, -1, withscores=True)
+            results = await pipe.execute()
+
+        per_conversation = results[len(pairs):]
+        remaining_by_conversation = dict(zip(conversations, per_conversation[3::4]))
+        changes: dict[str, list[dict]] = defaultdict(list)
+        # ZADD renvoie 1 si le membre du worker manquait (purgé par un autre worker) : arrivée si
+        # l'utilisateur n'avait pas d'autre membre vivant.
+        for (conversation_id, user_id), added in zip(pairs, results):
+            if not added or (conversation_id, user_id) not in self._local:
+                continue
+            others = _live_users(
+                remaining_by_conversation[conversation_id], cutoff, exclude=_member(user_id, self.worker_id)
+            )
+            if user_id not in others:
+                changes[conversation_id].append(_online(user_id, now))
+        # Départ seulement pour les utilisateurs sans plus aucun membre vivant après la purge.
+        expired_by_conversation: dict[str, dict[str, float]] = {}
+        for conversation_id, expired in zip(conversations, per_conversation[1::4]):
+            live = _live_users(remaining_by_conversation[conversation_id], cutoff)
+            gone: dict[str, float] = {}
+            for member, score in expired:
+                user_id = _user_of(member)
+                if user_id not in live:
+                    gone[user_id] = max(score, gone.get(user_id, score))
+            if gone:
+                expired_by_conversation[conversation_id] = gone
+        for conversation_id, gone in expired_by_conversation.items():
+            changes[conversation_id].extend(_offline(user_id, score) for user_id, score in gone.items())
+        if not changes:
+            return
+        async with redis.pipeline(transaction=False) as pipe:
+            for conversation_id, gone in expired_by_conversation.items():
+                seen_key = _keys(conversation_id)[1]
+                pipe.hset(seen_key, mapping={user_id: _iso(score) for user_id, score in gone.items()})
+                pipe.expire(seen_key, PRESENCE_RETENTION_SECONDS)
+            for conversation_id, users in changes.items():
+                pipe.publish(
+                    f"conversation:{conversation_id}",
+                    json.dumps(_event("presence:delta", conversation_id, users, now)),
+                )
+            await pipe.execute()
+
+    async def run(self, broker: RealtimeBroker) -> None:
+        """Boucle du processus (lifespan) : un flush toutes les PRESENCE_HEARTBEAT_SECONDS."""
+        while True:
+            await asyncio.sleep(PRESENCE_HEARTBEAT_SECONDS)
+            try:
+                await self.flush(broker)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Heartbeat de présence impossible")
+
+
+presence_tracker = PresenceTracker()
+
+
+def client_event(conversation_id, user_id, data: dict) -> dict | None:
+    """Événement client (typing, signalisation d'appel) à relayer sur le canal de la conversation."""
+    event = data.get("event")
+    if event in TYPING_EVENTS:
+        return {
+            "event": event,
+            "payload": {
+                "conversation_id": str(conversation_id),
+                "user_id": str(user_id),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+        }
+    if event in CALL_EVENTS:
+        payload = dict(data.get("payload") or {})
+        payload["conversation_id"] = str(conversation_id)
+        payload["from_user_id"] = str(user_id)
+        if payload.get("target_user_id"):
+            payload["target_user_id"] = str(payload["target_user_id"])
+        return {"event": event, "payload": payload}
+    return None
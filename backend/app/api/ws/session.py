@@ -0,0 +1,275 @@
+"""
+Socket de session multiplexee : un WebSocket par appareil pour toutes les conversations et notifications.
+
+Protocole (trames JSON) :
+- client -> serveur : {"op": "subscribe" | "unsubscribe", "topic": "conversation:<id>", "ref": ...}
+                      {"op": "publish", "topic": "conversation:<id>", "event": ..., "payload": ...}
+                      {"op": "presence", "topic": "conversation:<id>"}  (snapshot de présence à la demande)
+                      {"op": "ping"}
+- serveur -> client : {"topic": "<topic>", "message": <evenement publie>}
+                      {"event": "ready" | "subscribed" | "unsubscribed" | "pong" | "error", ...}
+Le topic "user" (notifications de l'utilisateur) est souscrit d'office ; le client web le consomme ici
+et n'ouvre plus /ws/notifications (conservé pour les anciens clients).
+L'adhésion est vérifiée à la souscription puis toutes les WS_SESSION_RECHECK_SECONDS avec la session :
+un topic dont le membre a été retiré est fermé (erreur "forbidden"), une session révoquée ferme la socket (4401).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from starlette.websockets import WebSocketState
+
+from ...config import settings
+from ...core.principal import principal_cache
+from ...core.redis import RealtimeBroker
+from ...core.security import decode_token
+from ...db.session import async_session_factory
+from ...dependencies import get_realtime_broker
+from app.models import ConversationMember, MembershipState, SessionToken
+from . import presence
+
+logger = logging.getLogger(__name__)
+
+session_ws_router = APIRouter()
+
+USER_TOPIC = "user"
+CONVERSATION_PREFIX = "conversation:"
+
+
+async def _authenticate(token: str | None) -> tuple[uuid.UUID, uuid.UUID] | None:
+    """Vérifie le JWT et la session (cache des principaux, sinon une lecture courte)."""
+    if not token:
+        return None
+    try:
+        payload = decode_token(token)
+        user_id = uuid.UUID(str(payload.get("sub")))
+        session_id = uuid.UUID(str(payload.get("sid")))
+    except (ValueError, TypeError):
+        return None
+    now = datetime.now(timezone.utc)
+    principal = principal_cache.get(session_id, now)
+    if principal is not None:
+        return (user_id, session_id) if principal.user_id == user_id else None
+    generation = principal_cache.generation
+    async with async_session_factory() as db:
+        session = await db.get(SessionToken, session_id)
+    if (
+        session is None
+        or session.user_id != user_id
+        or session.revoked_at is not None
+        or (session.expires_at and session.expires_at < now)
+    ):
+        return None
+    principal_cache.put(session.id, session.user_id, session.expires_at, generation=generation)
+    return user_id, session_id
+
+
+async def _is_member(conversation_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    # Session DB courte : la socket ne garde aucune connexion du pool entre deux contrôles.
+    async with async_session_factory() as db:
+        result = await db.execute(
+            select(ConversationMember.id).where(
+                ConversationMember.conversation_id == conversation_id,
+                ConversationMember.user_id == user_id,
+                ConversationMember.state == MembershipState.ACTIVE,
+            )
+        )
+        return result.scalar_one_or_none() is not None
+
+
+async def _active_conversations(conversation_ids, user_id: uuid.UUID) -> set[uuid.UUID]:
+    """Parmi les conversations souscrites, celles où l'utilisateur est encore membre actif (une requête)."""
+    if not conversation_ids:
+        return set()
+    async with async_session_factory() as db:
+        result = await db.execute(
+            select(ConversationMember.conversation_id).where(
+                ConversationMember.conversation_id.in_(list(conversation_ids)),
+                ConversationMember.user_id == user_id,
+                ConversationMember.state == MembershipState.ACTIVE,
+            )
+        )
+        return set(result.scalars().all())
+
+
+def _conversation_id(topic) -> uuid.UUID | None:
+    if not isinstance(topic, str) or not topic.startswith(CONVERSATION_PREFIX):
+        return None
+    try:
+        return uuid.UUID(topic[len(CONVERSATION_PREFIX):])
+    except ValueError:
+        return None
+
+
+@session_ws_router.websocket("/session")
+async def session_ws(
+    websocket: WebSocket,
+    broker: RealtimeBroker = Depends(get_realtime_broker),
+) -> None:
+    """Socket unique par appareil : topics souscrits à la volée, autorisation vérifiée par topic."""
+    identity = await _authenticate(websocket.query_params.get("token"))
+    if identity is None:
+        logger.warning("WS session rejected: invalid token or session")
+        await websocket.close(code=4401)
+        return
+    user_id, session_id = identity
+
+    await websocket.accept()
+    redis = broker.redis if broker else None
+    if redis is None:
+        await websocket.send_text(json.dumps({"event": "error", "detail": "realtime_disabled"}))
+        await websocket.close()
+        return
+
+    subscription = broker.open_subscription()
+    user_channel = f"user:{user_id}:events"
+    await subscription.add(user_channel)
+    # topic client -> canal Redis, et conversations souscrites (présence)
+    topics: dict[str, str] = {USER_TOPIC: user_channel}
+    channel_topics: dict[str, str] = {user_channel: USER_TOPIC}
+    conversations: set[uuid.UUID] = set()
+
+    async def send_json(payload: dict) -> None:
+        with contextlib.suppress(Exception):
+            await websocket.send_text(json.dumps(payload))
+
+    async def subscribe(topic, ref) -> None:
+        # "user" est déjà souscrit : le client l'acquitte comme les autres topics.
+        if topic in topics:
+            await send_json({"event": "subscribed", "topic": topic, "ref": ref})
+            return
+        conversation_id = _conversation_id(topic)
+        if conversation_id is None:
+            await send_json({"event": "error", "topic": topic, "ref": ref, "detail": "unknown_topic"})
+            return
+        if len(conversations) >= settings.WS_SESSION_MAX_TOPICS:
+            await send_json({"event": "error", "topic": topic, "ref": ref, "detail": "too_many_topics"})
+            return
+        if not await _is_member(conversation_id, user_id):
+            await send_json({"event": "error", "topic": topic, "ref": ref, "detail": "forbidden"})
+            return
+        channel = f"conversation:{conversation_id}"
+        topics[topic] = channel
+        channel_topics[channel] = topic
+        conversations.add(conversation_id)
+        await subscription.add(channel)
+        await send_json({"event": "subscribed", "topic": topic, "ref": ref})
+        snapshot = await presence.presence_tracker.join(broker, conversation_id, user_id)
+        await send_json({"topic": topic, "message": snapshot})
+
+    async def unsubscribe(topic, ref) -> None:
+        conversation_id = _conversation_id(topic)
+        channel = topics.pop(topic, None) if conversation_id is not None else None
+        if channel is not None:
+            channel_topics.pop(channel, None)
+            conversations.discard(conversation_id)
+            await subscription.remove(channel)
+            await presence.presence_tracker.leave(broker, conversation_id, user_id)
+        await send_json({"event": "unsubscribed", "topic": topic, "ref": ref})
+
+    async def drop(conversation_id: uuid.UUID) -> None:
+        topic = f"{CONVERSATION_PREFIX}{conversation_id}"
+        channel = topics.pop(topic, None)
+        if channel is None:
+            return
+        channel_topics.pop(channel, None)
+        conversations.discard(conversation_id)
+        await subscription.remove(channel)
+        await presence.presence_tracker.leave(broker, conversation_id, user_id)
+        await send_json({"event": "error", "topic": topic, "detail": "forbidden"})
+
+    async def revalidate() -> None:
+        """Session révoquée ou membre retiré après la souscription : la socket ne garde pas ses droits."""
+        while True:
+            await asyncio.sleep(settings.WS_SESSION_RECHECK_SECONDS)
+            try:
+                if await _authenticate(websocket.query_params.get("token")) != identity:
+                    with contextlib.suppress(Exception):
+                        await websocket.close(code=4401)
+                    return
+                subscribed = set(conversations)
+                active = await _active_conversations(subscribed, user_id)
+                for conversation_id in subscribed - active:
+                    await drop(conversation_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Revalidation de la socket de session impossible")
+
+    async def sender() -> None:
+        """Relaye les messages de tous les topics ; la donnée publiée est déjà du JSON."""
+        try:
+            async for channel, data in subscription:
+                topic = channel_topics.get(channel)
+                if topic is None:
+                    continue
+                await websocket.send_text(f'{{"topic": {json.dumps(topic)}, "message": {data}}}')
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            return
+        if subscription.overflowed:
+            with contextlib.suppress(Exception):
+                await websocket.close(code=1013)
+
+    await send_json({"event": "ready", "user_id": str(user_id), "session_id": str(session_id)})
+    send_task = asyncio.create_task(sender())
+    recheck_task = asyncio.create_task(revalidate())
+    try:
+        while True:
+            try:
+                raw = await websocket.receive_text()
+            except WebSocketDisconnect:
+                break
+            except Exception:
+                if websocket.application_state == WebSocketState.DISCONNECTED:
+                    break
+                continue
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            op = data.get("op")
+            topic = data.get("topic")
+            ref = data.get("ref")
+            if op == "subscribe":
+                await subscribe(topic, ref)
+            elif op == "unsubscribe":
+                await unsubscribe(topic, ref)
+            elif op == "publish":
+                conversation_id = _conversation_id(topic)
+                if conversation_id not in conversations:
+                    await send_json({"event": "error", "topic": topic, "ref": ref, "detail": "not_subscribed"})
+                    continue
+                relayed = presence.client_event(conversation_id, user_id, data)
+                if relayed is not None:
+                    await broker.publish_conversation(str(conversation_id), relayed)
+            elif op == "presence":
+                conversation_id = _conversation_id(topic)
+                if conversation_id not in conversations:
+                    await send_json({"event": "error", "topic": topic, "ref": ref, "detail": "not_subscribed"})
+                    continue
+                await send_json({"topic": topic, "message": await presence.build_presence_payload(redis, conversation_id)})
+            elif op == "ping":
+                await send_json({"event": "pong", "ref": ref})
+    finally:
+        send_task.cancel()
+        recheck_task.cancel()
+        with contextlib.suppress(Exception):
+            await subscription.close()
+        for conversation_id in list(conversations):
+            with contextlib.suppress(Exception):
+                await presence.presence_tracker.leave(broker, conversation_id, user_id)
+        if websocket.application_state == WebSocketState.CONNECTED:
+            with contextlib.suppress(Exception):
+                await websocket.close()
@@ -14,9 +14,9 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import List
+from typing import List, Literal
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -34,6 +34,11 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = Field(..., description="SQLAlchemy connection string")
+    # Pool de l'engine (db/session.py) : connexions permanentes, débordement et attente d'une connexion.
+    # Le plafond global de l'admission en est dérivé (pool_size + max_overflow).
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 10
 
     # JWT / Security
     JWT_SECRET_KEY: str = Field(..., min_length=32)
@@ -45,6 +50,29 @@ class Settings(BaseSettings):
     MESSAGE_ENCRYPTION_ENABLED: bool = False
     MESSAGE_RSA_PUBLIC_KEY: str | None = None
     MESSAGE_RSA_PRIVATE_KEY: str | None = None
+    # Trousseau additionnel (rotation) : <key_id>.pem par clé, clé active dans le fichier "active".
+    MESSAGE_KEYRING_DIR: str | None = None
+    # Clés de données par conversation déballées gardées en mémoire (LRU par processus).
+    MESSAGE_DATA_KEY_CACHE_SIZE: int = 4096
+    # Déchiffrement des pages : en dessous du seuil inline, au-delà réparti sur la classe "crypto".
+    MESSAGE_DECRYPT_OFFLOAD_THRESHOLD: int = 32
+    # Travail CPU hors boucle (core/executors.py) : processus pour bcrypt/Pillow/QR, threads pour RSA/AES.
+    # 0 worker = exécution inline (dev/tests).
+    OFFLOAD_PROCESS_WORKERS: int = 2
+    OFFLOAD_THREAD_WORKERS: int = 4
+    # Concurrence par classe de travail et attente maximale avant refus immédiat (503).
+    OFFLOAD_PASSWORD_CONCURRENCY: int = 2
+    OFFLOAD_IMAGE_CONCURRENCY: int = 1
+    OFFLOAD_CRYPTO_CONCURRENCY: int = 4
+    OFFLOAD_MAX_WAITING: int = 32
+    OFFLOAD_CRYPTO_MAX_WAITING: int = 256
+    # Recherche : "plaintext" (search_text + tsvector) ou "blind" (jetons HMAC, aucun texte en clair
+    # en base ; voir scripts/reindex_blind_index.py). Le mode blind exige MESSAGE_BLIND_INDEX_KEY.
+    MESSAGE_SEARCH_MODE: Literal["plaintext", "blind"] = "plaintext"
+    MESSAGE_BLIND_INDEX_KEY: str | None = None
+    # Accusés de réception : "rows" (une livraison par membre et par message)
+    # ou "watermark" (positions livré/lu par membre, voir scripts/backfill_receipt_watermarks.py)
+    MESSAGE_RECEIPTS_MODE: Literal["rows", "watermark"] = "rows"
 
     # SMTP / Notifications (Email)
     SMTP_HOST: str | None = None
@@ -92,16 +120,64 @@ class Settings(BaseSettings):
         ]
     )
     ATTACHMENT_DOWNLOAD_TTL_SECONDS: int = 300
+    # Cache des URLs présignées : réutilisées tant qu'il reste plus que la marge de validité.
+    ATTACHMENT_URL_CACHE_SIZE: int = 10_000
+    ATTACHMENT_URL_CACHE_MARGIN_SECONDS: int = 180
     ATTACHMENT_UPLOAD_TOKEN_TTL_MINUTES: int = 60
 
     ANTIVIRUS_HOST: str | None = None
     ANTIVIRUS_PORT: int = 3310
 
+    # Admission (core/admission.py) : requêtes API simultanées par classe de route, part maximale
+    # d'une organisation dans chaque classe, attente avant 503 et file maximale par classe.
+    # Les classes se partagent en plus le plafond global des connexions DB (ADMISSION_DB_CONCURRENCY).
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_AUTH_CONCURRENCY: int = 8
+    ADMISSION_READ_CONCURRENCY: int = 32
+    ADMISSION_WRITE_CONCURRENCY: int = 12
+    ADMISSION_UPLOAD_CONCURRENCY: int = 4
+    ADMISSION_TENANT_SHARE: float = 0.5
+    ADMISSION_QUEUE_TIMEOUT_MS: int = 2000
+    ADMISSION_MAX_QUEUE: int = 200
+    # Plafond global des requêtes admises (0 = DB_POOL_SIZE + DB_MAX_OVERFLOW).
+    ADMISSION_DB_CONCURRENCY: int = 0
+    # Reverse proxies dont X-Forwarded-For est cru (IP ou réseaux, séparés par des virgules ; "*" = tous).
+    # Sans cela, tous les clients anonymes (login, register...) partagent la part d'admission du proxy.
+    FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+
     # CORS / Frontend
     BACKEND_CORS_ORIGINS: List[str] = Field(default_factory=list)
 
     # Redis (pour temps réel ultérieur)
     REDIS_URL: str | None = None
+    # Messages en attente par abonné local du hub pub/sub ; au-delà, la socket lente est coupée.
+    REALTIME_SUBSCRIBER_QUEUE_SIZE: int = 256
+    # Conversations souscrites au plus par socket de session (/ws/session).
+    WS_SESSION_MAX_TOPICS: int = 200
+    # Période (s) de revalidation de la session et des adhésions d'une socket de session.
+    WS_SESSION_RECHECK_SECONDS: float = 60.0
+    # Fenêtre chaude des derniers messages par conversation (0 = désactivée).
+    # Le TTL est borné à la moitié de ATTACHMENT_DOWNLOAD_TTL_SECONDS (URLs présignées en cache).
+    MESSAGE_CACHE_WINDOW: int = 200
+    # Membres renvoyés avec chaque conversation de la liste ; le roster complet est paginé à part.
+    CONVERSATION_MEMBER_PREVIEW_SIZE: int = 8
+    MESSAGE_CACHE_TTL_SECONDS: int = 120
+    # Compteurs de non lus en Redis : recalculés depuis la base à expiration (borne la dérive).
+    UNREAD_COUNTER_TTL_SECONDS: int = 3600
+    # Instantané /me/overview par utilisateur, invalidé par les événements contacts/appareils/messages (0 = désactivé).
+    OVERVIEW_CACHE_TTL_SECONDS: int = 30
+    # Sessions verifiees gardees en memoire par worker ; revocations propagees via Redis (0 = desactive).
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000
+    # Ecriture groupee de session_tokens.last_activity_at (0 = ecriture a chaque requete).
+    AUTH_SESSION_ACTIVITY_FLUSH_SECONDS: int = 60
+
+    @model_validator(mode="after")
+    def _check_search_mode(self) -> "Settings":
+        # Sans clé, chaque envoi/édition échouerait (jetons HMAC) : refus au démarrage.
+        if self.MESSAGE_SEARCH_MODE == "blind" and not self.MESSAGE_BLIND_INDEX_KEY:
+            raise ValueError("MESSAGE_BLIND_INDEX_KEY is required when MESSAGE_SEARCH_MODE='blind'")
+        return self
 
 
 @lru_cache()
@@ -0,0 +1,321 @@
+"""
+############################################################
+# Module : Admission (concurrence par classe de route et par organisation)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-28
+#
+# Description:
+# - Middleware ASGI : chaque requete API prend un jeton de son organisation puis un jeton
+#   de sa classe (auth, read, write, upload) avant d'atteindre les routes.
+# - Une organisation ne peut tenir qu'une part (ADMISSION_TENANT_SHARE) des jetons d'une classe :
+#   ses pics attendent dans sa propre file sans affamer les autres.
+# - Attente FIFO jusqu'a une echeance (ADMISSION_QUEUE_TIMEOUT_MS), puis 503 + Retry-After ;
+#   au-dela de ADMISSION_MAX_QUEUE requetes en attente dans une classe, refus immediat.
+# - Profondeur des files et requetes en cours exposees dans /metrics (section "admission").
+#
+# Points de vigilance:
+# - La cle d'organisation vient du claim "org" du JWT (signature verifiee, session non) ;
+#   a defaut l'utilisateur, puis l'adresse du client. Derriere nginx, l'adresse vient de
+#   X-Forwarded-For via ProxyHeadersMiddleware (FORWARDED_ALLOW_IPS) : sinon tous les anonymes
+#   partageraient la part du proxy dans la classe auth.
+# - Les jetons sont rendus a la fin de la reponse (streaming compris) ; les WebSockets,
+#   /healthz, /metrics et /static ne passent pas par l'admission.
+# - Plafond global "db" = DB_POOL_SIZE + DB_MAX_OVERFLOW (ou ADMISSION_DB_CONCURRENCY) : toutes classes
+#   confondues, les requetes admises ne demandent pas plus de connexions que le pool n'en a.
+#   /me/overview compte pour OVERVIEW_DB_SESSIONS (5) connexions.
+############################################################
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Callable
+
+from ..config import settings
+from .metrics import metrics
+from .security import decode_token
+
+AUTH = "auth"
+READ = "read"
+WRITE = "write"
+UPLOAD = "upload"
+# /me/overview : session de la requête + 4 sessions du pool ouvertes en parallèle (api/routes/me.py).
+OVERVIEW_DB_SESSIONS = 5
+
+
+class _Slots:
+    """Sémaphore FIFO pondéré avec échéance : les jetons libérés passent directement aux premiers en attente."""
+
+    __slots__ = ("limit", "active", "waiters")
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.active = 0
+        self.waiters: deque[tuple[asyncio.Future, int]] = deque()
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self.waiters
+
+    async def acquire(self, deadline: float, weight: int = 1) -> bool:
+        weight = min(max(1, weight), self.limit)
+        if not self.waiters and self.active + weight <= self.limit:
+            self.active += weight
+            return True
+        loop = asyncio.get_running_loop()
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            return False
+        waiter = loop.create_future()
+        entry = (waiter, weight)
+        self.waiters.append(entry)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Jetons transmis au moment même de l'échéance ou de l'annulation.
+                if isinstance(exc, asyncio.CancelledError):
+                    self.release(weight)
+                    raise
+                return True
+            try:
+                self.waiters.remove(entry)
+            except ValueError:
+                pass
+            # Une demande lourde retirée de la tête peut débloquer les suivantes.
+            self._wake()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            return False
+
+    def release(self, weight: int = 1) -> None:
+        self.active = max(0, self.active - min(max(1, weight), self.limit))
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.waiters:
+            waiter, weight = self.waiters[0]
+            if waiter.done():
+                self.waiters.popleft()
+                continue
+            if self.active + weight > self.limit:
+                return
+            self.waiters.popleft()
+            self.active += weight
+            waiter.set_result(None)
+
+
+class AdmissionController:
+    """Jetons par classe de route et par (classe, organisation), avec files bornées."""
+
+    def __init__(
+        self,
+        limits: dict[str, int] | None = None,
+        *,
+        tenant_share: float | None = None,
+        queue_timeout_ms: int | None = None,
+        max_queue: int | None = None,
+        db_limit: int | None = None,
+    ) -> None:
+        self.limits = limits if limits is not None else {
+            AUTH: settings.ADMISSION_AUTH_CONCURRENCY,
+            READ: settings.ADMISSION_READ_CONCURRENCY,
+            WRITE: settings.ADMISSION_WRITE_CONCURRENCY,
+            UPLOAD: settings.ADMISSION_UPLOAD_CONCURRENCY,
+        }
+        share = settings.ADMISSION_TENANT_SHARE if tenant_share is None else tenant_share
+        self.queue_timeout = (
+            settings.ADMISSION_QUEUE_TIMEOUT_MS if queue_timeout_ms is None else queue_timeout_ms
+        ) / 1000
+        self.max_queue = settings.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        # Plafond global calé sur le pool SQLAlchemy : toutes classes confondues, jamais plus de
+        # connexions demandées que le pool n'en fournit (sinon attente pool_timeout au lieu d'un 503).
+        if db_limit is None:
+            db_limit = settings.ADMISSION_DB_CONCURRENCY or (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+        self._db = _Slots(db_limit)
+        self._classes = {name: _Slots(limit) for name, limit in self.limits.items()}
+        self._tenant_limits = {name: max(1, math.ceil(limit * share)) for name, limit in self.limits.items()}
+        self._tenants: dict[tuple[str, str], _Slots] = {}
+        self._queued = {name: 0 for name in self.limits}
+
+    async def admit(self, work_class: str, tenant: str, *, db_weight: int = 1) -> Callable[[], None] | None:
+        """Retourne la fonction de libération, ou None si la requête doit être rejetée (503).
+
+        `db_weight` : connexions du pool que la requête peut tenir simultanément (voir db_weight()).
+        """
+        if self._queued[work_class] >= self.max_queue:
+            metrics.increment("admission_shed_total", route_class=work_class, reason="queue_full")
+            return None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        enqueued = time.perf_counter()
+        key = (work_class, tenant)
+        tenant_slots = self._tenants.get(key)
+        if tenant_slots is None:
+            tenant_slots = self._tenants[key] = _Slots(self._tenant_limits[work_class])
+        class_slots = self._classes[work_class]
+
+        self._queued[work_class] += 1
+        admitted = False
+        try:
+            if not await tenant_slots.acquire(deadline):
+                metrics.increment("admission_shed_total", route_class=work_class, reason="tenant_timeout")
+                return None
+            try:
+                if not await class_slots.acquire(deadline):
+                    metrics.increment("admission_shed_total", route_class=work_class, reason="class_timeout")
+                    return None
+                try:
+                    admitted = await self._db.acquire(deadline, db_weight)
+                finally:
+                    if not admitted:
+                        class_slots.release()
+                if not admitted:
+                    metrics.increment("admission_shed_total", route_class=work_class, reason="db_timeout")
+                    return None
+            finally:
+                if not admitted:
+                    tenant_slots.release()
+        finally:
+            self._queued[work_class] -= 1
+            if not admitted:
+                self._forget(key, tenant_slots)
+        metrics.observe("admission_wait_seconds", time.perf_counter() - enqueued, route_class=work_class)
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            self._db.release(db_weight)
+            class_slots.release()
+            tenant_slots.release()
+            self._forget(key, tenant_slots)
+
+        return release
+
+    def _forget(self, key: tuple[str, str], slots: _Slots) -> None:
+        if slots.idle and self._tenants.get(key) is slots:
+            del self._tenants[key]
+
+    def snapshot(self) -> dict:
+        classes = {
+            name: {
+                "limit": slots.limit,
+                "in_flight": slots.active,
+                "queued": self._queued[name],
+                "tenants": sum(1 for work_class, _ in self._tenants if work_class == name),
+            }
+            for name, slots in self._classes.items()
+        }
+        classes["db"] = {"limit": self._db.limit, "in_flight": self._db.active, "queued": len(self._db.waiters)}
+        return classes
+
+
+def classify(method: str, path: str) -> str | None:
+    """Classe de route d'une requête HTTP, ou None si elle échappe à l'admission."""
+    prefix = settings.API_V1_PREFIX.rstrip("/") + "/"
+    if method == "OPTIONS" or not path.startswith(prefix):
+        return None
+    relative = path[len(prefix) - 1:]
+    if relative.startswith("/auth/"):
+        return AUTH
+    if method in ("GET", "HEAD"):
+        return READ
+    if relative.endswith("/attachments") or relative.endswith("/avatar"):
+        return UPLOAD
+    return WRITE
+
+
+def db_weight(method: str, path: str) -> int:
+    """Connexions du pool tenues au plus par la requête : 1, sauf /me/overview (sections en parallèle)."""
+    if method == "GET" and path == settings.API_V1_PREFIX.rstrip("/") + "/me/overview":
+        return OVERVIEW_DB_SESSIONS
+    return 1
+
+
+def tenant_key(scope: dict) -> str:
+    """Organisation du JWT, sinon utilisateur, sinon adresse du client."""
+    for name, value in scope.get("headers") or ():
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    payload = decode_token(token.strip())
+                except ValueError:
+                    break
+                if payload.get("org"):
+                    return f"org:{payload['org']}"
+                if payload.get("sub"):
+                    return f"user:{payload['sub']}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI pur (pas de BaseHTTPMiddleware : le streaming reste intact)."""
+
+    def __init__(self, app, controller: AdmissionController | None = None) -> None:
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        work_class = classify(scope["method"], scope["path"])
+        if work_class is None:
+            await self.app(scope, receive, send)
+            return
+        release = await self.controller.admit(
+            work_class, tenant_key(scope), db_weight=db_weight(scope["method"], scope["path"])
+        )
+        if release is None:
+            await _send_overloaded(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            release()
+
+
+async def _send_overloaded(send) -> None:
+    body = json.dumps({"detail": "Serveur occupe, reessayez dans un instant."}).encode("utf-8")
+    retry_after = max(1, math.ceil(settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000))
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(retry_after).encode("ascii")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+admission = AdmissionController()
+
+
+__all__ = [
+    "AUTH",
+    "READ",
+    "UPLOAD",
+    "WRITE",
+    "AdmissionController",
+    "AdmissionMiddleware",
+    "admission",
+    "classify",
+    "db_weight",
+    "tenant_key",
+]
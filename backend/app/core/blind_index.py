@@ -0,0 +1,94 @@
+"""
+############################################################
+# Module : Index aveugle (recherche sur messages chiffres)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-23
+#
+# Description:
+# - Normalise un texte en mots (minuscules, sans accents) et derive pour chacun un jeton
+#   HMAC-SHA256 tronque a 64 bits, stocke dans messages.search_tokens (bigint[] + GIN).
+# - La recherche calcule les jetons des termes et interroge par inclusion (@>) : aucun
+#   texte en clair n'est conserve en base.
+# - Fournit un surlignage des termes pour les extraits, sur le texte dechiffre : texte echappe
+#   (HTML), seules les balises <mark> ajoutees sont du balisage.
+#
+# Points de vigilance:
+# - Changer MESSAGE_BLIND_INDEX_KEY invalide tous les jetons : relancer
+#   scripts/reindex_blind_index.py.
+# - Fuite residuelle assumee : des messages contenant le meme mot partagent un jeton.
+############################################################
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import html
+import re
+import unicodedata
+
+from ..config import settings
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+MIN_WORD_LENGTH = 2
+MAX_TOKENS_PER_MESSAGE = 512
+
+
+def normalize_words(text: str | None) -> list[str]:
+    """Mots distincts, en minuscules et sans diacritiques, dans l'ordre d'apparition."""
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    seen: dict[str, None] = {}
+    for word in _WORD_RE.findall(stripped):
+        if len(word) >= MIN_WORD_LENGTH:
+            seen.setdefault(word, None)
+    return list(seen)
+
+
+def _token(key: bytes, word: str) -> int:
+    digest = hmac.new(key, word.encode("utf-8"), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _key(key: str | None) -> bytes:
+    secret = key if key is not None else settings.MESSAGE_BLIND_INDEX_KEY
+    if not secret:
+        raise RuntimeError("MESSAGE_BLIND_INDEX_KEY is required for blind index search")
+    return secret.encode("utf-8")
+
+
+def blind_tokens(text: str | None, *, key: str | None = None) -> list[int]:
+    """Jetons HMAC (bigint signes) des mots d'un message, bornes a MAX_TOKENS_PER_MESSAGE."""
+    secret = _key(key)
+    return [_token(secret, word) for word in normalize_words(text)[:MAX_TOKENS_PER_MESSAGE]]
+
+
+def highlight(text: str, terms: list[str], *, width: int = 160) -> str:
+    """Extrait centre sur le premier terme trouve : texte echappe (HTML), termes entoures de <mark>."""
+    wanted = set(normalize_words(" ".join(terms)))
+    matches = []
+    for match in _WORD_RE.finditer(text):
+        words = normalize_words(match.group(0))
+        if words and words[0] in wanted:
+            matches.append(match)
+    if not matches:
+        return html.escape(text[:width])
+    start = max(0, matches[0].start() - width // 3)
+    end = min(len(text), start + width)
+    parts: list[str] = []
+    cursor = start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(html.escape(text[cursor:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        cursor = match.end()
+    parts.append(html.escape(text[cursor:end]))
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+__all__ = ["blind_tokens", "highlight", "normalize_words"]
@@ -0,0 +1,179 @@
+"""
+############################################################
+# Module : Executeurs CPU (travail synchrone hors boucle)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-27
+#
+# Description:
+# - Un pool de processus (bcrypt, Pillow, QR : code qui garde le GIL) et un pool de threads
+#   (RSA/AES-GCM via cryptography, qui relache le GIL), partages par le worker.
+# - Chaque classe de travail a sa propre limite de concurrence et une file d'attente bornee :
+#   au-dela, OffloadRejected est leve (503 + Retry-After, voir main.py) au lieu d'empiler.
+# - Metriques : temps d'attente (offload_queue_seconds), duree d'execution, refus.
+#
+# Points de vigilance:
+# - Les fonctions envoyees au pool de processus doivent etre importables (niveau module)
+#   et leurs arguments picklables ; contexte "spawn" (pas de fork d'une boucle en cours).
+# - 0 worker = execution inline sur la boucle (dev/tests).
+############################################################
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, TypeVar
+
+from ..config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PASSWORD = "password"
+IMAGE = "image"
+CRYPTO = "crypto"
+
+
+class OffloadRejected(RuntimeError):
+    """File d'attente d'une classe de travail pleine : la requête doit être refusée tout de suite."""
+
+    def __init__(self, work_class: str) -> None:
+        super().__init__(f"Offload queue saturated: {work_class}")
+        self.work_class = work_class
+
+
+@dataclass(frozen=True)
+class WorkClass:
+    name: str
+    pool: Literal["process", "thread"]
+    concurrency: int
+    max_waiting: int
+
+
+def _default_classes() -> dict[str, WorkClass]:
+    return {
+        PASSWORD: WorkClass(PASSWORD, "process", settings.OFFLOAD_PASSWORD_CONCURRENCY, settings.OFFLOAD_MAX_WAITING),
+        IMAGE: WorkClass(IMAGE, "process", settings.OFFLOAD_IMAGE_CONCURRENCY, settings.OFFLOAD_MAX_WAITING),
+        CRYPTO: WorkClass(CRYPTO, "thread", settings.OFFLOAD_CRYPTO_CONCURRENCY, settings.OFFLOAD_CRYPTO_MAX_WAITING),
+    }
+
+
+class Offloader:
+    """Répartit le travail CPU par classe sur les pools partagés, avec limite et refus rapide."""
+
+    def __init__(
+        self,
+        classes: dict[str, WorkClass] | None = None,
+        *,
+        process_workers: int | None = None,
+        thread_workers: int | None = None,
+    ) -> None:
+        self.classes = classes if classes is not None else _default_classes()
+        self.process_workers = settings.OFFLOAD_PROCESS_WORKERS if process_workers is None else process_workers
+        self.thread_workers = settings.OFFLOAD_THREAD_WORKERS if thread_workers is None else thread_workers
+        self._pools: dict[str, Executor] = {}
+        self._pools_lock = threading.Lock()
+        self._limiters: dict[str, asyncio.Semaphore] = {}
+        self._limiters_loop: asyncio.AbstractEventLoop | None = None
+        self._waiting: dict[str, int] = {name: 0 for name in self.classes}
+
+    def _executor(self, pool: str) -> Executor | None:
+        workers = self.process_workers if pool == "process" else self.thread_workers
+        if workers <= 0:
+            return None
+        with self._pools_lock:
+            executor = self._pools.get(pool)
+            if executor is None:
+                if pool == "process":
+                    executor = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="offload")
+                self._pools[pool] = executor
+            return executor
+
+    def _limiter(self, spec: WorkClass) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._limiters_loop is not loop:
+            self._limiters = {}
+            self._limiters_loop = loop
+        limiter = self._limiters.get(spec.name)
+        if limiter is None:
+            limiter = self._limiters[spec.name] = asyncio.Semaphore(max(1, spec.concurrency))
+        return limiter
+
+    async def run(self, work_class: str, fn: Callable[..., T], *args: Any) -> T:
+        """Exécute fn(*args) dans le pool de la classe ; lève OffloadRejected si la file est pleine."""
+        spec = self.classes[work_class]
+        limiter = self._limiter(spec)
+        if limiter.locked() and self._waiting[spec.name] >= spec.max_waiting:
+            metrics.increment("offload_rejected_total", work_class=spec.name)
+            raise OffloadRejected(spec.name)
+
+        enqueued = time.perf_counter()
+        self._waiting[spec.name] += 1
+        try:
+            await limiter.acquire()
+        finally:
+            self._waiting[spec.name] -= 1
+        try:
+            started = time.perf_counter()
+            metrics.observe("offload_queue_seconds", started - enqueued, work_class=spec.name)
+            executor = self._executor(spec.pool)
+            if executor is None:
+                result = fn(*args)
+            else:
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+                except BrokenProcessPool:
+                    # Un processus est mort (OOM, signal) : le pool est recréé au prochain appel.
+                    self._discard(spec.pool, executor)
+                    raise
+            metrics.observe("offload_run_seconds", time.perf_counter() - started, work_class=spec.name)
+            return result
+        finally:
+            limiter.release()
+
+    def waiting(self, work_class: str) -> int:
+        return self._waiting.get(work_class, 0)
+
+    def _discard(self, pool: str, executor: Executor) -> None:
+        with self._pools_lock:
+            if self._pools.get(pool) is executor:
+                del self._pools[pool]
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for executor in pools.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+offloader = Offloader()
+
+
+async def offload(work_class: str, fn: Callable[..., T], *args: Any) -> T:
+    return await offloader.run(work_class, fn, *args)
+
+
+__all__ = [
+    "CRYPTO",
+    "IMAGE",
+    "PASSWORD",
+    "OffloadRejected",
+    "Offloader",
+    "WorkClass",
+    "offload",
+    "offloader",
+]
@@ -0,0 +1,41 @@
+"""
+############################################################
+# Module : Rendus d'images (avatars, QR codes)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-27
+#
+# Description:
+# - Fonctions pures executees dans le pool de processus (classe "image", core/executors.py).
+# - Aucun import applicatif : un worker "spawn" ne charge que Pillow et qrcode.
+############################################################
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+
+import qrcode
+from PIL import Image
+
+
+def render_avatar(data: bytes, max_size: int, output_path: str) -> None:
+    """Décode l'image, la réduit à max_size et l'écrit en PNG optimisé (UnidentifiedImageError si illisible)."""
+    image = Image.open(io.BytesIO(data))
+    image = image.convert("RGBA")
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    image.save(output_path, format="PNG", optimize=True)
+
+
+def render_qr_base64(payload: str) -> str:
+    """QR code PNG encodé en base64 pour une URI (provisioning TOTP)."""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_Q, border=2)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    image = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+__all__ = ["render_avatar", "render_qr_base64"]
@@ -0,0 +1,210 @@
+"""
+############################################################
+# Module : Trousseau de cles RSA des messages
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-20
+#
+# Description:
+# - Charge une seule fois par processus les cles RSA servant a envelopper les cles AES.
+# - Chaque cle porte un identifiant (key_id) ecrit dans les metadonnees chiffrees,
+#   ce qui permet d'en detenir plusieurs a la fois et de faire tourner la cle active.
+# - Sources : MESSAGE_RSA_PUBLIC_KEY/PRIVATE_KEY (key_id = empreinte SHA-256) et,
+#   optionnellement, MESSAGE_KEYRING_DIR (<key_id>.pem, cle active dans le fichier "active").
+# - Rechargement a chaud sur SIGHUP ou via la route admin, sans redemarrage.
+#
+# Points de vigilance:
+# - Le rechargement remplace un instantane immuable : les lectures concurrentes (threads
+#   de dechiffrement compris) voient toujours un jeu de cles coherent.
+# - Une cle retiree du trousseau rend illisibles les donnees qu'elle enveloppe : ne supprimer
+#   un fichier qu'apres re-enveloppement.
+############################################################
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import signal
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from ..config import settings
+from .executors import CRYPTO, OffloadRejected, offload
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_FILE = "active"
+
+
+def _oaep() -> padding.OAEP:
+    return padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+
+def key_fingerprint(public_key: rsa.RSAPublicKey) -> str:
+    """Identifiant stable d'une cle : 16 premiers caracteres hexa du SHA-256 de sa forme DER."""
+    der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class MessageKey:
+    key_id: str
+    public_key: rsa.RSAPublicKey
+    private_key: rsa.RSAPrivateKey | None = None
+
+
+@dataclass(frozen=True)
+class _KeySet:
+    keys: dict[str, MessageKey]
+    active_key_id: str | None
+
+
+class MessageKeyring:
+    """Jeu de cles RSA du processus : enveloppe avec la cle active, deballe avec n'importe laquelle."""
+
+    def __init__(self, keys: list[MessageKey] | None = None, *, active_key_id: str | None = None) -> None:
+        self._snapshot = self._build(keys or [], active_key_id)
+
+    @staticmethod
+    def _build(keys: list[MessageKey], active_key_id: str | None) -> _KeySet:
+        by_id = {key.key_id: key for key in keys}
+        if active_key_id not in by_id:
+            if active_key_id:
+                logger.warning("Active message key %s not found in keyring", active_key_id)
+            active_key_id = keys[0].key_id if keys else None
+        return _KeySet(keys=by_id, active_key_id=active_key_id)
+
+    @classmethod
+    def from_settings(cls) -> "MessageKeyring":
+        keyring = cls()
+        keyring.reload()
+        return keyring
+
+    @property
+    def active(self) -> MessageKey | None:
+        snapshot = self._snapshot
+        return snapshot.keys.get(snapshot.active_key_id) if snapshot.active_key_id else None
+
+    @property
+    def key_ids(self) -> list[str]:
+        return list(self._snapshot.keys)
+
+    def get(self, key_id: str) -> MessageKey | None:
+        return self._snapshot.keys.get(key_id)
+
+    @property
+    def can_encrypt(self) -> bool:
+        active = self.active
+        return bool(active and active.private_key)
+
+    def wrap(self, data: bytes) -> tuple[str, bytes]:
+        """Enveloppe une cle AES avec la cle active ; retourne (key_id, donnees enveloppees)."""
+        active = self.active
+        if active is None:
+            raise RuntimeError("No active message key")
+        return active.key_id, active.public_key.encrypt(data, _oaep())
+
+    def unwrap(self, wrapped: bytes, key_id: str | None = None) -> bytes:
+        """Deballe une cle AES ; sans key_id (donnees anterieures au trousseau), essaie chaque cle."""
+        snapshot = self._snapshot
+        if key_id is not None:
+            key = snapshot.keys.get(key_id)
+            if key is None or key.private_key is None:
+                raise LookupError(f"Unknown message key {key_id}")
+            return key.private_key.decrypt(wrapped, _oaep())
+        candidates = sorted(snapshot.keys.values(), key=lambda item: item.key_id != snapshot.active_key_id)
+        for key in candidates:
+            if key.private_key is None:
+                continue
+            try:
+                return key.private_key.decrypt(wrapped, _oaep())
+            except ValueError:
+                continue
+        raise LookupError("No message key can unwrap this data")
+
+    def reload(self) -> list[str]:
+        """Relit les cles configurees et remplace l'instantane ; retourne les key_id charges."""
+        keys: list[MessageKey] = []
+        inline = _load_inline_key()
+        if inline is not None:
+            keys.append(inline)
+        active_key_id = inline.key_id if inline else None
+
+        directory = Path(settings.MESSAGE_KEYRING_DIR) if settings.MESSAGE_KEYRING_DIR else None
+        if directory and directory.is_dir():
+            for path in sorted(directory.glob("*.pem")):
+                try:
+                    private_key = serialization.load_pem_private_key(path.read_bytes(), password=None)
+                except (ValueError, TypeError):
+                    logger.warning("Ignoring unreadable message key %s", path.name)
+                    continue
+                keys.append(MessageKey(path.stem, private_key.public_key(), private_key))
+            active_path = directory / ACTIVE_FILE
+            if active_path.is_file():
+                active_key_id = active_path.read_text().strip() or active_key_id
+
+        self._snapshot = self._build(keys, active_key_id)
+        logger.info("Message keyring loaded: %s (active=%s)", self.key_ids, self._snapshot.active_key_id)
+        return self.key_ids
+
+
+def _load_inline_key() -> MessageKey | None:
+    private_key = None
+    public_key = None
+    if settings.MESSAGE_RSA_PRIVATE_KEY:
+        try:
+            private_key = serialization.load_pem_private_key(settings.MESSAGE_RSA_PRIVATE_KEY.encode("utf-8"), password=None)
+            public_key = private_key.public_key()
+        except (ValueError, TypeError):
+            logger.warning("MESSAGE_RSA_PRIVATE_KEY is not a valid PEM private key")
+    if public_key is None and settings.MESSAGE_RSA_PUBLIC_KEY:
+        try:
+            public_key = serialization.load_pem_public_key(settings.MESSAGE_RSA_PUBLIC_KEY.encode("utf-8"))
+        except (ValueError, TypeError):
+            logger.warning("MESSAGE_RSA_PUBLIC_KEY is not a valid PEM public key")
+    if public_key is None:
+        return None
+    return MessageKey(key_fingerprint(public_key), public_key, private_key)
+
+
+@lru_cache()
+def get_keyring() -> MessageKeyring:
+    return MessageKeyring.from_settings()
+
+
+_reload_tasks: set[asyncio.Task] = set()
+
+
+async def _reload_on_signal() -> None:
+    # Meme chemin que la route admin : pool "crypto" borne, refus immediat s'il est sature.
+    try:
+        key_ids = await offload(CRYPTO, get_keyring().reload)
+    except OffloadRejected:
+        logger.warning("SIGHUP keyring reload rejected: crypto offload queue is full")
+    except Exception:
+        logger.exception("SIGHUP keyring reload failed")
+    else:
+        logger.info("Message keyring reloaded on SIGHUP (%d keys)", len(key_ids))
+
+
+def _schedule_reload(loop) -> asyncio.Task:
+    task = loop.create_task(_reload_on_signal())
+    _reload_tasks.add(task)
+    task.add_done_callback(_reload_tasks.discard)
+    return task
+
+
+def install_reload_signal(loop) -> None:
+    """Recharge le trousseau sur SIGHUP (no-op sur les plateformes sans signaux Unix)."""
+    try:
+        loop.add_signal_handler(signal.SIGHUP, _schedule_reload, loop)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        logger.debug("SIGHUP keyring reload unavailable on this platform")
+
+
+__all__ = ["MessageKey", "MessageKeyring", "get_keyring", "install_reload_signal", "key_fingerprint"]
@@ -0,0 +1,190 @@
+"""
+############################################################
+# Module : Cache fenetre chaude des messages (Redis)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-18
+#
+# Description:
+# - Conserve les N derniers payloads de messages d'une conversation, neutres vis-a-vis
+#   du viewer (pas d'etat de livraison ni de "reacted"), dans un ZSET score = stream_position.
+# - Un hash meta indique le plancher (floor) et si la fenetre couvre toute la conversation.
+# - Un compteur de version rend le remplissage sur, face aux ajouts/patchs concurrents.
+#
+# Points de vigilance:
+# - Les payloads contiennent le texte dechiffre et des URLs presignees : le TTL doit rester
+#   inferieur a ATTACHMENT_DOWNLOAD_TTL_SECONDS (il est borne a la moitie) et a la marge
+#   ATTACHMENT_URL_CACHE_MARGIN_SECONDS des URLs reutilisees par ObjectStorage.
+# - Les ajouts/patchs ne prolongent pas le TTL : la fenetre entiere expire avec ses URLs.
+############################################################
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from typing import Any
+
+import redis.asyncio as aioredis
+
+from ..config import settings
+
+_VERSION_TTL_SECONDS = 24 * 3600
+
+# Remplace la fenetre si aucune ecriture n'a eu lieu depuis la lecture de la version.
+_FILL_SCRIPT = """
+local current = redis.call('GET', KEYS[3]) or '0'
+if current ~= ARGV[1] then
+  return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+for i = 5, #ARGV, 2 do
+  redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[2], 'floor', ARGV[3], 'complete', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+# Ajoute (mode append) ou remplace s'il existe (mode patch) un payload ; invalide les remplissages en cours.
+_UPSERT_SCRIPT = """
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  return 0
+end
+local removed = redis.call('ZREMRANGEBYSCORE', KEYS[1], ARGV[1], ARGV[1])
+if ARGV[4] == 'patch' and removed == 0 then
+  return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then
+  redis.call('PEXPIRE', KEYS[1], ttl)
+end
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[3])
+if excess > 0 then
+  redis.call('ZREMRANGEBYRANK', KEYS[1], 0, excess - 1)
+  local first = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  redis.call('HSET', KEYS[2], 'floor', first[2], 'complete', '0')
+end
+return 1
+"""
+
+
+class MessageWindowCache:
+    """Fenetre des derniers payloads de messages par conversation (lecture keyset sans Postgres)."""
+
+    def __init__(
+        self,
+        redis: aioredis.Redis | None,
+        *,
+        window: int | None = None,
+        ttl_seconds: int | None = None,
+    ) -> None:
+        self.redis = redis
+        self.window = settings.MESSAGE_CACHE_WINDOW if window is None else window
+        requested_ttl = settings.MESSAGE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.ttl_seconds = max(
+            1,
+            min(
+                requested_ttl,
+                settings.ATTACHMENT_DOWNLOAD_TTL_SECONDS // 2,
+                settings.ATTACHMENT_URL_CACHE_MARGIN_SECONDS,
+            ),
+        )
+        self._fill = redis.register_script(_FILL_SCRIPT) if redis else None
+        self._upsert = redis.register_script(_UPSERT_SCRIPT) if redis else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None and self.window > 0
+
+    @staticmethod
+    def _keys(conversation_id: uuid.UUID) -> list[str]:
+        base = f"msgwin:{conversation_id}"
+        return [base, f"{base}:meta", f"{base}:ver"]
+
+    async def version(self, conversation_id: uuid.UUID) -> str:
+        """Version courante, a relire avant la requete DB qui alimentera fill()."""
+        value = await self.redis.get(self._keys(conversation_id)[2])
+        return value or "0"
+
+    async def fill(
+        self,
+        conversation_id: uuid.UUID,
+        payloads: list[dict],
+        *,
+        complete: bool,
+        expected_version: str,
+    ) -> bool:
+        """Ecrit la fenetre (payloads par position croissante) si aucune ecriture concurrente n'est survenue."""
+        floor = payloads[0]["stream_position"] if payloads else 0
+        args: list[Any] = [expected_version, self.ttl_seconds, floor, "1" if complete else "0"]
+        for payload in payloads:
+            args.extend([payload["stream_position"], json.dumps(payload)])
+        return bool(await self._fill(keys=self._keys(conversation_id), args=args))
+
+    async def append(self, conversation_id: uuid.UUID, payload: dict) -> None:
+        """Ajoute un nouveau message en tete de fenetre (si elle existe) et la retaille."""
+        await self._write(conversation_id, payload, "append")
+
+    async def patch(self, conversation_id: uuid.UUID, payload: dict) -> None:
+        """Remplace un message deja present dans la fenetre (edition, suppression, pin, reaction)."""
+        await self._write(conversation_id, payload, "patch")
+
+    async def _write(self, conversation_id: uuid.UUID, payload: dict, mode: str) -> None:
+        position = payload.get("stream_position")
+        if position is None:
+            return
+        await self._upsert(
+            keys=self._keys(conversation_id),
+            args=[position, json.dumps(payload), self.window, mode, _VERSION_TTL_SECONDS],
+        )
+
+    async def read_page(
+        self,
+        conversation_id: uuid.UUID,
+        *,
+        limit: int,
+        before: int | None = None,
+        after: int | None = None,
+    ) -> tuple[list[dict], dict] | None:
+        """Sert une page (ordre croissant) et ses metadonnees de navigation, ou None si la fenetre ne la couvre pas."""
+        window_key, meta_key, _ = self._keys(conversation_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(meta_key)
+            if after is not None:
+                pipe.zrangebyscore(window_key, f"({after}", "+inf", start=0, num=limit + 1)
+            else:
+                upper = f"({before}" if before is not None else "+inf"
+                pipe.zrevrangebyscore(window_key, upper, "-inf", start=0, num=limit + 1)
+            meta, raw = await pipe.execute()
+        if not meta:
+            return None
+        complete = meta.get("complete") == "1"
+        floor = int(meta.get("floor") or 0)
+        entries = [json.loads(item) for item in raw]
+
+        if after is not None:
+            if not complete and after < floor - 1:
+                return None
+            items = entries[:limit]
+            has_more_after = len(entries) > limit
+            has_more_before = bool(after)
+        else:
+            items = entries[:limit]
+            if len(items) < limit and not complete:
+                return None
+            items.reverse()
+            has_more_before = len(entries) > limit or not complete
+            has_more_after = bool(before)
+        return items, {
+            "next_before": items[0]["stream_position"] if items else before,
+            "next_after": items[-1]["stream_position"] if items else after,
+            "has_more_before": has_more_before,
+            "has_more_after": has_more_after,
+        }
+
+
+__all__ = ["MessageWindowCache"]
@@ -0,0 +1,94 @@
+"""
+############################################################
+# Module : Metriques applicatives (en memoire)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-21
+#
+# Description:
+# - Registre minimal par processus : compteurs et distributions (count/sum/max).
+# - Les series sont identifiees par un nom et des labels (dict trie).
+# - Expose un instantane JSON via /metrics (voir main.py).
+#
+# Points de vigilance:
+# - Valeurs propres a chaque worker : l'agregation se fait cote supervision.
+# - Garder des labels a faible cardinalite (pas d'identifiants de conversation).
+############################################################
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+_LabelKey = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class _Distribution:
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+
+class MetricsRegistry:
+    """Compteurs et distributions thread-safe (appelables depuis les pools de threads)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, _LabelKey], float] = {}
+        self._distributions: dict[tuple[str, _LabelKey], _Distribution] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str]) -> tuple[str, _LabelKey]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._distributions.setdefault(key, _Distribution()).add(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Mesure la duree (secondes) du bloc et l'ajoute a la distribution `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            distributions = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": dist.count,
+                    "sum": round(dist.total, 6),
+                    "max": round(dist.maximum, 6),
+                }
+                for (name, labels), dist in self._distributions.items()
+            ]
+        return {"counters": counters, "distributions": distributions}
+
+
+metrics = MetricsRegistry()
+
+
+__all__ = ["MetricsRegistry", "metrics"]
@@ -0,0 +1,88 @@
+"""
+############################################################
+# Module : Cache de l'overview dashboard (Redis)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-26
+#
+# Description:
+# - Conserve l'instantane /me/overview de chaque utilisateur (JSON) avec un TTL court.
+# - Les evenements contacts, appareils, messages et appartenance invalident l'instantane
+#   des utilisateurs concernes, apres commit.
+# - Un compteur de version rend le remplissage sur : un instantane calcule avant une
+#   invalidation concurrente n'est pas ecrit.
+#
+# Points de vigilance:
+# - Le TTL borne les changements non signales (profil d'un autre membre, titre...).
+############################################################
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+
+import redis.asyncio as aioredis
+
+from ..config import settings
+
+_VERSION_TTL_SECONDS = 24 * 3600
+
+# Ecrit l'instantane si aucune invalidation n'a eu lieu depuis la lecture de la version.
+_FILL_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[2])
+return 1
+"""
+
+
+class OverviewCache:
+    """Instantanés de la vue d'ensemble par utilisateur."""
+
+    def __init__(self, redis: aioredis.Redis | None, *, ttl_seconds: int | None = None) -> None:
+        self.redis = redis
+        self.ttl_seconds = settings.OVERVIEW_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._fill = redis.register_script(_FILL_SCRIPT) if redis else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None and self.ttl_seconds > 0
+
+    @staticmethod
+    def _keys(user_id: uuid.UUID | str) -> list[str]:
+        return [f"overview:{user_id}", f"overview:{user_id}:ver"]
+
+    async def get(self, user_id: uuid.UUID) -> tuple[dict | None, str]:
+        """Instantané en cache (ou None) et version courante, à passer à put()."""
+        snapshot, version = await self.redis.mget(self._keys(user_id))
+        return (json.loads(snapshot) if snapshot else None), version or "0"
+
+    async def put(self, user_id: uuid.UUID, snapshot: dict, *, expected_version: str) -> bool:
+        return bool(
+            await self._fill(
+                keys=self._keys(user_id),
+                args=[expected_version, self.ttl_seconds, json.dumps(snapshot)],
+            )
+        )
+
+    async def invalidate(self, user_ids: list[uuid.UUID | str]) -> None:
+        if not user_ids:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                snapshot_key, version_key = self._keys(user_id)
+                pipe.delete(snapshot_key)
+                pipe.incr(version_key)
+                pipe.expire(version_key, _VERSION_TTL_SECONDS)
+            await pipe.execute()
+
+
+async def invalidate_overview(cache: OverviewCache | None, user_id: uuid.UUID) -> None:
+    """Invalide l'instantane d'un utilisateur apres une modification faite par une route (apres commit)."""
+    if cache:
+        await cache.invalidate([user_id])
+
+
+__all__ = ["OverviewCache", "invalidate_overview"]
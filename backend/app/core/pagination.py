@@ -0,0 +1,42 @@
+"""
+############################################################
+# Module : Pagination (curseurs opaques keyset)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-04
+#
+# Description:
+# - Encode/decode des curseurs opaques (base64url JSON) pour la pagination keyset.
+# - Le client ne manipule jamais les positions brutes : il renvoie le curseur tel quel.
+#
+# Points de vigilance:
+# - Un curseur illisible ou d'un autre type leve ValueError (a convertir en 400).
+############################################################
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any
+
+
+def encode_cursor(kind: str, **values: Any) -> str:
+    """Serialise un curseur opaque pour un type de pagination donne."""
+    raw = json.dumps({"k": kind, **values}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> dict[str, Any]:
+    """Decode un curseur opaque et verifie qu'il correspond au type attendu."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(data, dict) or data.pop("k", None) != kind:
+        raise ValueError("Invalid cursor")
+    return data
+
+
+__all__ = ["encode_cursor", "decode_cursor"]
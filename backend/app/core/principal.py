@@ -0,0 +1,265 @@
+"""
+############################################################
+# Module : Principal authentifie (cache de sessions + activite)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-26
+#
+# Description:
+# - PrincipalCache : sessions deja verifiees (session -> utilisateur), par processus,
+#   LRU a TTL court : evite le SELECT session_tokens a chaque requete authentifiee.
+# - Invalidation immediate via le canal Redis auth:invalidate (revocation, logout-all,
+#   suppression de compte) : chaque worker ecoute et purge son cache local.
+# - SessionActivityTracker : last_activity_at est accumule en memoire et ecrit en lot,
+#   au plus une fois par intervalle, sur une session DB dediee.
+#
+# Points de vigilance:
+# - Publier APRES le commit : une requete concurrente relirait sinon la session non revoquee.
+# - Une generation protege contre la remise en cache d'une lecture anterieure a l'invalidation.
+# - A la reconnexion de l'ecouteur, le cache est vide (des messages ont pu etre perdus).
+############################################################
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+import redis.asyncio as aioredis
+from sqlalchemy import bindparam, or_, update
+
+from ..config import settings
+from .metrics import metrics
+from .redis import get_redis
+from app.models import SessionToken  # type: ignore[import]
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "auth:invalidate"
+
+
+@dataclass(frozen=True)
+class Principal:
+    session_id: uuid.UUID
+    user_id: uuid.UUID
+    session_expires_at: datetime | None
+    cached_until: float
+
+
+class PrincipalCache:
+    """Sessions valides récemment vérifiées, indexées aussi par utilisateur pour l'invalidation."""
+
+    def __init__(self, *, ttl_seconds: int | None = None, max_entries: int | None = None) -> None:
+        self.ttl_seconds = settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.AUTH_PRINCIPAL_CACHE_SIZE if max_entries is None else max_entries
+        self.generation = 0
+        self._entries: OrderedDict[uuid.UUID, Principal] = OrderedDict()
+        self._by_user: dict[uuid.UUID, set[uuid.UUID]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: uuid.UUID, now: datetime) -> Principal | None:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            metrics.increment("auth.principal_cache", result="miss")
+            return None
+        if entry.cached_until <= time.monotonic() or (
+            entry.session_expires_at is not None and entry.session_expires_at <= now
+        ):
+            self._drop(session_id)
+            metrics.increment("auth.principal_cache", result="expired")
+            return None
+        self._entries.move_to_end(session_id)
+        metrics.increment("auth.principal_cache", result="hit")
+        return entry
+
+    def put(
+        self,
+        session_id: uuid.UUID,
+        user_id: uuid.UUID,
+        session_expires_at: datetime | None,
+        *,
+        generation: int,
+    ) -> None:
+        """Mémorise une session vérifiée, sauf si une invalidation est survenue depuis sa lecture."""
+        if not self.enabled or generation != self.generation:
+            return
+        self._drop(session_id)
+        self._entries[session_id] = Principal(
+            session_id=session_id,
+            user_id=user_id,
+            session_expires_at=session_expires_at,
+            cached_until=time.monotonic() + self.ttl_seconds,
+        )
+        self._by_user.setdefault(user_id, set()).add(session_id)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    def invalidate(
+        self,
+        *,
+        session_ids: Iterable[uuid.UUID] = (),
+        user_ids: Iterable[uuid.UUID] = (),
+    ) -> None:
+        self.generation += 1
+        for session_id in session_ids:
+            self._drop(session_id)
+        for user_id in user_ids:
+            for session_id in list(self._by_user.get(user_id, ())):
+                self._drop(session_id)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _drop(self, session_id: uuid.UUID) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+        sessions = self._by_user.get(entry.user_id)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._by_user[entry.user_id]
+
+
+class SessionActivityTracker:
+    """Regroupe les écritures de last_activity_at : une mise à jour par session et par intervalle."""
+
+    def __init__(self, *, interval_seconds: int | None = None) -> None:
+        self.interval_seconds = (
+            settings.AUTH_SESSION_ACTIVITY_FLUSH_SECONDS if interval_seconds is None else interval_seconds
+        )
+        self._pending: dict[uuid.UUID, datetime] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_seconds > 0
+
+    def touch(self, session_id: uuid.UUID, at: datetime) -> None:
+        self._pending[session_id] = at
+
+    def drain(self) -> dict[uuid.UUID, datetime]:
+        pending, self._pending = self._pending, {}
+        return pending
+
+    async def flush(self, session_factory) -> int:
+        """Écrit le lot en attente (executemany) ; n'écrase jamais une activité plus récente."""
+        pending = self.drain()
+        if not pending:
+            return 0
+        table = SessionToken.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("sid"))
+            .where(or_(table.c.last_activity_at.is_(None), table.c.last_activity_at < bindparam("seen")))
+            .values(last_activity_at=bindparam("seen"))
+        )
+        async with session_factory() as session:
+            await session.execute(stmt, [{"sid": sid, "seen": seen} for sid, seen in pending.items()])
+            await session.commit()
+        metrics.observe("auth.session_activity_flush", len(pending))
+        return len(pending)
+
+    async def run(self, session_factory) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.flush(session_factory)
+            except Exception:  # pragma: no cover - on retente au prochain intervalle
+                logger.exception("Echec de l'ecriture groupee de l'activite des sessions")
+
+
+principal_cache = PrincipalCache()
+session_activity = SessionActivityTracker()
+
+
+def _as_uuids(values: Iterable) -> list[uuid.UUID]:
+    result = []
+    for value in values or ():
+        try:
+            result.append(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+async def publish_invalidation(
+    *,
+    session_ids: Iterable[uuid.UUID] = (),
+    user_ids: Iterable[uuid.UUID] = (),
+) -> None:
+    """Purge le cache local puis diffuse l'invalidation aux autres workers (à appeler après commit)."""
+    sessions = _as_uuids(session_ids)
+    users = _as_uuids(user_ids)
+    if not sessions and not users:
+        return
+    principal_cache.invalidate(session_ids=sessions, user_ids=users)
+    redis = await get_redis()
+    if not redis:
+        return
+    payload = {"sessions": [str(value) for value in sessions], "users": [str(value) for value in users]}
+    try:
+        await redis.publish(INVALIDATION_CHANNEL, json.dumps(payload))
+    except Exception:  # pragma: no cover - le TTL borne la fenetre sur les autres workers
+        logger.exception("Publication de l'invalidation des sessions impossible")
+
+
+def apply_invalidation(raw: str) -> None:
+    try:
+        payload = json.loads(raw)
+    except (TypeError, ValueError):
+        return
+    principal_cache.invalidate(
+        session_ids=_as_uuids(payload.get("sessions")),
+        user_ids=_as_uuids(payload.get("users")),
+    )
+
+
+async def listen_invalidations(redis: aioredis.Redis, *, retry_seconds: float = 1.0) -> None:
+    """Écoute auth:invalidate tant que le worker vit ; vide le cache à chaque (re)connexion."""
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            principal_cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    apply_invalidation(message.get("data"))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Ecoute de %s interrompue, reconnexion", INVALIDATION_CHANNEL, exc_info=True)
+            principal_cache.clear()
+            await asyncio.sleep(retry_seconds)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+__all__ = [
+    "INVALIDATION_CHANNEL",
+    "Principal",
+    "PrincipalCache",
+    "SessionActivityTracker",
+    "apply_invalidation",
+    "listen_invalidations",
+    "principal_cache",
+    "publish_invalidation",
+    "session_activity",
+]
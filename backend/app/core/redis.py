@@ -7,15 +7,22 @@
 # Description:
 # - Fournit un client Redis partage (cache) et un broker Pub/Sub minimal.
 # - Serialise les payloads en JSON pour l'homogeneite front/back.
+# - Publications groupees en pipeline et reveil des workers outbox.
+# - PubSubHub : une seule connexion pub/sub par processus ; chaque canal est souscrit une fois,
+#   les abonnes locaux sont comptes et recoivent les messages en memoire (file bornee chacun).
 #
 # Points de vigilance:
 # - Si REDIS_URL est absent, les operations sont no-op.
 # - Les subscribers doivent gerer les messages non-JSON (raw).
+# - Un abonne dont la file deborde est ferme (iteration terminee, overflowed=True).
 ############################################################
 """
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import logging
 from functools import lru_cache
 from typing import Any, AsyncIterator
 
@@ -23,6 +30,12 @@ import json
 import redis.asyncio as aioredis
 
 from ..config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Liste Redis utilisée pour réveiller les workers outbox dès qu'une notification est validée.
+OUTBOX_WAKEUP_KEY = "outbox:wakeup"
 
 
 @lru_cache()
@@ -58,17 +71,45 @@ class RealtimeBroker:
         channel = f"user:{user_id}:events"
         await self.redis.publish(channel, json.dumps(payload))
 
-    async def subscribe(self, channel: str) -> AsyncIterator[dict[str, Any]]:
-        """Souscrit à un canal et renvoie un itérateur sur les messages JSON ou raw."""
+    async def publish_user_events(self, user_ids: list[str], payload: dict) -> None:
+        """Publie le même événement vers plusieurs utilisateurs en un seul aller-retour (pipeline)."""
+        if not self.redis or not user_ids:
+            return
+        data = json.dumps(payload)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.publish(f"user:{user_id}:events", data)
+            await pipe.execute()
+
+    async def signal_outbox(self) -> None:
+        """Réveille un worker outbox en attente (BLPOP) ; un seul jeton suffit quel que soit le volume."""
+        if not self.redis:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(OUTBOX_WAKEUP_KEY, "1")
+            pipe.ltrim(OUTBOX_WAKEUP_KEY, 0, 0)
+            await pipe.execute()
+
+    def open_subscription(self) -> "Subscription":
+        """Abonnement multiplexé dont les canaux s'ajoutent/retirent dynamiquement (add/remove)."""
         if not self.redis:
             raise RuntimeError("Realtime broker not configured")
-        pubsub = self.redis.pubsub()
-        await pubsub.subscribe(channel)
+        return get_pubsub_hub(self.redis).open()
+
+    async def subscribe(self, *channels: str, raw: bool = False) -> AsyncIterator[Any]:
+        """Souscrit à un ou plusieurs canaux via la connexion pub/sub partagée du processus.
+
+        Itère sur les messages JSON décodés (ou {"raw": ...}), ou sur le texte brut si raw=True
+        (relais WebSocket sans re-sérialisation).
+        """
+        subscription = self.open_subscription()
         try:
-            async for message in pubsub.listen():
-                if message.get("type") != "message":
+            for channel in channels:
+                await subscription.add(channel)
+            async for _, data in subscription:
+                if raw:
+                    yield data
                     continue
-                data = message.get("data")
                 if isinstance(data, str):
                     try:
                         yield json.loads(data)
@@ -77,5 +118,157 @@ class RealtimeBroker:
                 else:
                     yield {"raw": data}
         finally:
-            await pubsub.unsubscribe(channel)
-            await pubsub.close()
+            await subscription.close()
+
+
+class Subscription:
+    """Abonné local du hub : file bornée de (canal, données) alimentée par le lecteur partagé."""
+
+    def __init__(self, hub: "PubSubHub", *, maxsize: int) -> None:
+        self._hub = hub
+        self._queue: asyncio.Queue[tuple[str, Any] | None] = asyncio.Queue(maxsize=max(1, maxsize) + 1)
+        self._maxsize = max(1, maxsize)
+        self.channels: set[str] = set()
+        self.closed = False
+        self.overflowed = False
+
+    async def add(self, channel: str) -> None:
+        if self.closed or channel in self.channels:
+            return
+        self.channels.add(channel)
+        await self._hub._attach(channel, self)
+
+    async def remove(self, channel: str) -> None:
+        if channel not in self.channels:
+            return
+        self.channels.discard(channel)
+        await self._hub._detach(channel, self)
+
+    async def close(self) -> None:
+        self._end()
+        for channel in list(self.channels):
+            await self.remove(channel)
+
+    def _deliver(self, channel: str, data: Any) -> None:
+        if self.closed:
+            return
+        if self._queue.qsize() >= self._maxsize:
+            # Consommateur trop lent (socket bloquée) : on coupe plutôt que de bufferiser sans fin.
+            self.overflowed = True
+            metrics.increment("realtime_subscriber_overflow_total")
+            self._end()
+            return
+        self._queue.put_nowait((channel, data))
+
+    def _end(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put_nowait(None)
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> tuple[str, Any]:
+        item = await self._queue.get()
+        if item is None:
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return item
+
+
+class PubSubHub:
+    """Une connexion pub/sub par processus : un SUBSCRIBE par canal, diffusion en mémoire aux abonnés locaux."""
+
+    def __init__(self, redis: aioredis.Redis, *, queue_size: int | None = None) -> None:
+        self.redis = redis
+        self.queue_size = settings.REALTIME_SUBSCRIBER_QUEUE_SIZE if queue_size is None else queue_size
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+        self._listeners: dict[str, set[Subscription]] = {}
+        self._lock = asyncio.Lock()
+
+    def open(self) -> Subscription:
+        return Subscription(self, maxsize=self.queue_size)
+
+    def listeners(self, channel: str) -> int:
+        return len(self._listeners.get(channel, ()))
+
+    async def _attach(self, channel: str, subscription: Subscription) -> None:
+        async with self._lock:
+            listeners = self._listeners.get(channel)
+            if listeners is None:
+                if self._pubsub is None:
+                    self._pubsub = self.redis.pubsub()
+                await self._pubsub.subscribe(channel)
+                listeners = self._listeners[channel] = set()
+                if self._reader is None or self._reader.done():
+                    self._reader = asyncio.create_task(self._read_loop())
+            listeners.add(subscription)
+
+    async def _detach(self, channel: str, subscription: Subscription) -> None:
+        async with self._lock:
+            listeners = self._listeners.get(channel)
+            if listeners is None:
+                return
+            listeners.discard(subscription)
+            if listeners:
+                return
+            del self._listeners[channel]
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception:  # pragma: no cover - la reconnexion ne resouscrit que les canaux restants
+                logger.warning("Unsubscribe %s failed", channel, exc_info=True)
+
+    async def _read_loop(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis-py se reconnecte et resouscrit les canaux au prochain appel.
+                logger.warning("Shared pub/sub read failed, retrying", exc_info=True)
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            listeners = self._listeners.get(message.get("channel"))
+            if not listeners:
+                continue
+            for subscription in list(listeners):
+                subscription._deliver(message["channel"], message.get("data"))
+            metrics.increment("realtime_fanout_total", len(listeners))
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._reader
+            self._reader = None
+        for listeners in list(self._listeners.values()):
+            for subscription in list(listeners):
+                subscription._end()
+        self._listeners.clear()
+        if self._pubsub is not None:
+            with contextlib.suppress(Exception):
+                await self._pubsub.aclose()
+            self._pubsub = None
+
+
+_hubs: dict[int, PubSubHub] = {}
+
+
+def get_pubsub_hub(redis: aioredis.Redis) -> PubSubHub:
+    """Hub partagé du processus pour ce client Redis (créé au premier abonnement)."""
+    hub = _hubs.get(id(redis))
+    if hub is None or hub.redis is not redis:
+        hub = _hubs[id(redis)] = PubSubHub(redis)
+    return hub
+
+
+async def close_pubsub_hubs() -> None:
+    hubs = list(_hubs.values())
+    _hubs.clear()
+    for hub in hubs:
+        await hub.close()
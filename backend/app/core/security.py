@@ -6,6 +6,7 @@
 #
 # Description:
 # - Hash/vérification de mot de passe via passlib (bcrypt).
+# - Variantes async : bcrypt part dans le pool de processus (classe "password").
 # - génération/décodage de JWT signés (algorithme/secret dans settings).
 # - Expirations gérées en UTC.
 ############################################################
@@ -20,6 +21,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from ..config import settings
+from .executors import PASSWORD, offload
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -34,6 +36,16 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password hors de la boucle d'événements (≈250 ms de bcrypt)."""
+    return await offload(PASSWORD, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash hors de la boucle d'événements."""
+    return await offload(PASSWORD, get_password_hash, password)
+
+
 def create_access_token(subject: str | Dict[str, Any], expires_minutes: int | None = None) -> str:
     """Crée un JWT signé pour un sujet (sub ou dict), avec expiration en minutes."""
     if expires_minutes is None:
@@ -64,4 +76,11 @@ def decode_token(token: str) -> dict[str, Any]:
         raise ValueError("Invalid token") from exc
 
 
-__all__ = ["verify_password", "get_password_hash", "create_access_token", "decode_token"]
+__all__ = [
+    "verify_password",
+    "verify_password_async",
+    "get_password_hash",
+    "get_password_hash_async",
+    "create_access_token",
+    "decode_token",
+]
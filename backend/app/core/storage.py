@@ -8,6 +8,7 @@
 # - Wrapper boto3 pour uploader et generer des URLs presignees.
 # - Garde deux clients (upload + signature) pour eventuelles differences d'endpoint.
 # - Force les signatures v4 et peut utiliser le path-style pour compatibilite MinIO.
+# - Met en cache (LRU borne) les URLs presignees tant qu'il leur reste une marge de validite.
 #
 # Points de vigilance:
 # - Convertit les erreurs boto en RuntimeError pour gestion dans l'API.
@@ -17,7 +18,10 @@
 
 from __future__ import annotations
 
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from functools import lru_cache
 from pathlib import Path
 from typing import BinaryIO
@@ -29,6 +33,43 @@ from botocore.exceptions import BotoCoreError, ClientError
 from ..config import settings
 
 
+class PresignedUrlCache:
+    """LRU borné d'URLs présignées, indexé par (clé d'objet, durée demandée).
+
+    Une URL est réutilisée tant qu'il lui reste plus de `margin_seconds` de validité : le client
+    (et la fenêtre chaude des messages) dispose toujours d'au moins cette marge.
+    """
+
+    def __init__(self, maxsize: int, margin_seconds: int) -> None:
+        self.maxsize = maxsize
+        self.margin_seconds = margin_seconds
+        self._entries: OrderedDict[tuple[str, int], tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, expires_in: int) -> str | None:
+        """Retourne l'URL en cache si elle reste valide au-delà de la marge, sinon None."""
+        with self._lock:
+            entry = self._entries.get((key, expires_in))
+            if entry is None:
+                return None
+            url, expires_at = entry
+            if expires_at - time.monotonic() <= self.margin_seconds:
+                del self._entries[(key, expires_in)]
+                return None
+            self._entries.move_to_end((key, expires_in))
+            return url
+
+    def put(self, key: str, expires_in: int, url: str, *, signed_at: float) -> None:
+        """Enregistre une URL signée à `signed_at` (horloge monotone) et évince la moins récente."""
+        if self.maxsize <= 0 or expires_in <= self.margin_seconds:
+            return
+        with self._lock:
+            self._entries[(key, expires_in)] = (url, signed_at + expires_in)
+            self._entries.move_to_end((key, expires_in))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
 class ObjectStorage:
     """Fin wrapper boto3 pour upload et generation de liens présignés."""
 
@@ -43,6 +84,8 @@ class ObjectStorage:
         use_ssl: bool,
         force_path_style: bool,
         public_endpoint_url: str | None = None,
+        url_cache_size: int = 0,
+        url_cache_margin_seconds: int = 0,
     ) -> None:
         # --- Configuration des clients S3 (upload et signature) ---
         session = boto3.session.Session(
@@ -69,6 +112,7 @@ class ObjectStorage:
             use_ssl=signing_use_ssl,
         )
         self.bucket = bucket
+        self.url_cache = PresignedUrlCache(url_cache_size, url_cache_margin_seconds)
 
     def upload_fileobj(
         self,
@@ -90,15 +134,21 @@ class ObjectStorage:
             raise RuntimeError("Unable to upload attachment") from exc
 
     def generate_presigned_url(self, key: str, *, expires_in: int) -> str:
-        """énère une URL présignée pour télécharger un objet pendant une durée limitée."""
+        """Génère (ou réutilise depuis le cache) une URL présignée pour télécharger un objet."""
+        cached = self.url_cache.get(key, expires_in)
+        if cached is not None:
+            return cached
+        signed_at = time.monotonic()
         try:
-            return self.signing_client.generate_presigned_url(
+            url = self.signing_client.generate_presigned_url(
                 "get_object",
                 Params={"Bucket": self.bucket, "Key": key},
                 ExpiresIn=expires_in,
             )
         except (BotoCoreError, ClientError) as exc:
             raise RuntimeError("Unable to générer l'URL de téléchargement") from exc
+        self.url_cache.put(key, expires_in, url, signed_at=signed_at)
+        return url
 
     def object_url(self, key: str) -> str:
         """Retourne une URL interne de type s3://bucket/key."""
@@ -135,7 +185,9 @@ def get_storage() -> ObjectStorage | None:
         use_ssl=settings.STORAGE_USE_SSL,
         force_path_style=settings.STORAGE_FORCE_PATH_STYLE,
         public_endpoint_url=settings.STORAGE_PUBLIC_ENDPOINT,
+        url_cache_size=settings.ATTACHMENT_URL_CACHE_SIZE,
+        url_cache_margin_seconds=settings.ATTACHMENT_URL_CACHE_MARGIN_SECONDS,
     )
 
 
-__all__ = ["ObjectStorage", "get_storage"]
+__all__ = ["ObjectStorage", "PresignedUrlCache", "get_storage"]
@@ -0,0 +1,122 @@
+"""
+############################################################
+# Module : Compteurs de non lus (Redis)
+# Auteur : Valentin Masurelle
+# Date   : 2025-05-24
+#
+# Description:
+# - Un hash par utilisateur (unread:{user_id}) : champ = conversation, valeur = non lus.
+# - Le champ "_" marque un hash complet (rempli depuis la base) : sans lui, rien n'est servi.
+# - Les envois incrementent, les lectures decrementent, sans jamais creer un hash absent :
+#   seule la reconciliation (fill depuis Postgres) cree un hash.
+#
+# Points de vigilance:
+# - Le TTL borne la derive (ecriture concurrente a un remplissage) : a expiration, le hash
+#   est recalcule depuis la base.
+# - Tout changement d'appartenance invalide le hash de l'utilisateur concerne.
+############################################################
+"""
+
+from __future__ import annotations
+
+import uuid
+
+import redis.asyncio as aioredis
+
+from ..config import settings
+
+_COMPLETE_FIELD = "_"
+
+# Ajoute ARGV[2] au champ ARGV[1] de chaque hash existant ; retourne la nouvelle valeur (-1 si absent).
+_ADJUST_SCRIPT = """
+local values = {}
+for i, key in ipairs(KEYS) do
+  if redis.call('EXISTS', key) == 1 then
+    local value = redis.call('HINCRBY', key, ARGV[1], ARGV[2])
+    if value <= 0 then
+      redis.call('HDEL', key, ARGV[1])
+      value = 0
+    end
+    values[i] = value
+  else
+    values[i] = -1
+  end
+end
+return values
+"""
+
+# Remplit un hash absent depuis les comptes de la base (les ecritures deja arrivees priment).
+_FILL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class UnreadCounters:
+    """Compteurs de non lus par utilisateur et conversation, réconciliés avec Postgres."""
+
+    def __init__(self, redis: aioredis.Redis | None, *, ttl_seconds: int | None = None) -> None:
+        self.redis = redis
+        self.ttl_seconds = settings.UNREAD_COUNTER_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._adjust = redis.register_script(_ADJUST_SCRIPT) if redis else None
+        self._fill = redis.register_script(_FILL_SCRIPT) if redis else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None and self.ttl_seconds > 0
+
+    @staticmethod
+    def _key(user_id: uuid.UUID | str) -> str:
+        return f"unread:{user_id}"
+
+    async def get(self, user_id: uuid.UUID) -> dict[uuid.UUID, int] | None:
+        """Non lus par conversation, ou None si le hash doit être recalculé depuis la base."""
+        raw = await self.redis.hgetall(self._key(user_id))
+        if not raw or _COMPLETE_FIELD not in raw:
+            return None
+        return {
+            uuid.UUID(field): int(value)
+            for field, value in raw.items()
+            if field != _COMPLETE_FIELD and int(value) > 0
+        }
+
+    async def fill(self, user_id: uuid.UUID, counts: dict[uuid.UUID, int]) -> bool:
+        args: list = [self.ttl_seconds, _COMPLETE_FIELD, "1"]
+        for conversation_id, count in counts.items():
+            if count > 0:
+                args.extend([str(conversation_id), int(count)])
+        return bool(await self._fill(keys=[self._key(user_id)], args=args))
+
+    async def adjust(
+        self,
+        user_ids: list[uuid.UUID | str],
+        conversation_id: uuid.UUID | str,
+        delta: int,
+    ) -> dict[str, int]:
+        """Applique `delta` aux hashes existants ; retourne la nouvelle valeur par utilisateur servi."""
+        if not user_ids or not delta:
+            return {}
+        values = await self._adjust(
+            keys=[self._key(user_id) for user_id in user_ids],
+            args=[str(conversation_id), int(delta)],
+        )
+        return {str(user_id): int(value) for user_id, value in zip(user_ids, values) if int(value) >= 0}
+
+    async def reset(self, user_id: uuid.UUID, conversation_ids: list[uuid.UUID | str] | None = None) -> None:
+        """Remet à zéro des conversations (marquage lu) ou invalide tout le hash (conversation_ids=None)."""
+        key = self._key(user_id)
+        if conversation_ids is None:
+            await self.redis.delete(key)
+        elif conversation_ids:
+            await self.redis.hdel(key, *[str(conversation_id) for conversation_id in conversation_ids])
+
+    async def invalidate(self, user_ids: list[uuid.UUID | str]) -> None:
+        if user_ids:
+            await self.redis.delete(*[self._key(user_id) for user_id in user_ids])
+
+
+__all__ = ["UnreadCounters"]
@@ -8,4 +8,4 @@
 ############################################################
 """
 
-__all__ = ["engine", "async_session_factory", "get_session", "Base"]
+__all__ = ["engine", "async_session_factory", "get_session", "load_relations", "Base"]
@@ -6,6 +6,7 @@
 #
 # Description:
 # - Construit l'engine async et la factory de sessions.
+# - Pool dimensionné par DB_POOL_SIZE / DB_MAX_OVERFLOW (plafond de l'admission).
 # - Adapte l'URL Postgres pour asyncpg ou psycopg_async si besoin.
 #
 # Points de vigilance:
@@ -16,6 +17,7 @@
 
 from __future__ import annotations
 
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from ..config import settings
@@ -31,7 +33,14 @@ def _make_async_url(url: str) -> str:
 
 
 db_url = _make_async_url(settings.DATABASE_URL)
-engine = create_async_engine(db_url, echo=False, future=True)
+engine = create_async_engine(
+    db_url,
+    echo=False,
+    future=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+)
 
 async_session_factory = async_sessionmaker(
     bind=engine,
@@ -45,4 +54,12 @@ async def get_session() -> AsyncSession:
         yield session
 
 
-__all__ = ["engine", "async_session_factory", "get_session", "Base"]
+async def load_relations(session: AsyncSession, instance, *names: str) -> None:
+    """Charge à la demande les relations non encore chargées (pas de lazy load implicite en async)."""
+    unloaded = inspect(instance).unloaded
+    missing = [name for name in names if name in unloaded]
+    if missing:
+        await session.refresh(instance, attribute_names=missing)
+
+
+__all__ = ["engine", "async_session_factory", "get_session", "load_relations", "Base"]
@@ -18,14 +18,18 @@ from datetime import datetime, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 
 from .db.session import get_session
 from app.models import SessionToken, UserAccount  # type: ignore[import]
 from .core.security import decode_token
+from .core.message_cache import MessageWindowCache
+from .core.overview_cache import OverviewCache
+from .core.principal import principal_cache, session_activity
 from .core.redis import get_redis, RealtimeBroker
 from .core.storage import get_storage, ObjectStorage
+from .core.unread import UnreadCounters
 from .core.antivirus import get_antivirus_scanner
 from .services.audit_service import AuditService
 from .services.notification_service import NotificationService
@@ -69,34 +73,36 @@ async def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from exc
 
     # Si le token porte un identifiant de session, on vérifie qu'elle n'est pas révoquée/expirée.
+    # Les sessions vérifiées sont gardées quelques secondes en mémoire (révocations propagées par Redis).
     try:
         session_uuid = uuid.UUID(str(session_id))
     except (ValueError, TypeError) as exc:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session") from exc
-    stmt_session = select(SessionToken).where(SessionToken.id == session_uuid)
-    session_result = await db.execute(stmt_session)
-    session = session_result.scalar_one_or_none()
     now = datetime.now(timezone.utc)
-    if (
-        session is None
-        or session.user_id != user_uuid
-        or session.revoked_at is not None
-        or (session.expires_at and session.expires_at < now)
-    ):
+    principal = principal_cache.get(session_uuid, now)
+    if principal is None:
+        generation = principal_cache.generation
+        stmt_session = select(SessionToken).where(SessionToken.id == session_uuid)
+        session_result = await db.execute(stmt_session)
+        session = session_result.scalar_one_or_none()
+        if (
+            session is None
+            or session.user_id != user_uuid
+            or session.revoked_at is not None
+            or (session.expires_at and session.expires_at < now)
+        ):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired or revoked")
+        principal_cache.put(session.id, session.user_id, session.expires_at, generation=generation)
+    elif principal.user_id != user_uuid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired or revoked")
-    session.last_activity_at = now
-    current_session_id = session.id
-
-    stmt = (
-        select(UserAccount)
-        .options(
-            selectinload(UserAccount.profile),
-            selectinload(UserAccount.security_state),
-            selectinload(UserAccount.totp_secret),
-            selectinload(UserAccount.notification_preferences),
-        )
-        .where(UserAccount.id == user_uuid)
-    )
+    current_session_id = session_uuid
+    if session_activity.enabled:
+        session_activity.touch(session_uuid, now)
+    else:
+        await db.execute(update(SessionToken).where(SessionToken.id == session_uuid).values(last_activity_at=now))
+
+    # Seul le profil est chargé ; security_state, totp_secret et les préférences le sont à la demande.
+    stmt = select(UserAccount).options(joinedload(UserAccount.profile)).where(UserAccount.id == user_uuid)
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
     if user is None or not user.is_active:
@@ -124,6 +130,7 @@ __all__ = [
     "get_security_service",
     "get_device_service",
     "get_organization_service",
+    "get_overview_cache",
 ]
 
 
@@ -166,7 +173,13 @@ async def get_contact_service(db: AsyncSession = Depends(get_session)) -> Contac
     notifications = NotificationService(db)
     redis = await get_redis()
     realtime = RealtimeBroker(redis)
-    return ContactService(db, audit_service=audit, notification_service=notifications, realtime_broker=realtime)
+    return ContactService(
+        db,
+        audit_service=audit,
+        notification_service=notifications,
+        realtime_broker=realtime,
+        overview_cache=OverviewCache(redis) if redis else None,
+    )
 
 
 async def get_conversation_service(db: AsyncSession = Depends(get_session)) -> ConversationService:
@@ -181,6 +194,9 @@ async def get_conversation_service(db: AsyncSession = Depends(get_session)) -> C
         realtime_broker=realtime,
         storage_service=storage,
         attachment_decoder=attachment_service,
+        message_cache=MessageWindowCache(redis) if redis else None,
+        unread_counters=UnreadCounters(redis) if redis else None,
+        overview_cache=OverviewCache(redis) if redis else None,
     )
 
 
@@ -191,9 +207,16 @@ async def get_security_service(db: AsyncSession = Depends(get_session)) -> Secur
 
 async def get_device_service(db: AsyncSession = Depends(get_session)) -> DeviceService:
     audit = AuditService(db)
-    return DeviceService(db, audit_service=audit)
+    redis = await get_redis()
+    return DeviceService(db, audit_service=audit, overview_cache=OverviewCache(redis) if redis else None)
 
 
 async def get_organization_service(db: AsyncSession = Depends(get_session)) -> OrganizationService:
     audit = AuditService(db)
     return OrganizationService(db, audit_service=audit)
+
+
+async def get_overview_cache() -> OverviewCache | None:
+    redis = await get_redis()
+    cache = OverviewCache(redis) if redis else None
+    return cache if cache and cache.enabled else None
@@ -5,30 +5,94 @@
 # Date   : 2025-05-04
 #
 # Description:
-# - Initialise l'application FastAPI (routes API + WS, middleware CORS).
+# - Initialise l'application FastAPI (routes API + WS, middlewares admission et CORS).
+# - Retrouve l'adresse du client derriere les proxies de FORWARDED_ALLOW_IPS (cle d'admission).
 # - Monte les fichiers statiques (avatars, etc.) depuis MEDIA_ROOT.
-# - Expose une route /healthz minimale pour la supervision.
+# - Expose une route /healthz minimale et un instantane /metrics pour la supervision.
+# - Recharge le trousseau de cles des messages sur SIGHUP.
+# - Lance l'ecoute des invalidations de sessions et l'ecriture groupee de leur activite.
+# - Ecrit les heartbeats de presence du processus en un pipeline par intervalle.
+# - Repond 503 (Retry-After) quand un pool CPU (core/executors.py) est sature.
 ############################################################
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .config import settings
+from .core.admission import AdmissionMiddleware, admission
+from .core.executors import OffloadRejected, offloader
+from .core.keyring import install_reload_signal
+from .core.metrics import metrics
+from .core.principal import listen_invalidations, principal_cache, session_activity
+from .core.redis import RealtimeBroker, close_pubsub_hubs, get_redis
+from .db.session import async_session_factory
 from .api.routes import api_router
 from .api.ws import ws_api_router
+from .api.ws.presence import presence_tracker
 
 logger = logging.getLogger(__name__)
 
+# En-tetes de navigation lus par le front (scroll infini des messages).
+PAGINATION_HEADERS = [
+    "X-Pagination-Before",
+    "X-Pagination-After",
+    "X-Pagination-Has-Before",
+    "X-Pagination-Has-After",
+    "X-Pagination-Before-Cursor",
+    "X-Pagination-After-Cursor",
+]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Rotation des cles de messages sans redemarrage (kill -HUP sur chaque worker)
+    install_reload_signal(asyncio.get_running_loop())
+    # Invalidations du cache des principaux (revocations publiees par les autres workers)
+    tasks: list[asyncio.Task] = []
+    redis = await get_redis()
+    if redis is not None and principal_cache.enabled:
+        tasks.append(asyncio.create_task(listen_invalidations(redis)))
+    # Heartbeats de presence de toutes les sockets du processus, un pipeline par intervalle
+    if redis is not None:
+        tasks.append(asyncio.create_task(presence_tracker.run(RealtimeBroker(redis))))
+    # Ecriture groupee de l'activite des sessions
+    if session_activity.enabled:
+        tasks.append(asyncio.create_task(session_activity.run(async_session_factory)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await session_activity.flush(async_session_factory)
+        except Exception:
+            logger.exception("Ecriture finale de l'activite des sessions impossible")
+        offloader.shutdown()
+        await close_pubsub_hubs()
+
 
 def create_app() -> FastAPI:
-    app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_PREFIX}/openapi.json")
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        openapi_url=f"{settings.API_V1_PREFIX}/openapi.json",
+        lifespan=lifespan,
+    )
+
+    # Admission par classe de route et par organisation (ajoutee avant CORS : les 503 gardent les en-tetes CORS)
+    if settings.ADMISSION_ENABLED:
+        app.add_middleware(AdmissionMiddleware)
 
     # CORS
     if settings.BACKEND_CORS_ORIGINS:
@@ -38,6 +102,19 @@ def create_app() -> FastAPI:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=PAGINATION_HEADERS,
+        )
+
+    # Adresse reelle du client (X-Forwarded-For des seuls proxies de confiance), avant l'admission
+    app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=settings.FORWARDED_ALLOW_IPS)
+
+    # Pools CPU satures : refus immediat plutot qu'une file d'attente sans fin
+    @app.exception_handler(OffloadRejected)
+    async def offload_rejected(request: Request, exc: OffloadRejected) -> JSONResponse:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Serveur occupe, reessayez dans un instant."},
+            headers={"Retry-After": "1"},
         )
 
     # Routes HTTP et WS
@@ -54,6 +131,11 @@ def create_app() -> FastAPI:
     async def healthz() -> dict:
         return {"status": "ok"}
 
+    # Metriques du worker courant (compteurs, distributions et files d'admission en memoire)
+    @app.get("/metrics", tags=["health"])
+    async def metrics_snapshot() -> dict:
+        return {**metrics.snapshot(), "admission": admission.snapshot()}
+
     return app
 
 
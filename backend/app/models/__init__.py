@@ -22,6 +22,7 @@ from .conversation import (
     ConversationInvite,
     ConversationMember,
     MemberKeyWrap,
+    UserInbox,
 )
 from .device import Device, PushSubscription, SessionToken
 from .enums import (
@@ -68,6 +69,7 @@ __all__ = [
     "ConversationInvite",
     "ConversationMember",
     "MemberKeyWrap",
+    "UserInbox",
     "Device",
     "PushSubscription",
     "SessionToken",
@@ -8,6 +8,7 @@
 # - Conversations avec metadonnees (archivage, encryption, slow mode) liees org/workspace.
 # - Clés d'encryption par génération + enveloppes par membre.
 # - Cascade delete sur messages/membres/appels pour éviter les orphelins.
+# - user_inbox : projection par utilisateur (tri, aperçu, non lus) pour la boîte de réception.
 ############################################################
 """
 
@@ -66,6 +67,8 @@ class Conversation(Base):
     slow_mode_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     allow_attachments: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     allow_replies: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    # Dernière stream_position attribuée (allocateur atomique, voir reserve_stream_positions).
+    last_stream_position: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     extra_metadata: Mapped[dict | None] = mapped_column(JSONB)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
@@ -92,6 +95,7 @@ class ConversationMember(Base):
     __table_args__ = (
         UniqueConstraint("conversation_id", "user_id", name="uix_conversation_member"),
         Index("ix_conversation_members_user", "user_id"),
+        Index("ix_conversation_members_roster", "conversation_id", "joined_at", "user_id"),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(PGUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -113,12 +117,44 @@ class ConversationMember(Base):
     invited_by: Mapped[uuid.UUID | None] = mapped_column(PGUUID(as_uuid=True))
     muted_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     last_read_message_id: Mapped[uuid.UUID | None] = mapped_column(PGUUID(as_uuid=True))
+    # Watermarks (stream_position) utilisés en mode MESSAGE_RECEIPTS_MODE="watermark".
+    delivered_position: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    read_position: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     conversation = relationship("Conversation", back_populates="members")
     user = relationship("UserAccount", back_populates="conversation_memberships")
     key_wraps = relationship("MemberKeyWrap", back_populates="member", cascade="all, delete-orphan")
 
 
+class UserInbox(Base):
+    """Projection boîte de réception : une ligne par membre actif, maintenue par les chemins d'écriture."""
+
+    __tablename__ = "user_inbox"
+    __table_args__ = (
+        Index("ix_user_inbox_activity", "user_id", "last_activity_at", "conversation_id"),
+        Index("ix_user_inbox_conversation", "conversation_id"),
+    )
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        PGUUID(as_uuid=True), ForeignKey("user_accounts.id", ondelete="CASCADE"), primary_key=True
+    )
+    conversation_id: Mapped[uuid.UUID] = mapped_column(
+        PGUUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True
+    )
+    last_activity_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    last_message_id: Mapped[uuid.UUID | None] = mapped_column(PGUUID(as_uuid=True))
+    last_message_author_id: Mapped[uuid.UUID | None] = mapped_column(PGUUID(as_uuid=True))
+    # Aperçu en clair uniquement si le chiffrement est désactivé ; sinon résolu à la lecture.
+    last_message_preview: Mapped[str | None] = mapped_column(String(200))
+    unread_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    muted_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    archived: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="false")
+
+    conversation = relationship("Conversation")
+
+
 class ConversationEncryptionKey(Base):
     """Master encryption key (rotated) for a conversation."""
 
@@ -134,6 +170,7 @@ class ConversationEncryptionKey(Base):
     generation: Mapped[int] = mapped_column(Integer, nullable=False)
     encrypted_key: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
     key_algo: Mapped[str] = mapped_column(String(32), nullable=False)
+    wrapping_key_id: Mapped[str | None] = mapped_column(String(64))
     created_by: Mapped[uuid.UUID | None] = mapped_column(PGUUID(as_uuid=True))
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
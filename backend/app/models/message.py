@@ -5,8 +5,8 @@
 # Date   : 2025-05-04
 #
 # Description:
-# - Messages chiffrés avec positions de flux et index full-text.
-# - Livraisons par membre, reactions et pins uniques par combinaison.
+# - Messages chiffrés avec positions de flux et index full-text (tsvector ou index aveugle).
+# - Livraisons par membre (+ compteurs agreges sur le message), reactions et pins uniques.
 # - Cascade delete sur livraisons/PJ/reactions pour éviter les orphelins.
 ############################################################
 """
@@ -18,7 +18,9 @@ from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
+    Computed,
     DateTime,
     Enum,
     ForeignKey,
@@ -28,9 +30,8 @@ from sqlalchemy import (
     Text,
     UniqueConstraint,
     Index,
-    func,
 )
-from sqlalchemy.dialects.postgresql import JSONB, UUID as PGUUID
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR, UUID as PGUUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -60,7 +61,19 @@ class Message(Base):
     encryption_metadata: Mapped[dict | None] = mapped_column(JSONB)
     signature: Mapped[bytes | None] = mapped_column(LargeBinary)
     search_text: Mapped[str | None] = mapped_column(Text)
+    # tsvector stocké (colonne générée) : la recherche ne recalcule plus to_tsvector à chaque requête.
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', coalesce(search_text, ''))", persisted=True),
+        deferred=True,
+    )
+    # Index aveugle (MESSAGE_SEARCH_MODE=blind) : jetons HMAC 64 bits des mots normalisés.
+    search_tokens: Mapped[list[int] | None] = mapped_column(ARRAY(BigInteger), deferred=True)
     is_system: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # Compteurs denormalises des livraisons (hors auteur), maintenus dans la meme transaction.
+    recipient_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    delivered_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    read_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
     )
@@ -97,16 +110,8 @@ class Message(Base):
         UniqueConstraint("conversation_id", "stream_position", name="uix_message_stream"),
         Index("ix_messages_conversation_stream", "conversation_id", "stream_position"),
         Index("ix_messages_conversation_created", "conversation_id", "created_at"),
-        Index(
-            "ix_messages_fulltext",
-            func.to_tsvector("simple", func.coalesce(func.convert_from(ciphertext, "UTF8"), "")),
-            postgresql_using="gin",
-        ),
-        Index(
-            "ix_messages_search_text",
-            func.to_tsvector("simple", func.coalesce(search_text, "")),
-            postgresql_using="gin",
-        ),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_messages_search_tokens", "search_tokens", postgresql_using="gin"),
     )
 
 
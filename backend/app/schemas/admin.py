@@ -6,6 +6,7 @@
 #
 # Description:
 # - Payloads et reponses pour la creation/suppression d'utilisateurs par un admin.
+# - Reponse du rechargement du trousseau de cles des messages.
 ############################################################
 """
 
@@ -35,3 +36,9 @@ class AdminUserCreateResponse(BaseModel):
 class AdminUserDeleteResponse(BaseModel):
     """Confirmation de suppression effectuee par un administrateur."""
     message: str = "Utilisateur supprime."
+
+
+class KeyringReloadResponse(BaseModel):
+    """Etat du trousseau de cles des messages apres rechargement."""
+    active_key_id: str | None = None
+    key_ids: list[str] = Field(default_factory=list)
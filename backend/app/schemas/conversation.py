@@ -52,7 +52,7 @@ class ConversationCreateRequest(BaseModel):
 
 
 class ConversationOut(BaseModel):
-    """Representation d'une conversation pour l'API."""
+    """Representation d'une conversation pour l'API (apercu des membres, roster complet pagine a part)."""
     id: uuid.UUID
     title: str | None
     topic: str | None = None
@@ -60,6 +60,10 @@ class ConversationOut(BaseModel):
     created_at: datetime
     archived: bool = False
     members: List[ConversationMemberOut]
+    member_count: int = 0
+    last_activity_at: datetime | None = None
+    last_message_preview: str | None = None
+    unread_count: int = 0
     blocked_by_viewer: bool = False
     blocked_by_other: bool = False
 
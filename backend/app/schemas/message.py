@@ -6,12 +6,15 @@
 #
 # Description:
 # - Expose le nombre de messages non lus par conversation et le total.
+# - Retourne les compteurs du marquage global comme lu.
+# - Resultats de la recherche globale (extraits classes, curseur keyset).
 ############################################################
 """
 
 from __future__ import annotations
 
 import uuid
+from datetime import datetime
 from typing import List
 
 from pydantic import BaseModel
@@ -28,3 +31,36 @@ class UnreadSummaryResponse(BaseModel):
     total: int
     conversations: List[ConversationUnread]
 
+
+
+class ConversationReadCount(BaseModel):
+    """Nombre de messages passés à lu dans une conversation."""
+    conversation_id: uuid.UUID
+    read: int
+
+
+class MarkAllReadResponse(BaseModel):
+    """Résultat du marquage global comme lu."""
+    total: int
+    conversations: List[ConversationReadCount]
+
+
+
+class MessageSearchHit(BaseModel):
+    """Message trouvé par la recherche globale, avec extrait surligné."""
+    message_id: uuid.UUID
+    conversation_id: uuid.UUID
+    conversation_title: str | None = None
+    author_id: uuid.UUID | None = None
+    author_display_name: str | None = None
+    stream_position: int
+    created_at: datetime
+    rank: float
+    # Fragment HTML : texte du message échappé, termes trouvés entourés de <mark> (seul balisage).
+    snippet: str
+
+
+class MessageSearchResponse(BaseModel):
+    """Page de résultats de recherche ; next_cursor absent sur la dernière page."""
+    items: List[MessageSearchHit]
+    next_cursor: str | None = None
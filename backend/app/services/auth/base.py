@@ -9,8 +9,10 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...config import settings
+from ...db.session import load_relations
 from ..audit_service import AuditService
 from ..notification_service import NotificationService
+from ...core.principal import publish_invalidation
 from ...core.redis import RealtimeBroker  # conservé pour compatibilité potentielle
 from app.models import Organization, OrganizationMembership, OrganizationRole, UserSecurityState, Workspace, WorkspaceMembership
 
@@ -31,9 +33,18 @@ class AuthBase:
         self.session = session
         self.audit = audit_service
         self.notifications = notification_service
+        self._revoked_sessions: set[uuid.UUID] = set()
+
+    async def commit(self) -> None:
+        """Valide la transaction puis propage les sessions révoquées au cache des principaux."""
+        await self.session.commit()
+        revoked, self._revoked_sessions = self._revoked_sessions, set()
+        if revoked:
+            await publish_invalidation(session_ids=revoked)
 
     async def _ensure_security_state(self, user) -> UserSecurityState:
         """Garantit l'existence de l'état de sécurité utilisateur avant utilisation."""
+        await load_relations(self.session, user, "security_state")
         if user.security_state is None:
             user.security_state = UserSecurityState(user_id=user.id)
             self.session.add(user.security_state)
@@ -8,7 +8,7 @@ from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 
 from app.models import EmailConfirmationToken, NotificationChannel, PasswordResetToken, UserAccount
-from ...core.security import get_password_hash
+from ...core.security import get_password_hash_async
 from .base import AuthBase
 
 
@@ -119,7 +119,7 @@ class AuthPasswordsMixin(AuthBase):
         if user is None or not user.is_active:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user")
 
-        user.hashed_password = get_password_hash(new_password)
+        user.hashed_password = await get_password_hash_async(new_password)
         user.failed_login_attempts = 0
         user.locked_until = None
         token.used_at = datetime.now(timezone.utc)
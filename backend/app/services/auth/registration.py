@@ -17,7 +17,7 @@ from app.models import (
     UserRole,
     WorkspaceMembership,
 )
-from ...core.security import get_password_hash
+from ...core.security import get_password_hash_async
 from .base import AuthBase
 from .models import RegisterResult
 
@@ -41,7 +41,7 @@ class AuthRegistrationMixin(AuthBase):
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="E-mail déjà utilisé")
 
         normalized_email = email.lower()
-        hashed = get_password_hash(password)
+        hashed = await get_password_hash_async(password)
         desired_role = role or (UserRole.SUPERADMIN if self._is_default_admin_email(normalized_email) else UserRole.MEMBER)
         confirmed_flag = bool(is_confirmed) if is_confirmed is not None else False
         user = UserAccount(
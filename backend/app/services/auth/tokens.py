@@ -8,7 +8,7 @@ from fastapi import HTTPException, status
 from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 
-from app.models import NotificationChannel, RefreshToken, SessionToken, UserAccount
+from app.models import NotificationChannel, OrganizationMembership, RefreshToken, SessionToken, UserAccount
 from ...config import settings
 from ...core.security import create_access_token
 from .base import AuthBase
@@ -29,7 +29,17 @@ class AuthTokensMixin(AuthBase):
         """Crée une session, génère les tokens JWT et alerte l'utilisateur si nécessaire."""
         now = datetime.now(timezone.utc)
         session_id = uuid.uuid4()
-        access_token = create_access_token({"sub": str(user.id), "sid": str(session_id)})
+        claims = {"sub": str(user.id), "sid": str(session_id)}
+        # Organisation de rattachement : clé d'équité de l'admission (core/admission.py), sans requête.
+        organization_id = await self.session.scalar(
+            select(OrganizationMembership.organization_id)
+            .where(OrganizationMembership.user_id == user.id)
+            .order_by(OrganizationMembership.joined_at)
+            .limit(1)
+        )
+        if organization_id is not None:
+            claims["org"] = str(organization_id)
+        access_token = create_access_token(claims)
         refresh_token_value = token_urlsafe(24)
         refresh_expires = now + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
@@ -105,6 +115,7 @@ class AuthTokensMixin(AuthBase):
                 .where(SessionToken.id == token.session_id)
                 .values(revoked_at=datetime.now(timezone.utc), refresh_token_jti=None)
             )
+            self._revoked_sessions.add(token.session_id)
 
         auth_result = await self.issue_tokens(user, user_agent=token.user_agent, ip_address=token.ip_address)
         await self._log("auth.refresh", user_id=str(user.id), metadata={"old_session": token.session_id})
@@ -126,6 +137,7 @@ class AuthTokensMixin(AuthBase):
                 .where(SessionToken.id == token.session_id)
                 .values(revoked_at=now)
             )
+            self._revoked_sessions.add(token.session_id)
         await self._log("auth.logout", user_id=str(token.user_id), metadata={"session_id": token.session_id})
 
     async def revoke_all_tokens(self, user: UserAccount, keep_session_id: uuid.UUID | None = None) -> int:
@@ -147,6 +159,7 @@ class AuthTokensMixin(AuthBase):
                     .where(SessionToken.id == token.session_id)
                     .values(revoked_at=now)
                 )
+                self._revoked_sessions.add(token.session_id)
         await self._log("auth.logout_all", user_id=str(user.id), metadata={"revoked": revoked_count})
         return revoked_count
 
@@ -8,7 +8,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
 from app.models import UserAccount
-from ...core.security import verify_password
+from ...core.security import verify_password_async
 from .base import AuthBase
 from .models import TotpRequiredError
 
@@ -30,7 +30,7 @@ class AuthTotpMixin(AuthBase):
         )
         result = await self.session.execute(stmt)
         user = result.scalar_one_or_none()
-        if user is None or not verify_password(password, user.hashed_password):
+        if user is None or not await verify_password_async(password, user.hashed_password):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect credentials")
         if not user.is_active:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
@@ -10,7 +10,8 @@
 # - Peut publier des notifications (email/réaltime) si injecté.
 #
 # Points de vigilance:
-# - Aucun commit automatique: a piloter depuis la couche route.
+# - Aucun commit automatique: a piloter depuis la couche route (commit() invalide ensuite
+#   l'overview en cache des deux utilisateurs).
 # - Synchroniser les liens reciproques lors des changements de statut.
 # - Tenir compte des preferences de notification du destinataire.
 ############################################################
@@ -28,6 +29,7 @@ from sqlalchemy.orm import selectinload
 from app.models import ContactLink, ContactStatus, NotificationChannel, UserAccount, OrganizationMembership
 from .audit_service import AuditService
 from .notification_service import NotificationService
+from ..core.overview_cache import OverviewCache
 from ..core.redis import RealtimeBroker
 
 
@@ -45,12 +47,22 @@ class ContactService:
         audit_service: AuditService | None = None,
         notification_service: NotificationService | None = None,
         realtime_broker: RealtimeBroker | None = None,
+        overview_cache: OverviewCache | None = None,
     ) -> None:
-        """Injecte la session et les services optionnels (audit, notifications email, temps reel)."""
+        """Injecte la session et les services optionnels (audit, notifications email, temps reel, overview)."""
         self.session = session
         self.audit = audit_service
         self.notifications = notification_service
         self.realtime = realtime_broker
+        self.overview_cache = overview_cache if overview_cache and overview_cache.enabled else None
+        self._overview_stale: set[uuid.UUID] = set()
+
+    async def commit(self) -> None:
+        """Valide la transaction puis invalide l'overview des utilisateurs touchés."""
+        await self.session.commit()
+        stale, self._overview_stale = self._overview_stale, set()
+        if self.overview_cache and stale:
+            await self.overview_cache.invalidate(list(stale))
 
     # --- Lecture ---
     async def list_contacts(self, owner: UserAccount, status: ContactStatus | None = None) -> list[ContactLink]:
@@ -113,6 +125,7 @@ class ContactService:
         )
         self.session.add_all([owner_link, reciprocal_link])
         await self.session.flush()
+        self._overview_stale.update((owner.id, target.id))
         await self._log(owner, "contacts.create", resource_id=str(owner_link.id), metadata={"target": target_email})
         if self.notifications:
             display_name = None
@@ -203,6 +216,7 @@ class ContactService:
                     },
                 )
         await self.session.flush()
+        self._overview_stale.update((owner.id, contact.contact_id))
         await self._log(owner, "contacts.status", resource_id=str(contact.id), metadata={"status": status_value.value})
         if status_value == ContactStatus.ACCEPTED:
             await self._notify_user_event(
@@ -244,6 +258,7 @@ class ContactService:
             )
         )
         await self.session.execute(reciprocal_stmt)
+        self._overview_stale.update((contact.owner_id, contact.contact_id))
         await self._log(owner, "contacts.delete", resource_id=str(contact.id))
 
     async def _get_contact(
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import contextlib
+import uuid
 
 from sqlalchemy import select
 
@@ -8,12 +8,12 @@ from app.models import (
     ConversationMember,
     Message,
     MessageAttachment,
-    MessageDelivery,
-    MessageDeliveryState,
     MessageType,
     UserAccount,
+    UserProfile,
 )
 from .conversation_base import ConversationBase
+from .conversation_delivery import DerivedDelivery
 from ..attachment_service import AttachmentDescriptor
 from ...config import settings
 
@@ -21,60 +21,151 @@ from ...config import settings
 class ConversationAttachmentMixin(ConversationBase):
     """Persistance et sérialisation des pièces jointes et messages."""
 
-    async def _persist_attachments(self, message: Message, descriptors: list[AttachmentDescriptor]) -> None:
-        """Enregistre les métadonnées des pièces jointes associées à un message."""
-        if not descriptors:
-            return
-        entities: list[MessageAttachment] = []
-        for descriptor in descriptors:
-            entities.append(
-                MessageAttachment(
-                    message_id=message.id,
-                    storage_url=descriptor.storage_url,
-                    file_name=descriptor.file_name,
-                    mime_type=descriptor.mime_type,
-                    size_bytes=descriptor.size_bytes,
-                    sha256=descriptor.sha256,
-                    encryption_info=descriptor.encryption_metadata,
-                )
+    def _build_attachments(self, message: Message, descriptors: list[AttachmentDescriptor]) -> list[MessageAttachment]:
+        """Prépare (sans flush) les pièces jointes associées à un message ; l'appelant les ajoute à la session."""
+        return [
+            MessageAttachment(
+                message_id=message.id,
+                storage_url=descriptor.storage_url,
+                file_name=descriptor.file_name,
+                mime_type=descriptor.mime_type,
+                size_bytes=descriptor.size_bytes,
+                sha256=descriptor.sha256,
+                encryption_info=descriptor.encryption_metadata,
             )
-        self.session.add_all(entities)
-        await self.session.flush()
+            for descriptor in descriptors
+        ]
 
     async def serialize_message(self, message: Message, *, viewer_membership: ConversationMember | None = None) -> dict:
         """Prépare le payload API d'un message, incluant réactions, pins et état de livraison."""
-        author = message.author
-        if author is None and message.author_id:
-            author = await self.session.get(UserAccount, message.author_id)
-        if author and getattr(author, "profile", None) is None:
-            with contextlib.suppress(Exception):
-                await self.session.refresh(author, attribute_names=["profile"])
+        payloads = await self.serialize_messages([message], viewer_membership=viewer_membership)
+        return payloads[0]
+
+    async def serialize_messages(
+        self,
+        messages: list[Message],
+        *,
+        viewer_membership: ConversationMember | None = None,
+    ) -> list[dict]:
+        """Sérialise une page de messages avec un nombre constant de requêtes, quel que soit N."""
+        if not messages:
+            return []
+        message_ids = [message.id for message in messages]
+        viewer_member_id = viewer_membership.id if viewer_membership else None
+
+        reference_ids = {
+            ref_id
+            for message in messages
+            for ref_id in (message.reply_to_message_id, message.forward_from_message_id)
+            if ref_id
+        }
+        references = await self._load_references(reference_ids)
+        await self._prime_data_keys([*messages, *references.values()])
+        plaintexts = await self._decrypt_messages([*messages, *references.values()])
+        author_ids = {message.author_id for message in messages if message.author_id}
+        author_ids.update(reference.author_id for reference in references.values() if reference.author_id)
+        authors = await self._load_author_cards(author_ids)
+        attachments = await self._load_attachments([*message_ids, *references.keys()])
+        reactions = await self._load_reaction_summaries(message_ids, viewer_member_id)
+        pins = await self._load_pins(message_ids)
+        viewer_deliveries = await self._load_viewer_deliveries(messages, viewer_membership)
+
+        payloads: list[dict] = []
+        for message in messages:
+            payload = self._build_message_payload(
+                message, authors.get(message.author_id), content=plaintexts.get(message.id)
+            )
+            payload["reactions"] = reactions.get(message.id, [])
+
+            pin = pins.get(message.id)
+            if pin:
+                payload["pinned"] = True
+                payload["pinned_at"] = pin.pinned_at.isoformat() if pin.pinned_at else None
+                payload["pinned_by"] = str(pin.pinned_by) if pin.pinned_by else None
+
+            delivery = viewer_deliveries.get(message.id)
+            if delivery:
+                payload["delivery_state"] = delivery.state.value
+                payload["delivered_at"] = delivery.delivered_at.isoformat() if delivery.delivered_at else None
+                payload["read_at"] = delivery.read_at.isoformat() if delivery.read_at else None
+            payload["delivery_summary"] = self._delivery_summary(message, viewer_membership, delivery)
+
+            payload["attachments"] = [self._serialize_attachment(item) for item in attachments.get(message.id, [])]
+            payload["reply_to"] = self._serialize_reference(
+                references.get(message.reply_to_message_id), authors, attachments, plaintexts
+            )
+            payload["forward_from"] = self._serialize_reference(
+                references.get(message.forward_from_message_id), authors, attachments, plaintexts
+            )
+            if payload["deleted"]:
+                payload["content"] = ""
+                payload["attachments"] = []
+            payloads.append(payload)
+        return payloads
+
+    async def _serialize_new_message(
+        self,
+        message: Message,
+        *,
+        author: UserAccount,
+        membership: ConversationMember,
+        attachments: list[MessageAttachment],
+        references: dict[uuid.UUID, Message],
+        author_delivery: DerivedDelivery,
+    ) -> dict:
+        """Construit le payload d'un message tout juste créé depuis les objets en mémoire.
 
-        profile = author.profile if author and getattr(author, "profile", None) else None
-        display_name = None
-        if profile and profile.display_name:
-            display_name = profile.display_name
-        elif author and author.email:
-            display_name = author.email
+        Pas de réaction ni d'épingle possibles : seules les références (reply/forward) demandent
+        des lectures, pour les auteurs et le nombre de pièces jointes citées.
+        """
+        profile = author.profile
+        author_card = {
+            "display_name": (profile.display_name if profile else None) or author.email,
+            "avatar_url": profile.avatar_url if profile else None,
+        }
+        payload = self._build_message_payload(message, author_card)
+        payload["delivery_state"] = author_delivery.state.value
+        payload["delivered_at"] = author_delivery.delivered_at.isoformat() if author_delivery.delivered_at else None
+        payload["read_at"] = author_delivery.read_at.isoformat() if author_delivery.read_at else None
+        payload["delivery_summary"] = self._delivery_summary(message, membership, author_delivery)
+        payload["attachments"] = [self._serialize_attachment(item) for item in attachments]
 
-        avatar_url = profile.avatar_url if profile else None
+        reference_authors: dict[uuid.UUID, dict] = {}
+        reference_attachments: dict[uuid.UUID, list[MessageAttachment]] = {}
+        if references:
+            await self._prime_data_keys(references.values())
+            reference_authors = await self._load_author_cards(
+                {reference.author_id for reference in references.values() if reference.author_id}
+            )
+            reference_attachments = await self._load_attachments(list(references.keys()))
+        payload["reply_to"] = self._serialize_reference(
+            references.get(message.reply_to_message_id), reference_authors, reference_attachments
+        )
+        payload["forward_from"] = self._serialize_reference(
+            references.get(message.forward_from_message_id), reference_authors, reference_attachments
+        )
+        return payload
 
-        content = self._extract_plaintext(message)
+    def _build_message_payload(self, message: Message, author_card: dict | None, *, content: str | None = None) -> dict:
+        """Construit la partie du payload qui ne dépend que du message et de son auteur.
 
-        payload = {
+        `content` : texte déjà déchiffré par lot (_decrypt_messages) ; à défaut, déchiffré ici.
+        """
+        card = author_card or {}
+        return {
             "id": str(message.id),
             "conversation_id": str(message.conversation_id),
             "author_id": str(message.author_id) if message.author_id else None,
-            "author_display_name": display_name,
-            "author_avatar_url": avatar_url,
+            "author_display_name": card.get("display_name"),
+            "author_avatar_url": card.get("avatar_url"),
             "type": message.type.value if message.type else MessageType.TEXT.value,
-            "content": content,
+            "content": content if content is not None else self._extract_plaintext(message),
             "created_at": message.created_at.isoformat(),
             "stream_position": int(message.stream_position) if message.stream_position is not None else None,
             "is_system": bool(message.is_system),
             "encryption_scheme": message.encryption_scheme,
             "encryption_metadata": message.encryption_metadata or {},
-            "reactions": self._summarize_reactions(message, viewer_membership),
+            "reactions": [],
             "pinned": False,
             "pinned_at": None,
             "pinned_by": None,
@@ -87,50 +178,42 @@ class ConversationAttachmentMixin(ConversationBase):
             "deleted": bool(message.deleted_at),
         }
 
-        pin = next(iter(getattr(message, "pins", []) or []), None)
-        if pin:
-            payload["pinned"] = True
-            payload["pinned_at"] = pin.pinned_at.isoformat() if pin.pinned_at else None
-            payload["pinned_by"] = str(pin.pinned_by) if pin.pinned_by else None
-
-        viewer_member_id = viewer_membership.id if viewer_membership else None
-        if viewer_member_id:
-            delivery = self._match_delivery(message, viewer_member_id)
-            if delivery is None:
-                delivery = await self._fetch_delivery(message.id, viewer_member_id)
-            if delivery:
-                payload["delivery_state"] = delivery.state.value
-                payload["delivered_at"] = delivery.delivered_at.isoformat() if delivery.delivered_at else None
-                payload["read_at"] = delivery.read_at.isoformat() if delivery.read_at else None
+    async def _load_author_cards(self, author_ids: set[uuid.UUID]) -> dict[uuid.UUID, dict]:
+        """Charge en une requête le nom affiché et l'avatar des auteurs."""
+        if not author_ids:
+            return {}
+        stmt = (
+            select(UserAccount.id, UserAccount.email, UserProfile.display_name, UserProfile.avatar_url)
+            .outerjoin(UserProfile, UserProfile.user_id == UserAccount.id)
+            .where(UserAccount.id.in_(author_ids))
+        )
+        result = await self.session.execute(stmt)
+        return {
+            row.id: {"display_name": row.display_name or row.email, "avatar_url": row.avatar_url}
+            for row in result.all()
+        }
 
-        deliveries = getattr(message, "deliveries", None)
-        if deliveries is None:
-            stmt = select(MessageDelivery).where(MessageDelivery.message_id == message.id)
-            result = await self.session.execute(stmt)
-            deliveries = result.scalars().all()
-        summary = {"total": 0, "delivered": 0, "read": 0, "pending": 0}
-        for delivery in deliveries or []:
-            if viewer_member_id and delivery.member_id == viewer_member_id:
-                continue
-            summary["total"] += 1
-            if delivery.state == MessageDeliveryState.READ:
-                summary["read"] += 1
-                summary["delivered"] += 1
-            elif delivery.state == MessageDeliveryState.DELIVERED:
-                summary["delivered"] += 1
-            else:
-                summary["pending"] += 1
-        payload["delivery_summary"] = summary
-
-        attachments = getattr(message, "attachments", None) or []
-        payload["attachments"] = [self._serialize_attachment(attachment) for attachment in attachments]
-        payload["reply_to"] = self._serialize_reference(getattr(message, "reply_to", None))
-        payload["forward_from"] = self._serialize_reference(getattr(message, "forwarded_from", None))
-        if payload["deleted"]:
-            payload["content"] = ""
-            payload["attachments"] = []
+    async def _load_references(self, reference_ids: set[uuid.UUID]) -> dict[uuid.UUID, Message]:
+        """Charge en une requête les messages cités (réponses/transferts)."""
+        if not reference_ids:
+            return {}
+        result = await self.session.execute(select(Message).where(Message.id.in_(reference_ids)))
+        return {reference.id: reference for reference in result.scalars().all()}
 
-        return payload
+    async def _load_attachments(self, message_ids: list[uuid.UUID]) -> dict[uuid.UUID, list[MessageAttachment]]:
+        """Charge en une requête les pièces jointes d'un ensemble de messages."""
+        if not message_ids:
+            return {}
+        stmt = (
+            select(MessageAttachment)
+            .where(MessageAttachment.message_id.in_(message_ids))
+            .order_by(MessageAttachment.created_at.asc())
+        )
+        result = await self.session.execute(stmt)
+        grouped: dict[uuid.UUID, list[MessageAttachment]] = {}
+        for attachment in result.scalars().all():
+            grouped.setdefault(attachment.message_id, []).append(attachment)
+        return grouped
 
     def _serialize_attachment(self, attachment: MessageAttachment) -> dict:
         """Prepare les metadonnees exposees d'une piece jointe (lien presigne si stockage dispo)."""
@@ -154,24 +237,25 @@ class ConversationAttachmentMixin(ConversationBase):
             "encryption": attachment.encryption_info or {},
         }
 
-    def _serialize_reference(self, reference: Message | None) -> dict | None:
+    def _serialize_reference(
+        self,
+        reference: Message | None,
+        authors: dict[uuid.UUID, dict],
+        attachments: dict[uuid.UUID, list[MessageAttachment]],
+        plaintexts: dict[uuid.UUID, str] | None = None,
+    ) -> dict | None:
         """Formate une reference de message (reply/forward) avec un extrait en clair."""
         if reference is None:
             return None
-        author_name = None
-        author = reference.author
-        if author and getattr(author, "profile", None):
-            profile = author.profile
-            if profile.display_name:
-                author_name = profile.display_name
-        if author_name is None and author and author.email:
-            author_name = author.email
-        excerpt = self._extract_plaintext(reference)
+        author_card = authors.get(reference.author_id) or {}
+        excerpt = (plaintexts or {}).get(reference.id)
+        if excerpt is None:
+            excerpt = self._extract_plaintext(reference)
         return {
             "id": str(reference.id),
-            "author_display_name": author_name,
+            "author_display_name": author_card.get("display_name"),
             "excerpt": excerpt[:160],
             "created_at": reference.created_at.isoformat() if reference.created_at else None,
             "deleted": bool(reference.deleted_at),
-            "attachments": len(getattr(reference, "attachments", []) or []),
+            "attachments": len(attachments.get(reference.id, [])),
         }
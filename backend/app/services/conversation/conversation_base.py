@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import logging
 import uuid
 from datetime import datetime, timezone
+from typing import Awaitable, Callable
 
 from fastapi import HTTPException, status
 from sqlalchemy import func, select
@@ -19,11 +21,17 @@ from app.models import (
     WorkspaceMembership,
 )
 from ..audit_service import AuditService
+from ...core.keyring import MessageKeyring, get_keyring
+from ...core.message_cache import MessageWindowCache
+from ...core.overview_cache import OverviewCache
 from ...core.redis import RealtimeBroker
+from ...core.unread import UnreadCounters
 from ...core.storage import ObjectStorage
 from ...config import settings
 from ..attachment_service import AttachmentService
 
+logger = logging.getLogger(__name__)
+
 
 class ConversationBase:
     """Initialisation et helpers communs (session, audit, membres, workspaces)."""
@@ -36,18 +44,52 @@ class ConversationBase:
         realtime_broker: RealtimeBroker | None = None,
         storage_service: ObjectStorage | None = None,
         attachment_decoder: AttachmentService | None = None,
+        message_cache: MessageWindowCache | None = None,
+        keyring: MessageKeyring | None = None,
+        unread_counters: UnreadCounters | None = None,
+        overview_cache: OverviewCache | None = None,
     ) -> None:
-        """Injecte la session et les intégrations (audit, temps réel, stockage, décodeur PJ)."""
+        """Injecte la session et les intégrations (audit, temps réel, stockage, PJ, caches, clés)."""
         self.session = session
         self.audit = audit_service
         self.realtime = realtime_broker
         self.storage = storage_service
         self.attachment_decoder = attachment_decoder
-        self._rsa_public_key = self._load_rsa_public_key()
-        self._rsa_private_key = self._load_rsa_private_key()
-        self._encryption_enabled = bool(
-            settings.MESSAGE_ENCRYPTION_ENABLED and self._rsa_public_key and self._rsa_private_key
-        )
+        self.message_cache = message_cache if message_cache and message_cache.enabled else None
+        self.unread_counters = unread_counters if unread_counters and unread_counters.enabled else None
+        self.overview_cache = overview_cache if overview_cache and overview_cache.enabled else None
+        # Trousseau partagé par le processus : aucune clé PEM n'est relue par requête.
+        self.keyring = keyring or get_keyring()
+        self._encryption_enabled = bool(settings.MESSAGE_ENCRYPTION_ENABLED and self.keyring.can_encrypt)
+        self._receipts_watermark = settings.MESSAGE_RECEIPTS_MODE == "watermark"
+        self._blind_search = settings.MESSAGE_SEARCH_MODE == "blind"
+        # Clés de données amorcées pour cette requête : (conversation, génération) -> clé AES.
+        self._data_keys: dict[tuple[uuid.UUID, int], bytes] = {}
+        # Clés de données créées dans la transaction en cours, publiées dans le cache process au commit.
+        self._pending_data_keys: dict[uuid.UUID, tuple[int, bytes]] = {}
+        self._post_commit: list[Callable[[], Awaitable[None]]] = []
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Diffère une action (diffusion temps réel, réveil des workers) après la validation de la transaction."""
+        self._post_commit.append(callback)
+
+    def _invalidate_overview(self, user_ids: list[uuid.UUID]) -> None:
+        """Après commit : l'overview en cache de ces utilisateurs sera recalculé au prochain chargement."""
+        if not user_ids or not self.overview_cache:
+            return
+        cache = self.overview_cache
+        targets = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        self.after_commit(lambda: cache.invalidate(targets))
+
+    async def commit(self) -> None:
+        """Valide la transaction puis exécute les actions différées ; leurs erreurs ne font pas échouer la requête."""
+        await self.session.commit()
+        callbacks, self._post_commit = self._post_commit, []
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception:  # noqa: BLE001
+                logger.exception("Post-commit callback failed")
 
     async def ensure_membership(self, conversation_id: uuid.UUID, user_id: uuid.UUID) -> ConversationMember:
         """Expose _get_membership pour les consommateurs externes."""
@@ -79,30 +121,32 @@ class ConversationBase:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation introuvable ou acces refuse.")
         return membership
 
-    async def _load_message(self, message_id: uuid.UUID):
-        """Charge un message avec toutes ses relations nécessaires aux réponses API."""
-        from app.models import Message  # import local pour éviter les cycles
-
+    async def _get_membership_with_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        user_id: uuid.UUID,
+    ) -> tuple[ConversationMember, Conversation]:
+        """Charge en une requête l'appartenance active et la conversation (chemin d'envoi)."""
         stmt = (
-            select(Message)
-            .where(Message.id == message_id)
-            .options(
-                selectinload(Message.author).selectinload(UserAccount.profile),
-                selectinload(Message.deliveries),
-                selectinload(Message.reactions),
-                selectinload(Message.pins),
-                selectinload(Message.attachments),
-                selectinload(Message.reply_to)
-                .selectinload(Message.author)
-                .selectinload(UserAccount.profile),
-                selectinload(Message.reply_to).selectinload(Message.attachments),
-                selectinload(Message.forwarded_from)
-                .selectinload(Message.author)
-                .selectinload(UserAccount.profile),
-                selectinload(Message.forwarded_from).selectinload(Message.attachments),
+            select(ConversationMember, Conversation)
+            .join(Conversation, Conversation.id == ConversationMember.conversation_id)
+            .where(
+                ConversationMember.conversation_id == conversation_id,
+                ConversationMember.user_id == user_id,
+                ConversationMember.state == MembershipState.ACTIVE,
             )
         )
         result = await self.session.execute(stmt)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation introuvable ou acces refuse.")
+        return row[0], row[1]
+
+    async def _load_message(self, message_id: uuid.UUID):
+        """Charge un message; les relations exposées à l'API sont hydratées par serialize_messages."""
+        from app.models import Message  # import local pour éviter les cycles
+
+        result = await self.session.execute(select(Message).where(Message.id == message_id))
         message = result.scalar_one_or_none()
         if message is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message introuvable.")
@@ -117,21 +161,6 @@ class ConversationBase:
         """Retourne une copie mutable des metadonnees de conversation."""
         return dict(conversation.extra_metadata or {})
 
-    async def _load_conversation_with_members(self, conversation_id: uuid.UUID) -> Conversation:
-        """Charge une conversation avec ses membres/profils pour reponses API."""
-        stmt = (
-            select(Conversation)
-            .where(Conversation.id == conversation_id)
-            .options(
-                selectinload(Conversation.members).selectinload(ConversationMember.user).selectinload(UserAccount.profile)
-            )
-        )
-        result = await self.session.execute(stmt)
-        conversation = result.scalar_one_or_none()
-        if conversation is None:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation introuvable.")
-        return conversation
-
     async def _promote_fallback_owner(
         self, conversation_id: uuid.UUID, *, exclude_user_id: uuid.UUID | None
     ) -> ConversationMember | None:
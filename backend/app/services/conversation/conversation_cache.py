@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import uuid
+
+from sqlalchemy import and_, func, select
+
+from app.models import ConversationMember, Message, MessageDelivery, MessageReaction
+from .conversation_base import ConversationBase
+from .conversation_delivery import DerivedDelivery
+
+# Champs propres au viewer : jamais stockés dans la fenêtre chaude, recalculés à chaque lecture.
+VIEWER_FIELDS = ("delivery_state", "delivered_at", "read_at", "delivery_summary")
+
+
+class ConversationCacheMixin(ConversationBase):
+    """Fenêtre chaude des derniers messages : lecture, remplissage et overlay des champs du viewer."""
+
+    async def list_message_payloads(
+        self,
+        conversation_id: uuid.UUID,
+        *,
+        limit: int = 50,
+        before: int | None = None,
+        after: int | None = None,
+        member: ConversationMember,
+    ) -> tuple[list[dict], dict]:
+        """Page de payloads pour le viewer : fenêtre Redis si elle couvre la page, sinon Postgres."""
+        page = None
+        if self.message_cache and not (before and after):
+            fetch_limit = min(max(limit, 1), 200)
+            page = await self.message_cache.read_page(
+                conversation_id, limit=fetch_limit, before=before, after=after
+            )
+            if page is None and before is None and after is None:
+                page = await self._fill_message_window(conversation_id, fetch_limit)
+        if page is None:
+            messages, meta = await self.list_messages(
+                conversation_id, limit=limit, before=before, after=after, member=member
+            )
+            return await self.serialize_messages(messages, viewer_membership=member), meta
+
+        neutral, meta = page
+        if neutral:
+            await self._mark_delivered(
+                member,
+                [uuid.UUID(payload["id"]) for payload in neutral],
+                max(payload["stream_position"] for payload in neutral),
+            )
+        return await self._overlay_viewer_state(neutral, member), meta
+
+    async def _fill_message_window(self, conversation_id: uuid.UUID, limit: int) -> tuple[list[dict], dict]:
+        """Recharge la fenêtre depuis Postgres et sert la page la plus récente à partir du résultat."""
+        window = self.message_cache.window
+        version = await self.message_cache.version(conversation_id)
+        stmt = (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.stream_position.desc())
+            .limit(window + 1)
+        )
+        result = await self.session.execute(stmt)
+        rows = list(result.scalars().all())
+        complete = len(rows) <= window
+        rows = list(reversed(rows[:window]))
+        neutral = [self._neutral_payload(payload) for payload in await self.serialize_messages(rows)]
+        await self.message_cache.fill(conversation_id, neutral, complete=complete, expected_version=version)
+
+        items = neutral[-limit:]
+        return items, {
+            "next_before": items[0]["stream_position"] if items else None,
+            "next_after": items[-1]["stream_position"] if items else None,
+            "has_more_before": len(neutral) > limit or not complete,
+            "has_more_after": False,
+        }
+
+    async def _overlay_viewer_state(self, payloads: list[dict], member: ConversationMember) -> list[dict]:
+        """Complète des payloads neutres avec l'état du viewer et les compteurs à jour (une requête)."""
+        if not payloads:
+            return []
+        viewer_emojis = (
+            select(func.array_agg(MessageReaction.emoji))
+            .where(MessageReaction.message_id == Message.id, MessageReaction.member_id == member.id)
+            .correlate(Message)
+            .scalar_subquery()
+        )
+        columns = [
+            Message.id,
+            Message.author_id,
+            Message.stream_position,
+            Message.created_at,
+            Message.recipient_count,
+            Message.delivered_count,
+            Message.read_count,
+            viewer_emojis.label("viewer_emojis"),
+        ]
+        stmt = select(*columns).where(Message.id.in_([uuid.UUID(payload["id"]) for payload in payloads]))
+        if not self._receipts_watermark:
+            stmt = stmt.add_columns(
+                MessageDelivery.state.label("viewer_state"),
+                MessageDelivery.delivered_at.label("viewer_delivered_at"),
+                MessageDelivery.read_at.label("viewer_read_at"),
+            ).outerjoin(
+                MessageDelivery,
+                and_(MessageDelivery.message_id == Message.id, MessageDelivery.member_id == member.id),
+            )
+        result = await self.session.execute(stmt)
+        states = {str(row.id): row for row in result.all()}
+
+        for payload in payloads:
+            row = states.get(payload["id"])
+            if row is None:
+                continue
+            emojis = set(row.viewer_emojis or [])
+            payload["reactions"] = [{**reaction, "reacted": reaction["emoji"] in emojis} for reaction in payload["reactions"]]
+            if self._receipts_watermark:
+                delivery = self._watermark_delivery(row, member)
+            elif row.viewer_state is not None:
+                delivery = DerivedDelivery(row.viewer_state, row.viewer_delivered_at, row.viewer_read_at)
+            else:
+                delivery = None
+            if delivery is not None:
+                payload["delivery_state"] = delivery.state.value
+                payload["delivered_at"] = delivery.delivered_at.isoformat() if delivery.delivered_at else None
+                payload["read_at"] = delivery.read_at.isoformat() if delivery.read_at else None
+            payload["delivery_summary"] = self._delivery_summary(row, member, delivery)
+        return payloads
+
+    @staticmethod
+    def _neutral_payload(payload: dict) -> dict:
+        """Retire d'un payload ce qui dépend du viewer (état de livraison, "reacted")."""
+        neutral = dict(payload)
+        neutral.update(dict.fromkeys(VIEWER_FIELDS))
+        neutral["reactions"] = [{**reaction, "reacted": False} for reaction in payload.get("reactions") or []]
+        return neutral
+
+    def _cache_message_payload(self, conversation_id: uuid.UUID, payload: dict, *, new: bool = False) -> None:
+        """Programme l'ajout (nouveau message) ou le patch de la fenêtre chaude après le commit."""
+        if not self.message_cache:
+            return
+        cache = self.message_cache
+        neutral = self._neutral_payload(payload)
+        if new:
+            self.after_commit(lambda: cache.append(conversation_id, neutral))
+        else:
+            self.after_commit(lambda: cache.patch(conversation_id, neutral))
@@ -1,98 +1,333 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import logging
 import os
-from typing import Tuple
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterable, Tuple
 
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.models import Message
+from app.models import ConversationEncryptionKey, Message
 from ...config import settings
+from ...core.executors import CRYPTO, offload
+from ...core.metrics import metrics
 from .conversation_base import ConversationBase
 
+logger = logging.getLogger(__name__)
+
+# Ancien schéma : une clé AES par message, enveloppée RSA à chaque envoi (toujours lisible).
+LEGACY_SCHEME = "rsa-oaep-aesgcm"
+# Schéma courant : clé de données (DEK) par conversation et génération, enveloppée RSA une seule fois.
+DATA_KEY_SCHEME = "conv-dek-aesgcm"
+DATA_KEY_ALGO = "rsa-oaep-sha256"
+# Durée pendant laquelle la génération courante d'une conversation est tenue pour acquise (rotation).
+_CURRENT_GENERATION_TTL_SECONDS = 300
+
+
+class DataKeyCache:
+    """LRU borné (process) des clés de données déballées, par (conversation, génération)."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._keys: OrderedDict[tuple[uuid.UUID, int], bytes] = OrderedDict()
+        self._current: dict[uuid.UUID, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: uuid.UUID, generation: int) -> bytes | None:
+        with self._lock:
+            key = self._keys.get((conversation_id, generation))
+            if key is not None:
+                self._keys.move_to_end((conversation_id, generation))
+            return key
+
+    def current(self, conversation_id: uuid.UUID) -> tuple[int, bytes] | None:
+        """Génération courante connue (et sa clé) si l'information est encore fraîche."""
+        with self._lock:
+            entry = self._current.get(conversation_id)
+            if entry is None or entry[1] < time.monotonic():
+                self._current.pop(conversation_id, None)
+                return None
+            key = self._keys.get((conversation_id, entry[0]))
+            return (entry[0], key) if key is not None else None
+
+    def put(self, conversation_id: uuid.UUID, generation: int, key: bytes, *, current: bool = False) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._keys[(conversation_id, generation)] = key
+            self._keys.move_to_end((conversation_id, generation))
+            if current:
+                self._current[conversation_id] = (generation, time.monotonic() + _CURRENT_GENERATION_TTL_SECONDS)
+            while len(self._keys) > self.maxsize:
+                (evicted_conversation, _), _ = self._keys.popitem(last=False)
+                if evicted_conversation in self._current and (
+                    (evicted_conversation, self._current[evicted_conversation][0]) not in self._keys
+                ):
+                    del self._current[evicted_conversation]
+
+
+data_key_cache = DataKeyCache(settings.MESSAGE_DATA_KEY_CACHE_SIZE)
+
 
 class ConversationCryptoMixin(ConversationBase):
     """Chiffrement/déchiffrement des contenus de message."""
 
     def _extract_plaintext(self, message: Message) -> str:
         """Extrait du texte lisible depuis le champ ciphertext (utilisé pour prévisualisation)."""
-        if message.encryption_scheme == "rsa-oaep-aesgcm":
+        if message.encryption_scheme in (LEGACY_SCHEME, DATA_KEY_SCHEME):
             try:
                 return self._decrypt_ciphertext(message)
             except Exception:
-                pass
+                if message.encryption_scheme == DATA_KEY_SCHEME:
+                    logger.warning("Unable to decrypt message %s", message.id)
+                    return ""
         return self._decode_plaintext(message.ciphertext)
 
+    async def _decrypt_messages(self, messages: Iterable[Message | None]) -> dict[uuid.UUID, str]:
+        """Déchiffre une page en lot : inline sous le seuil, sinon répartie sur la classe "crypto".
+
+        Les clés de données doivent être amorcées (_prime_data_keys) : les threads ne font aucune E/S.
+        """
+        unique = {message.id: message for message in messages if message is not None}
+        encrypted = [
+            message for message in unique.values() if message.encryption_scheme in (LEGACY_SCHEME, DATA_KEY_SCHEME)
+        ]
+        plaintexts = {
+            message_id: self._decode_plaintext(message.ciphertext)
+            for message_id, message in unique.items()
+            if message.encryption_scheme not in (LEGACY_SCHEME, DATA_KEY_SCHEME)
+        }
+        if not encrypted:
+            return plaintexts
+
+        threshold = settings.MESSAGE_DECRYPT_OFFLOAD_THRESHOLD
+        mode = "inline" if threshold <= 0 or len(encrypted) < threshold else "offload"
+        started = time.perf_counter()
+        if mode == "inline":
+            results = self._decrypt_chunk(encrypted)
+        else:
+            workers = max(1, settings.OFFLOAD_CRYPTO_CONCURRENCY)
+            size = max(1, -(-len(encrypted) // workers))
+            chunks = await asyncio.gather(
+                *(
+                    offload(CRYPTO, self._decrypt_chunk, encrypted[index:index + size])
+                    for index in range(0, len(encrypted), size)
+                )
+            )
+            results = {message_id: text for chunk in chunks for message_id, text in chunk.items()}
+        metrics.observe("message_decrypt_seconds", time.perf_counter() - started, mode=mode)
+        metrics.increment("message_decrypt_total", len(encrypted), mode=mode)
+        plaintexts.update(results)
+        return plaintexts
+
+    def _decrypt_chunk(self, messages: list[Message]) -> dict[uuid.UUID, str]:
+        return {message.id: self._extract_plaintext(message) for message in messages}
+
     def _decode_plaintext(self, ciphertext: object) -> str:
         """Decode un message en clair UTF-8 ou renvoie une représentation texte."""
         if isinstance(ciphertext, (bytes, bytearray, memoryview)):
             return bytes(ciphertext).decode("utf-8", errors="ignore")
         return str(ciphertext or "")
 
-    def _encrypt_content(self, *, conversation_id, content: str) -> Tuple[bytes, str, dict]:
-        """Chiffre le contenu si la clé est configurée, sinon retourne du plaintext encodé."""
+    async def _current_data_key(self, conversation_id: uuid.UUID) -> tuple[int, bytes] | None:
+        """Retourne (génération, clé) courante de la conversation, créée au premier envoi.
+
+        Le cache process évite toute opération RSA et toute requête sur le chemin d'envoi ;
+        à défaut, la génération la plus récente est relue (et déballée une fois), ou la génération 1
+        est créée (INSERT ... ON CONFLICT : deux premiers envois concurrents convergent).
+        Une clé créée n'entre dans le cache process qu'après le commit : en cas de rollback,
+        aucun envoi ultérieur ne chiffre avec une clé jamais enregistrée.
+        """
+        if not self._encryption_enabled:
+            return None
+        pending = self._pending_data_keys.get(conversation_id)
+        if pending is not None:
+            return pending
+        cached = data_key_cache.current(conversation_id)
+        if cached is not None:
+            self._data_keys[(conversation_id, cached[0])] = cached[1]
+            return cached
+
+        row = await self._latest_wrapped_key(conversation_id)
+        created = False
+        if row is None:
+            data_key = AESGCM.generate_key(bit_length=256)
+            wrapping_key_id, wrapped = self.keyring.wrap(data_key)
+            stmt = (
+                pg_insert(ConversationEncryptionKey)
+                .values(
+                    id=uuid.uuid4(),
+                    conversation_id=conversation_id,
+                    generation=1,
+                    encrypted_key=wrapped,
+                    key_algo=DATA_KEY_ALGO,
+                    wrapping_key_id=wrapping_key_id,
+                )
+                .on_conflict_do_nothing(constraint="uix_conversation_key_generation")
+                .returning(ConversationEncryptionKey.generation)
+            )
+            result = await self.session.execute(stmt)
+            if result.scalar_one_or_none() is not None:
+                generation = 1
+                created = True
+            else:
+                row = await self._latest_wrapped_key(conversation_id)
+                if row is None:
+                    raise RuntimeError("Conversation data key unavailable")
+        if row is not None:
+            generation = row.generation
+            data_key = await offload(CRYPTO, self.keyring.unwrap, bytes(row.encrypted_key), row.wrapping_key_id)
+        self._data_keys[(conversation_id, generation)] = data_key
+        if not created:
+            data_key_cache.put(conversation_id, generation, data_key, current=True)
+            return generation, data_key
+
+        self._pending_data_keys[conversation_id] = (generation, data_key)
+
+        async def publish_data_key() -> None:
+            data_key_cache.put(conversation_id, generation, data_key, current=True)
+
+        self.after_commit(publish_data_key)
+        return generation, data_key
+
+    async def _latest_wrapped_key(self, conversation_id: uuid.UUID):
+        stmt = (
+            select(
+                ConversationEncryptionKey.generation,
+                ConversationEncryptionKey.encrypted_key,
+                ConversationEncryptionKey.wrapping_key_id,
+            )
+            .where(
+                ConversationEncryptionKey.conversation_id == conversation_id,
+                ConversationEncryptionKey.key_algo == DATA_KEY_ALGO,
+            )
+            .order_by(ConversationEncryptionKey.generation.desc())
+            .limit(1)
+        )
+        result = await self.session.execute(stmt)
+        return result.first()
+
+    async def _prime_data_keys(self, messages: Iterable[Message]) -> None:
+        """Charge en une requête les clés de données manquantes d'une page avant la sérialisation (synchrone)."""
+        missing: set[tuple[uuid.UUID, int]] = set()
+        for message in messages:
+            if message is None or message.encryption_scheme != DATA_KEY_SCHEME:
+                continue
+            generation = (message.encryption_metadata or {}).get("key_generation")
+            if generation is None:
+                continue
+            ref = (message.conversation_id, int(generation))
+            if ref in self._data_keys:
+                continue
+            cached = data_key_cache.get(*ref)
+            if cached is not None:
+                self._data_keys[ref] = cached
+            else:
+                missing.add(ref)
+        if not missing:
+            return
+        stmt = select(
+            ConversationEncryptionKey.conversation_id,
+            ConversationEncryptionKey.generation,
+            ConversationEncryptionKey.encrypted_key,
+            ConversationEncryptionKey.wrapping_key_id,
+        ).where(
+            tuple_(ConversationEncryptionKey.conversation_id, ConversationEncryptionKey.generation).in_(list(missing)),
+            ConversationEncryptionKey.key_algo == DATA_KEY_ALGO,
+        )
+        result = await self.session.execute(stmt)
+        rows = result.all()
+        # Déballages RSA de la page en un seul passage sur le pool de threads (cryptography relâche le GIL).
+        data_keys = await offload(CRYPTO, self._unwrap_rows, rows)
+        for row, data_key in zip(rows, data_keys):
+            if data_key is None:
+                logger.warning("Missing message key %s for conversation %s", row.wrapping_key_id, row.conversation_id)
+                continue
+            data_key_cache.put(row.conversation_id, row.generation, data_key)
+            self._data_keys[(row.conversation_id, row.generation)] = data_key
+
+    def _unwrap_rows(self, rows) -> list[bytes | None]:
+        data_keys: list[bytes | None] = []
+        for row in rows:
+            try:
+                data_keys.append(self.keyring.unwrap(bytes(row.encrypted_key), row.wrapping_key_id))
+            except (LookupError, ValueError):
+                data_keys.append(None)
+        return data_keys
+
+    def _encrypt_content(
+        self,
+        *,
+        conversation_id,
+        content: str,
+        data_key: tuple[int, bytes] | None = None,
+    ) -> Tuple[bytes, str, dict]:
+        """Chiffre le contenu (clé de conversation si fournie), sinon retourne du plaintext encodé."""
         if not self._encryption_enabled:
             return content.encode("utf-8"), "plaintext", {"encoding": "utf-8"}
 
-        aes_key = AESGCM.generate_key(bit_length=256)
         nonce = os.urandom(12)
         aad = str(conversation_id).encode("utf-8")
+        if data_key is not None:
+            generation, key = data_key
+            ciphertext = AESGCM(key).encrypt(nonce, content.encode("utf-8"), aad)
+            metadata = {
+                "nonce": base64.b64encode(nonce).decode("ascii"),
+                "aad": base64.b64encode(aad).decode("ascii"),
+                "key_generation": generation,
+                "encoding": "utf-8",
+                "algo": "aes-256-gcm",
+            }
+            return ciphertext, DATA_KEY_SCHEME, metadata
 
+        aes_key = AESGCM.generate_key(bit_length=256)
         aesgcm = AESGCM(aes_key)
         ciphertext = aesgcm.encrypt(nonce, content.encode("utf-8"), aad)
 
-        encrypted_key = self._rsa_public_key.encrypt(
-            aes_key,
-            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None),
-        )
+        key_id, encrypted_key = self.keyring.wrap(aes_key)
 
         metadata = {
             "nonce": base64.b64encode(nonce).decode("ascii"),
             "enc_key": base64.b64encode(encrypted_key).decode("ascii"),
+            "key_id": key_id,
             "aad": base64.b64encode(aad).decode("ascii"),
             "encoding": "utf-8",
             "algo": "aes-256-gcm",
         }
-        return ciphertext, "rsa-oaep-aesgcm", metadata
+        return ciphertext, LEGACY_SCHEME, metadata
 
     def _decrypt_ciphertext(self, message: Message) -> str:
-        """Déchiffre un message avec schéma rsa-oaep-aesgcm."""
+        """Déchiffre un message (clé de conversation amorcée, ou ancien schéma rsa-oaep-aesgcm)."""
         metadata = message.encryption_metadata or {}
-        enc_key_b64 = metadata.get("enc_key")
         nonce_b64 = metadata.get("nonce")
         aad_b64 = metadata.get("aad")
-        if not enc_key_b64 or not nonce_b64 or not self._rsa_private_key:
+        aad = base64.b64decode(aad_b64) if aad_b64 else None
+        encoding = metadata.get("encoding") or "utf-8"
+
+        if message.encryption_scheme == DATA_KEY_SCHEME:
+            ref = (message.conversation_id, int(metadata["key_generation"]))
+            aes_key = self._data_keys.get(ref) or data_key_cache.get(*ref)
+            if aes_key is None:
+                raise LookupError(f"Data key {ref} not primed")
+            plaintext = AESGCM(aes_key).decrypt(base64.b64decode(nonce_b64), bytes(message.ciphertext), aad)
+            return plaintext.decode(encoding, errors="ignore")
+
+        enc_key_b64 = metadata.get("enc_key")
+        if not enc_key_b64 or not nonce_b64 or not self.keyring.key_ids:
             return self._decode_plaintext(message.ciphertext)
 
         encrypted_key = base64.b64decode(enc_key_b64)
         nonce = base64.b64decode(nonce_b64)
-        aad = base64.b64decode(aad_b64) if aad_b64 else None
 
-        aes_key = self._rsa_private_key.decrypt(
-            encrypted_key,
-            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None),
-        )
+        # Sans key_id (messages antérieurs au trousseau), chaque clé détenue est essayée.
+        aes_key = self.keyring.unwrap(encrypted_key, metadata.get("key_id"))
         aesgcm = AESGCM(aes_key)
         plaintext = aesgcm.decrypt(nonce, bytes(message.ciphertext), aad)
-        encoding = metadata.get("encoding") or "utf-8"
         return plaintext.decode(encoding, errors="ignore")
-
-    def _load_rsa_public_key(self):
-        pem = settings.MESSAGE_RSA_PUBLIC_KEY
-        if not pem:
-            return None
-        try:
-            return serialization.load_pem_public_key(pem.encode("utf-8"))
-        except Exception:
-            return None
-
-    def _load_rsa_private_key(self):
-        pem = settings.MESSAGE_RSA_PRIVATE_KEY
-        if not pem:
-            return None
-        try:
-            return serialization.load_pem_private_key(pem.encode("utf-8"), password=None)
-        except Exception:
-            return None
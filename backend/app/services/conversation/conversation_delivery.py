@@ -2,13 +2,22 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime, timezone
+from typing import NamedTuple
 
-from sqlalchemy import func, select
+from sqlalchemy import func, or_, select, update
 
-from app.models import ConversationMember, Message, MessageDelivery, MessageDeliveryState, MembershipState, UserAccount
+from app.models import Conversation, ConversationMember, Message, MessageDelivery, MessageDeliveryState, MembershipState, UserAccount
 from .conversation_base import ConversationBase
 
 
+class DerivedDelivery(NamedTuple):
+    """État de livraison reconstitué sans ligne message_deliveries (watermark ou message tout juste envoyé)."""
+
+    state: MessageDeliveryState
+    delivered_at: datetime | None = None
+    read_at: datetime | None = None
+
+
 class ConversationDeliveryMixin(ConversationBase):
     """Livraisons, marquage lu, résumés unread et helpers réactions/livraisons."""
 
@@ -20,92 +29,368 @@ class ConversationDeliveryMixin(ConversationBase):
     ) -> int:
         """Marque des messages comme lus pour l'utilisateur (tous ou liste ciblée) et retourne le nombre mis à jour."""
         membership = await self._get_membership(conversation_id, user.id)
-        stmt = select(MessageDelivery).where(MessageDelivery.member_id == membership.id)
-        if message_ids:
-            stmt = stmt.where(MessageDelivery.message_id.in_(message_ids))
+        if self._receipts_watermark:
+            read = await self._mark_read_watermark(membership, message_ids)
+        else:
+            criteria = [MessageDelivery.member_id == membership.id]
+            if message_ids:
+                criteria.append(MessageDelivery.message_id.in_(message_ids))
+            read = len(await self._transition_to_read(*criteria))
+        await self._inbox_read(user.id, conversation_id, read)
+        self._track_unread([user.id], conversation_id, -read)
+        if read:
+            self._invalidate_overview([user.id])
+        return read
+
+    async def mark_all_read(self, user: UserAccount) -> dict[uuid.UUID, int]:
+        """Marque comme lus tous les messages des conversations actives ; retourne le nombre lu par conversation."""
+        counts: dict[uuid.UUID, int] = {}
+        if self._receipts_watermark:
+            # Un watermark par membre : seules les conversations avec des non lus sont avancées.
+            for conversation_id in await self._inbox_unread(user.id):
+                membership = await self._get_membership(conversation_id, user.id)
+                read = await self._mark_read_watermark(membership, None)
+                if read:
+                    counts[conversation_id] = read
         else:
-            stmt = stmt.where(MessageDelivery.state != MessageDeliveryState.READ)
+            rows = await self._transition_to_read(
+                ConversationMember.user_id == user.id,
+                ConversationMember.state == MembershipState.ACTIVE,
+            )
+            for row in rows:
+                counts[row.conversation_id] = counts.get(row.conversation_id, 0) + 1
+        await self._inbox_read_counts(user.id, counts)
+        self._reset_unread(user.id, counts)
+        if counts:
+            self._invalidate_overview([user.id])
+        return counts
+
+    async def _transition_to_read(self, *criteria) -> list:
+        """Passe en READ, en un seul UPDATE ... RETURNING, les livraisons non lues qui vérifient les critères.
+
+        Retourne (message_id, conversation_id, previous_state) pour chaque livraison modifiée.
+        """
+        now = datetime.now(timezone.utc)
+        pending = (
+            select(
+                MessageDelivery.id,
+                MessageDelivery.state.label("previous_state"),
+                ConversationMember.conversation_id,
+            )
+            .join(ConversationMember, ConversationMember.id == MessageDelivery.member_id)
+            .where(MessageDelivery.state != MessageDeliveryState.READ, *criteria)
+            .with_for_update(of=MessageDelivery)
+            .subquery()
+        )
+        stmt = (
+            update(MessageDelivery)
+            .where(MessageDelivery.id == pending.c.id)
+            .values(
+                state=MessageDeliveryState.READ,
+                read_at=now,
+                delivered_at=func.coalesce(MessageDelivery.delivered_at, now),
+            )
+            .returning(MessageDelivery.message_id, pending.c.conversation_id, pending.c.previous_state)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        rows = result.all()
+        await self._bump_delivery_counters([row.message_id for row in rows], read=1)
+        await self._bump_delivery_counters(
+            [row.message_id for row in rows if row.previous_state != MessageDeliveryState.DELIVERED],
+            delivered=1,
+        )
+        return rows
+
+    async def _mark_delivered(
+        self,
+        member: ConversationMember,
+        message_ids: list[uuid.UUID],
+        last_position: int,
+    ) -> int:
+        """Passe les livraisons QUEUED d'un membre à DELIVERED et retourne le nombre de messages concernés."""
+        if not message_ids:
+            return 0
+        if self._receipts_watermark:
+            delivered, _ = await self._advance_watermarks(member, delivered_to=last_position)
+            return delivered
+        stmt = (
+            update(MessageDelivery)
+            .where(
+                MessageDelivery.member_id == member.id,
+                MessageDelivery.message_id.in_(message_ids),
+                MessageDelivery.state == MessageDeliveryState.QUEUED,
+            )
+            .values(state=MessageDeliveryState.DELIVERED, delivered_at=datetime.now(timezone.utc))
+            .returning(MessageDelivery.message_id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        delivered_ids = list(result.scalars().all())
+        await self._bump_delivery_counters(delivered_ids, delivered=1)
+        return len(delivered_ids)
+
+    async def _mark_read_watermark(self, member: ConversationMember, message_ids: list[uuid.UUID] | None) -> int:
+        """Avance le watermark de lecture jusqu'au message ciblé le plus récent (ou au dernier message)."""
+        stmt = (
+            select(Message.id, Message.stream_position)
+            .where(Message.conversation_id == member.conversation_id)
+            .order_by(Message.stream_position.desc())
+            .limit(1)
+        )
+        if message_ids:
+            stmt = stmt.where(Message.id.in_(message_ids))
         result = await self.session.execute(stmt)
-        deliveries = result.scalars().all()
-        if not deliveries:
+        target = result.first()
+        if target is None:
             return 0
-        now = datetime.now(timezone.utc)
-        updated = 0
-        for delivery in deliveries:
-            delivery.state = MessageDeliveryState.READ
-            delivery.read_at = now
-            updated += 1
+        _, read = await self._advance_watermarks(
+            member,
+            read_to=int(target.stream_position),
+            last_read_message_id=target.id,
+        )
+        return read
+
+    async def _advance_watermarks(
+        self,
+        member: ConversationMember,
+        *,
+        delivered_to: int = 0,
+        read_to: int = 0,
+        last_read_message_id: uuid.UUID | None = None,
+    ) -> tuple[int, int]:
+        """Fait progresser les watermarks d'un membre et répercute l'écart sur les compteurs des messages.
+
+        Retourne le nombre de messages (d'autres auteurs) nouvellement livrés et nouvellement lus.
+        """
+        # Verrou sur la ligne membre : deux onglets qui lisent en parallèle ne comptent qu'une fois.
+        locked = await self.session.execute(
+            select(ConversationMember.delivered_position, ConversationMember.read_position)
+            .where(ConversationMember.id == member.id)
+            .with_for_update()
+        )
+        current = locked.one()
+        old_delivered, old_read = int(current.delivered_position), int(current.read_position)
+        new_read = max(old_read, read_to)
+        new_delivered = max(old_delivered, delivered_to, new_read)
+        if new_read == old_read and new_delivered == old_delivered:
+            return 0, 0
+
+        from_others = or_(Message.author_id.is_(None), Message.author_id != member.user_id)
+        newly_delivered = newly_read = 0
+        if new_read > old_read:
+            result = await self.session.execute(
+                update(Message)
+                .where(
+                    Message.conversation_id == member.conversation_id,
+                    Message.stream_position > old_read,
+                    Message.stream_position <= new_read,
+                    from_others,
+                )
+                .values(read_count=Message.read_count + 1)
+            )
+            newly_read = result.rowcount or 0
+        if new_delivered > old_delivered:
+            # delivered_position >= read_position : cet intervalle n'a jamais été compté comme livré.
+            result = await self.session.execute(
+                update(Message)
+                .where(
+                    Message.conversation_id == member.conversation_id,
+                    Message.stream_position > old_delivered,
+                    Message.stream_position <= new_delivered,
+                    from_others,
+                )
+                .values(delivered_count=Message.delivered_count + 1)
+            )
+            newly_delivered = result.rowcount or 0
+
+        member.delivered_position = new_delivered
+        member.read_position = new_read
+        if last_read_message_id and new_read > old_read:
+            member.last_read_message_id = last_read_message_id
         await self.session.flush()
-        return updated
+        return newly_delivered, newly_read
+
+    async def _initial_watermark(self, conversation_id: uuid.UUID) -> int:
+        """Position courante d'une conversation : un nouveau membre n'hérite pas de l'historique en non lu."""
+        stmt = select(Conversation.last_stream_position).where(Conversation.id == conversation_id)
+        result = await self.session.execute(stmt)
+        return int(result.scalar_one_or_none() or 0)
 
-    async def _mark_delivered(self, member: ConversationMember, messages: list[Message]) -> None:
-        """Passe les livraisons d'un membre à DELIVERED lorsque les messages sont déjà disponibles."""
-        if not messages:
+    async def _bump_delivery_counters(self, message_ids: list[uuid.UUID], *, delivered: int = 0, read: int = 0) -> None:
+        """Incrémente les compteurs dénormalisés des messages (un membre ne compte qu'une fois par message)."""
+        if not message_ids or not (delivered or read):
             return
-        now = datetime.now(timezone.utc)
-        updated = False
-        for message in messages:
-            for delivery in getattr(message, "deliveries", []) or []:
-                if delivery.member_id == member.id and delivery.state == MessageDeliveryState.QUEUED:
-                    delivery.state = MessageDeliveryState.DELIVERED
-                    delivery.delivered_at = now
-                    updated = True
-        if updated:
-            await self.session.flush()
-
-    def _summarize_reactions(self, message: Message, viewer: ConversationMember | None) -> list[dict]:
-        """Agrège les réactions par emoji et signale si le viewer a déjà réagi."""
-        reactions = getattr(message, "reactions", []) or []
-        summary: dict[str, dict] = {}
-        viewer_member_id = viewer.id if viewer else None
-        for reaction in reactions:
-            entry = summary.setdefault(
-                reaction.emoji,
-                {"emoji": reaction.emoji, "count": 0, "reacted": False},
-            )
-            entry["count"] += 1
-            if viewer_member_id and reaction.member_id == viewer_member_id:
-                entry["reacted"] = True
-        return list(summary.values())
-
-    def _match_delivery(self, message: Message, member_id: uuid.UUID) -> MessageDelivery | None:
-        """Trouve en memoire la livraison correspondant a un membre."""
-        for delivery in getattr(message, "deliveries", []) or []:
-            if delivery.member_id == member_id:
-                return delivery
-        return None
-
-    async def _fetch_delivery(self, message_id: uuid.UUID, member_id: uuid.UUID) -> MessageDelivery | None:
-        """Charge une livraison ciblee depuis la base (fallback si non prechargee)."""
+        values = {}
+        if delivered:
+            values["delivered_count"] = Message.delivered_count + delivered
+        if read:
+            values["read_count"] = Message.read_count + read
+        await self.session.execute(update(Message).where(Message.id.in_(message_ids)).values(**values))
+
+    async def _load_viewer_deliveries(
+        self,
+        messages: list[Message],
+        viewer_membership: ConversationMember | None,
+    ) -> dict[uuid.UUID, MessageDelivery | DerivedDelivery]:
+        """Charge en une requête les livraisons du viewer (ou les dérive de ses watermarks)."""
+        if not messages or viewer_membership is None:
+            return {}
+        if self._receipts_watermark:
+            return {
+                message.id: delivery
+                for message in messages
+                if (delivery := self._watermark_delivery(message, viewer_membership)) is not None
+            }
         stmt = select(MessageDelivery).where(
-            MessageDelivery.message_id == message_id,
-            MessageDelivery.member_id == member_id,
+            MessageDelivery.member_id == viewer_membership.id,
+            MessageDelivery.message_id.in_([message.id for message in messages]),
         )
         result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+        return {delivery.message_id: delivery for delivery in result.scalars().all()}
+
+    @staticmethod
+    def _watermark_delivery(message: Message, member: ConversationMember) -> DerivedDelivery | None:
+        """Déduit l'état du message pour le membre à partir de ses positions livré/lu."""
+        joined_at = member.joined_at
+        if joined_at and message.created_at and message.created_at < joined_at:
+            # Message antérieur à l'arrivée du membre : il n'en était pas destinataire.
+            return None
+        position = message.stream_position or 0
+        if position <= (member.read_position or 0):
+            return DerivedDelivery(MessageDeliveryState.READ)
+        if position <= (member.delivered_position or 0):
+            return DerivedDelivery(MessageDeliveryState.DELIVERED)
+        return DerivedDelivery(MessageDeliveryState.QUEUED)
+
+    def _delivery_summary(
+        self,
+        message: Message,
+        viewer_membership: ConversationMember | None,
+        viewer_delivery: MessageDelivery | DerivedDelivery | None,
+    ) -> dict:
+        """Calcule le résumé de livraison (hors viewer) à partir des compteurs du message."""
+        total = int(message.recipient_count or 0)
+        delivered = int(message.delivered_count or 0)
+        read = int(message.read_count or 0)
+        viewer_is_author = bool(
+            viewer_membership and message.author_id and viewer_membership.user_id == message.author_id
+        )
+        if message.author_id and not viewer_is_author:
+            # Les compteurs excluent l'auteur, dont la livraison est lue dès l'envoi.
+            total += 1
+            delivered += 1
+            read += 1
+            if viewer_delivery is not None:
+                total -= 1
+                if viewer_delivery.state in (MessageDeliveryState.DELIVERED, MessageDeliveryState.READ):
+                    delivered -= 1
+                if viewer_delivery.state == MessageDeliveryState.READ:
+                    read -= 1
+        return {"total": total, "delivered": delivered, "read": read, "pending": max(total - delivered, 0)}
 
     async def get_unread_summary(self, user: UserAccount) -> dict:
         """Calcule le nombre total de messages non lus et la repartition par conversation."""
-        stmt = (
-            select(
+        unread = await self.unread_counts(user.id)
+        conversations = [
+            {"conversation_id": conversation_id, "unread": count} for conversation_id, count in unread.items()
+        ]
+        return {"total": int(sum(unread.values())), "conversations": conversations}
+
+    async def unread_counts(self, user_id: uuid.UUID) -> dict[uuid.UUID, int]:
+        """Non lus par conversation active : compteurs Redis, sinon projection user_inbox et remplissage."""
+        if self.unread_counters:
+            cached = await self.unread_counters.get(user_id)
+            if cached is not None:
+                return cached
+        counts = await self._inbox_unread(user_id)
+        if self.unread_counters:
+            await self.unread_counters.fill(user_id, counts)
+        return counts
+
+    def _track_unread(self, user_ids: list[uuid.UUID], conversation_id: uuid.UUID, delta: int) -> None:
+        """Après commit : ajuste les compteurs et pousse le delta de badge sur le canal de chaque utilisateur."""
+        if not user_ids or not delta or not (self.unread_counters or self.realtime):
+            return
+        counters, realtime = self.unread_counters, self.realtime
+        targets = [str(user_id) for user_id in user_ids]
+        event = {"event": "unread", "conversation_id": str(conversation_id), "delta": delta}
+
+        async def apply() -> None:
+            values = await counters.adjust(targets, conversation_id, delta) if counters else {}
+            if not realtime:
+                return
+            if len(targets) == 1:
+                # Lecteur unique : la valeur absolue permet au client de se recaler.
+                single = dict(event)
+                if targets[0] in values:
+                    single["unread"] = values[targets[0]]
+                await realtime.publish_user_event(targets[0], single)
+            else:
+                await realtime.publish_user_events(targets, event)
+
+        self.after_commit(apply)
+
+    def _reset_unread(self, user_id: uuid.UUID, counts: dict[uuid.UUID, int]) -> None:
+        """Après un marquage global : remet à zéro les conversations lues et notifie le client."""
+        if not counts or not (self.unread_counters or self.realtime):
+            return
+        counters, realtime = self.unread_counters, self.realtime
+
+        async def apply() -> None:
+            if counters:
+                await counters.reset(user_id, list(counts))
+            if realtime:
+                for conversation_id, read in counts.items():
+                    await realtime.publish_user_event(
+                        str(user_id),
+                        {"event": "unread", "conversation_id": str(conversation_id), "delta": -read, "unread": 0},
+                    )
+
+        self.after_commit(apply)
+
+    def _invalidate_unread(self, user_ids: list[uuid.UUID]) -> None:
+        """Après un changement d'appartenance : compteurs et overview des utilisateurs seront recalculés."""
+        self._invalidate_overview(user_ids)
+        if not user_ids or not self.unread_counters:
+            return
+        counters = self.unread_counters
+        targets = [str(user_id) for user_id in user_ids]
+        self.after_commit(lambda: counters.invalidate(targets))
+
+    async def count_unread(
+        self,
+        user_id: uuid.UUID,
+        conversation_ids: list[uuid.UUID] | None = None,
+    ) -> dict[uuid.UUID, int]:
+        """Compte les non lus par conversation active (livraisons non lues ou messages au-delà du watermark)."""
+        if self._receipts_watermark:
+            stmt = (
+                select(
+                    ConversationMember.conversation_id.label("conversation_id"),
+                    func.count(Message.id).label("unread"),
+                )
+                .join(
+                    Message,
+                    (Message.conversation_id == ConversationMember.conversation_id)
+                    & (Message.stream_position > ConversationMember.read_position),
+                )
+                .where(or_(Message.author_id.is_(None), Message.author_id != user_id))
+            )
+        else:
+            stmt = select(
                 ConversationMember.conversation_id.label("conversation_id"),
                 func.count(MessageDelivery.id).label("unread"),
-            )
-            .join(
+            ).join(
                 MessageDelivery,
                 (MessageDelivery.member_id == ConversationMember.id)
                 & (MessageDelivery.state != MessageDeliveryState.READ),
             )
-            .where(
-                ConversationMember.user_id == user.id,
-                ConversationMember.state == MembershipState.ACTIVE,
-            )
-            .group_by(ConversationMember.conversation_id)
-        )
+        stmt = stmt.where(
+            ConversationMember.user_id == user_id,
+            ConversationMember.state == MembershipState.ACTIVE,
+        ).group_by(ConversationMember.conversation_id)
+        if conversation_ids is not None:
+            stmt = stmt.where(ConversationMember.conversation_id.in_(conversation_ids))
         result = await self.session.execute(stmt)
-        entries = result.all()
-        total = int(sum(row.unread for row in entries))
-        conversations = [
-            {"conversation_id": row.conversation_id, "unread": int(row.unread)} for row in entries
-        ]
-        return {"total": total, "conversations": conversations}
+        return {row.conversation_id: int(row.unread) for row in result.all()}
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import Conversation, ConversationMember, Message, UserAccount, UserInbox
+from .conversation_base import ConversationBase
+
+PREVIEW_LENGTH = 160
+
+
+class ConversationInboxMixin(ConversationBase):
+    """Projection user_inbox : une lecture indexée par utilisateur pour la liste et l'overview.
+
+    Les lignes sont écrites dans la transaction des chemins message, appartenance et lecture :
+    la projection ne diverge pas de la base. Les aperçus ne sont stockés en clair que si le
+    chiffrement est désactivé ; sinon ils sont déchiffrés à la lecture, pour la seule page servie.
+    """
+
+    def _inbox_preview(self, content: str | None) -> str | None:
+        if self._encryption_enabled or not content:
+            return None
+        return " ".join(content.split())[:PREVIEW_LENGTH] or None
+
+    async def list_inbox(
+        self,
+        user: UserAccount,
+        *,
+        limit: int | None = None,
+        before: tuple[datetime, uuid.UUID] | None = None,
+    ) -> list[dict]:
+        """Conversations actives de l'utilisateur, de la plus récente à la plus ancienne (keyset `before`)."""
+        stmt = (
+            select(UserInbox, Conversation)
+            .join(Conversation, Conversation.id == UserInbox.conversation_id)
+            .where(UserInbox.user_id == user.id)
+            .order_by(UserInbox.last_activity_at.desc(), UserInbox.conversation_id.desc())
+        )
+        if before is not None:
+            stmt = stmt.where(
+                tuple_(UserInbox.last_activity_at, UserInbox.conversation_id) < tuple_(literal(before[0]), literal(before[1]))
+            )
+        if limit is not None:
+            stmt = stmt.limit(max(1, limit))
+        result = await self.session.execute(stmt)
+        rows = result.all()
+        previews = await self._resolve_inbox_previews([row.UserInbox for row in rows])
+        return [
+            {
+                "conversation": row.Conversation,
+                "last_activity_at": row.UserInbox.last_activity_at,
+                "last_message_id": row.UserInbox.last_message_id,
+                "last_message_preview": previews.get(row.UserInbox.conversation_id),
+                "unread_count": int(row.UserInbox.unread_count or 0),
+                "muted_until": row.UserInbox.muted_until,
+                "archived": bool(row.UserInbox.archived),
+            }
+            for row in rows
+        ]
+
+    async def inbox_totals(self, user_id: uuid.UUID) -> tuple[int, int]:
+        """Nombre de conversations actives et total des non lus, agrégés sur l'index de l'utilisateur."""
+        stmt = select(func.count(), func.coalesce(func.sum(UserInbox.unread_count), 0)).where(
+            UserInbox.user_id == user_id
+        )
+        result = await self.session.execute(stmt)
+        count, unread = result.one()
+        return int(count), int(unread)
+
+    async def _inbox_unread(self, user_id: uuid.UUID) -> dict[uuid.UUID, int]:
+        stmt = select(UserInbox.conversation_id, UserInbox.unread_count).where(
+            UserInbox.user_id == user_id,
+            UserInbox.unread_count > 0,
+        )
+        result = await self.session.execute(stmt)
+        return {row.conversation_id: int(row.unread_count) for row in result.all()}
+
+    async def _resolve_inbox_previews(self, entries: list[UserInbox]) -> dict[uuid.UUID, str | None]:
+        """Aperçus stockés, ou déchiffrés en un lot depuis les derniers messages de la page."""
+        previews = {entry.conversation_id: entry.last_message_preview for entry in entries}
+        missing = [entry.last_message_id for entry in entries if not entry.last_message_preview and entry.last_message_id]
+        if not missing:
+            return previews
+        result = await self.session.execute(
+            select(Message).where(Message.id.in_(missing), Message.deleted_at.is_(None))
+        )
+        messages = list(result.scalars().all())
+        await self._prime_data_keys(messages)
+        plaintexts = await self._decrypt_messages(messages)
+        for message in messages:
+            text = " ".join((plaintexts.get(message.id) or "").split())
+            previews[message.conversation_id] = text[:PREVIEW_LENGTH] or None
+        return previews
+
+    async def _inbox_add(
+        self,
+        conversation_id: uuid.UUID,
+        members: list[ConversationMember],
+        *,
+        unread: dict[uuid.UUID, int] | None = None,
+    ) -> None:
+        """Crée (ou réactive) les lignes des membres, calées sur le dernier message de la conversation."""
+        if not members:
+            return
+        conversation = await self.session.get(Conversation, conversation_id)
+        result = await self.session.execute(
+            select(Message.id, Message.author_id, Message.created_at)
+            .where(Message.conversation_id == conversation_id, Message.deleted_at.is_(None))
+            .order_by(Message.stream_position.desc())
+            .limit(1)
+        )
+        last = result.first()
+        values = {
+            "last_activity_at": last.created_at if last else conversation.created_at,
+            "last_message_id": last.id if last else None,
+            "last_message_author_id": last.author_id if last else None,
+            "last_message_preview": None,
+            "archived": bool(self._get_metadata(conversation).get("archived")),
+        }
+        unread = unread or {}
+        stmt = pg_insert(UserInbox).values(
+            [
+                {
+                    "user_id": member.user_id,
+                    "conversation_id": conversation_id,
+                    "unread_count": unread.get(member.user_id, 0),
+                    "muted_until": member.muted_until,
+                    **values,
+                }
+                for member in members
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserInbox.user_id, UserInbox.conversation_id],
+            set_={
+                **{name: stmt.excluded[name] for name in values},
+                "unread_count": stmt.excluded.unread_count,
+                "muted_until": stmt.excluded.muted_until,
+            },
+        )
+        await self.session.execute(stmt)
+
+    async def _inbox_remove(self, conversation_id: uuid.UUID, user_ids: list[uuid.UUID]) -> None:
+        if user_ids:
+            await self.session.execute(
+                delete(UserInbox).where(
+                    UserInbox.conversation_id == conversation_id,
+                    UserInbox.user_id.in_(user_ids),
+                )
+            )
+
+    async def _inbox_update(
+        self,
+        conversation_id: uuid.UUID,
+        user_id: uuid.UUID | None = None,
+        **values,
+    ) -> None:
+        """Recopie un attribut (mute, archivage) sur la ligne d'un membre ou de toute la conversation."""
+        stmt = update(UserInbox).where(UserInbox.conversation_id == conversation_id)
+        if user_id is not None:
+            stmt = stmt.where(UserInbox.user_id == user_id)
+        await self.session.execute(stmt.values(**values).execution_options(synchronize_session=False))
+
+    async def _inbox_message_posted(self, message: Message, content: str, *, created_at: datetime) -> None:
+        """Un UPDATE par envoi : activité, aperçu et +1 non lu pour chaque membre sauf l'auteur."""
+        await self.session.execute(
+            update(UserInbox)
+            .where(UserInbox.conversation_id == message.conversation_id)
+            .values(
+                last_activity_at=created_at,
+                last_message_id=message.id,
+                last_message_author_id=message.author_id,
+                last_message_preview=self._inbox_preview(content),
+                unread_count=UserInbox.unread_count
+                + case((UserInbox.user_id == message.author_id, 0), else_=1),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _inbox_message_changed(self, message: Message, content: str | None) -> None:
+        """Édition ou suppression (content=None) du dernier message : l'aperçu suit."""
+        await self.session.execute(
+            update(UserInbox)
+            .where(
+                UserInbox.conversation_id == message.conversation_id,
+                UserInbox.last_message_id == message.id,
+            )
+            .values(last_message_preview=self._inbox_preview(content))
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _inbox_read(self, user_id: uuid.UUID, conversation_id: uuid.UUID, read: int) -> None:
+        """Décrémente les non lus d'une conversation du nombre de messages passés en lu."""
+        await self._inbox_read_counts(user_id, {conversation_id: read})
+
+    async def _inbox_read_counts(self, user_id: uuid.UUID, counts: dict[uuid.UUID, int]) -> None:
+        """Décrémente en un seul UPDATE les non lus de chaque conversation du nombre lu.
+
+        Jamais de remise à zéro : un message validé entre le passage en lu et cet UPDATE reste compté.
+        """
+        counts = {conversation_id: read for conversation_id, read in counts.items() if read > 0}
+        if not counts:
+            return
+        if len(counts) == 1:
+            decrement = next(iter(counts.values()))
+        else:
+            decrement = case(counts, value=UserInbox.conversation_id, else_=0)
+        stmt = (
+            update(UserInbox)
+            .where(
+                UserInbox.user_id == user_id,
+                UserInbox.conversation_id.in_(list(counts)),
+                UserInbox.unread_count > 0,
+            )
+            .values(unread_count=func.greatest(UserInbox.unread_count - decrement, 0))
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
@@ -125,6 +125,10 @@ class ConversationInvitesMixin(ConversationBase):
                 role=invite.role,
                 state=MembershipState.ACTIVE,
             )
+            if self._receipts_watermark:
+                position = await self._initial_watermark(conv_id)
+                membership.delivered_position = position
+                membership.read_position = position
             self.session.add(membership)
         else:
             membership.state = MembershipState.ACTIVE
@@ -134,6 +138,9 @@ class ConversationInvitesMixin(ConversationBase):
 
         invite.accepted_at = now
         await self.session.flush()
+        unread = await self.count_unread(user.id, [conv_id])
+        await self._inbox_add(conv_id, [membership], unread={user.id: unread.get(conv_id, 0)})
+        self._invalidate_unread([user.id])
         await self._log(
             user,
             "conversation.invite.accept",
@@ -141,4 +148,4 @@ class ConversationInvitesMixin(ConversationBase):
             metadata={"invite_id": str(invite.id)},
         )
 
-        return await self._load_conversation_with_members(conv_id)
+        return conversation
@@ -4,7 +4,8 @@ import uuid
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import case, func, literal, select, tuple_
+from sqlalchemy.orm import selectinload
 
 from app.models import (
     Conversation,
@@ -14,29 +15,111 @@ from app.models import (
     MembershipState,
     UserAccount,
 )
+from ...config import settings
 from .conversation_base import ConversationBase
 
 
 class ConversationMembersMixin(ConversationBase):
     """CRUD conversations, membres et rôles."""
 
-    async def list_conversations(self, user: UserAccount) -> list[Conversation]:
-        """Liste les conversations actives du user avec préchargement des membres/profils."""
-        from sqlalchemy.orm import selectinload
+    async def list_conversations(
+        self,
+        user: UserAccount,
+        *,
+        limit: int = 50,
+        before: tuple[datetime, uuid.UUID] | None = None,
+    ) -> tuple[list[dict], bool]:
+        """Page de conversations (activité décroissante, keyset) avec nombre et aperçu des membres.
 
-        stmt = (
-            select(Conversation)
-            .join(ConversationMember, ConversationMember.conversation_id == Conversation.id)
+        Retourne les entrées user_inbox enrichies de `member_count` et `members` (au plus
+        CONVERSATION_MEMBER_PREVIEW_SIZE membres) et un indicateur de page suivante.
+        """
+        entries = await self.list_inbox(user, limit=limit + 1, before=before)
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        previews = await self.member_previews([entry["conversation"].id for entry in entries])
+        for entry in entries:
+            entry["member_count"], entry["members"] = previews.get(entry["conversation"].id, (0, []))
+        return entries, has_more
+
+    async def member_previews(
+        self,
+        conversation_ids: list[uuid.UUID],
+        *,
+        size: int | None = None,
+    ) -> dict[uuid.UUID, tuple[int, list[ConversationMember]]]:
+        """Nombre de membres actifs et les `size` premiers (owners puis ancienneté) par conversation."""
+        if not conversation_ids:
+            return {}
+        size = settings.CONVERSATION_MEMBER_PREVIEW_SIZE if size is None else size
+        counts_stmt = (
+            select(ConversationMember.conversation_id, func.count())
             .where(
-                ConversationMember.user_id == user.id,
+                ConversationMember.conversation_id.in_(conversation_ids),
                 ConversationMember.state == MembershipState.ACTIVE,
             )
-            .options(
-                selectinload(Conversation.members).selectinload(ConversationMember.user).selectinload(UserAccount.profile)
+            .group_by(ConversationMember.conversation_id)
+        )
+        counts = {row[0]: int(row[1]) for row in (await self.session.execute(counts_stmt)).all()}
+
+        members: dict[uuid.UUID, list[ConversationMember]] = {conversation_id: [] for conversation_id in conversation_ids}
+        if size > 0:
+            rank = func.row_number().over(
+                partition_by=ConversationMember.conversation_id,
+                order_by=(
+                    case((ConversationMember.role == ConversationMemberRole.OWNER, 0), else_=1),
+                    ConversationMember.joined_at,
+                    ConversationMember.user_id,
+                ),
+            )
+            ranked = (
+                select(ConversationMember.id, rank.label("rank"))
+                .where(
+                    ConversationMember.conversation_id.in_(conversation_ids),
+                    ConversationMember.state == MembershipState.ACTIVE,
+                )
+                .subquery()
+            )
+            stmt = (
+                select(ConversationMember)
+                .join(ranked, ranked.c.id == ConversationMember.id)
+                .where(ranked.c.rank <= size)
+                .order_by(ConversationMember.conversation_id, ranked.c.rank)
+                .options(selectinload(ConversationMember.user).selectinload(UserAccount.profile))
             )
+            for member in (await self.session.execute(stmt)).scalars().all():
+                members[member.conversation_id].append(member)
+        return {
+            conversation_id: (counts.get(conversation_id, 0), members[conversation_id])
+            for conversation_id in conversation_ids
+        }
+
+    async def list_members(
+        self,
+        conversation_id: uuid.UUID,
+        user: UserAccount,
+        *,
+        limit: int = 100,
+        after: tuple[datetime, uuid.UUID] | None = None,
+        state: MembershipState | None = None,
+    ) -> tuple[list[ConversationMember], bool]:
+        """Page du roster complet (keyset sur joined_at, user_id) pour un membre actif."""
+        await self._get_membership(conversation_id, user.id)
+        stmt = (
+            select(ConversationMember)
+            .where(ConversationMember.conversation_id == conversation_id)
+            .order_by(ConversationMember.joined_at, ConversationMember.user_id)
+            .limit(limit + 1)
+            .options(selectinload(ConversationMember.user).selectinload(UserAccount.profile))
         )
-        result = await self.session.execute(stmt)
-        return result.scalars().unique().all()
+        if state is not None:
+            stmt = stmt.where(ConversationMember.state == state)
+        if after is not None:
+            stmt = stmt.where(
+                tuple_(ConversationMember.joined_at, ConversationMember.user_id) > tuple_(literal(after[0]), literal(after[1]))
+            )
+        members = list((await self.session.execute(stmt)).scalars().all())
+        return members[:limit], len(members) > limit
 
     async def create_conversation(
         self,
@@ -86,6 +169,8 @@ class ConversationMembersMixin(ConversationBase):
 
         self.session.add(conversation)
         await self.session.flush()
+        await self._inbox_add(conversation.id, list(conversation.members))
+        self._invalidate_overview([member.user_id for member in conversation.members])
         await self._log(owner, "conversation.create", resource_id=str(conversation.id))
         return conversation
 
@@ -99,15 +184,9 @@ class ConversationMembersMixin(ConversationBase):
         archived: bool | None = None,
     ) -> Conversation:
         """Met à jour titre/sujet/archivage après vérification que l'acteur est owner."""
-        from sqlalchemy.orm import selectinload
-
         membership = await self._get_membership(conversation_id, actor.id)
         self._require_owner(membership)
-        conversation = await self.session.get(
-            Conversation,
-            conversation_id,
-            options=(selectinload(Conversation.members),),
-        )
+        conversation = await self.session.get(Conversation, conversation_id)
         if conversation is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
 
@@ -129,6 +208,7 @@ class ConversationMembersMixin(ConversationBase):
             if bool(metadata.get("archived")) != bool(archived):
                 metadata["archived"] = bool(archived)
                 conversation.extra_metadata = metadata
+                await self._inbox_update(conversation_id, archived=bool(archived))
                 changed = True
         if changed:
             await self.session.flush()
@@ -138,7 +218,7 @@ class ConversationMembersMixin(ConversationBase):
                 resource_id=str(conversation_id),
                 metadata={"title": normalized_title, "topic": normalized_topic, "archived": archived},
             )
-        return await self._load_conversation_with_members(conversation_id)
+        return conversation
 
     async def leave_conversation(self, conversation_id: uuid.UUID, user: UserAccount) -> None:
         """Permet à un membre de quitter; transfère éventuellement le rôle owner si nécessaire."""
@@ -158,6 +238,8 @@ class ConversationMembersMixin(ConversationBase):
         membership.state = MembershipState.LEFT
         membership.muted_until = None
         await self.session.flush()
+        await self._inbox_remove(conversation_id, [user.id])
+        self._invalidate_unread([user.id])
         await self._log(user, "conversation.leave", resource_id=str(conversation_id))
 
     async def delete_conversation(self, conversation_id: uuid.UUID, *, actor: UserAccount) -> None:
@@ -167,6 +249,10 @@ class ConversationMembersMixin(ConversationBase):
         conversation = await self.session.get(Conversation, conversation_id)
         if conversation is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+        member_ids = await self.session.execute(
+            select(ConversationMember.user_id).where(ConversationMember.conversation_id == conversation_id)
+        )
+        self._invalidate_unread(list(member_ids.scalars().all()))
         await self.session.delete(conversation)
         await self.session.flush()
         await self._log(actor, "conversation.delete", resource_id=str(conversation_id))
@@ -208,11 +294,18 @@ class ConversationMembersMixin(ConversationBase):
             target.state = state
             if state == MembershipState.ACTIVE and target.joined_at is None:
                 target.joined_at = datetime.now(timezone.utc)
+            if state == MembershipState.ACTIVE:
+                unread = await self.count_unread(target.user_id, [conversation_id])
+                await self._inbox_add(conversation_id, [target], unread={target.user_id: unread.get(conversation_id, 0)})
+            else:
+                await self._inbox_remove(conversation_id, [target.user_id])
+            self._invalidate_unread([target.user_id])
             changed = True
 
         if muted_until is not None or target.muted_until is not None:
             if target.muted_until != muted_until:
                 target.muted_until = muted_until
+                await self._inbox_update(conversation_id, target.user_id, muted_until=muted_until)
                 changed = True
 
         if changed:
@@ -4,8 +4,7 @@ import uuid
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, status
-from sqlalchemy import func, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import insert, select, update
 
 from app.models import (
     Conversation,
@@ -24,10 +23,11 @@ from app.models import (
 )
 from ..attachment_service import AttachmentDescriptor
 from .conversation_base import ConversationBase
+from .conversation_delivery import DerivedDelivery
 
 
 class ConversationMessagesMixin(ConversationBase):
-    """Messages : list/search/post/edit/delete + livraisons initiales."""
+    """Messages : list/post/edit/delete + livraisons initiales."""
 
     async def list_messages(
         self,
@@ -54,21 +54,6 @@ class ConversationMessagesMixin(ConversationBase):
         stmt = (
             stmt.order_by(order_clause)
             .limit(query_limit)
-            .options(
-                selectinload(Message.author).selectinload(UserAccount.profile),
-                selectinload(Message.deliveries),
-                selectinload(Message.reactions),
-                selectinload(Message.pins),
-                selectinload(Message.attachments),
-                selectinload(Message.reply_to)
-                .selectinload(Message.author)
-                .selectinload(UserAccount.profile),
-                selectinload(Message.reply_to).selectinload(Message.attachments),
-                selectinload(Message.forwarded_from)
-                .selectinload(Message.author)
-                .selectinload(UserAccount.profile),
-                selectinload(Message.forwarded_from).selectinload(Message.attachments),
-            )
         )
         result = await self.session.execute(stmt)
         rows = result.scalars().all()
@@ -77,65 +62,17 @@ class ConversationMessagesMixin(ConversationBase):
             rows = rows[:-1]
         items = list(reversed(rows)) if order_desc else rows
 
-        if member:
-            await self._mark_delivered(member, items)
+        if member and items:
+            await self._mark_delivered(member, [message.id for message in items], items[-1].stream_position)
 
         meta = {
             "next_before": items[0].stream_position if items else before,
             "next_after": items[-1].stream_position if items else after,
-            "has_more_before": has_more if order_desc else bool(before),
-            "has_more_after": has_more if not order_desc else bool(after),
+            "has_more_before": has_more if order_desc else bool(after),
+            "has_more_after": has_more if not order_desc else bool(before),
         }
         return items, meta
 
-    async def search_messages(
-        self,
-        conversation_id: uuid.UUID,
-        *,
-        user: UserAccount,
-        query: str,
-        limit: int = 50,
-    ) -> list[dict]:
-        """Recherche plein texte (tsvector simple) dans une conversation pour l'utilisateur connecte."""
-        term = (query or "").strip()
-        if not term:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Un terme de recherche est requis.")
-        membership = await self._get_membership(conversation_id, user.id)
-        ts_query = func.plainto_tsquery("simple", term)
-        text_vector = func.to_tsvector(
-            "simple",
-            func.coalesce(Message.search_text, ""),
-        )
-        stmt = (
-            select(Message)
-            .where(Message.conversation_id == conversation_id)
-            .where(Message.deleted_at.is_(None))
-            .where(text_vector.op("@@")(ts_query))
-            .order_by(Message.created_at.desc())
-            .limit(max(1, min(limit, 200)))
-            .options(
-                selectinload(Message.author).selectinload(UserAccount.profile),
-                selectinload(Message.deliveries),
-                selectinload(Message.reactions),
-                selectinload(Message.pins),
-                selectinload(Message.attachments),
-                selectinload(Message.reply_to)
-                .selectinload(Message.author)
-                .selectinload(UserAccount.profile),
-                selectinload(Message.reply_to).selectinload(Message.attachments),
-                selectinload(Message.forwarded_from)
-                .selectinload(Message.author)
-                .selectinload(UserAccount.profile),
-                selectinload(Message.forwarded_from).selectinload(Message.attachments),
-            )
-        )
-        result = await self.session.execute(stmt)
-        rows = result.scalars().all()
-        payloads: list[dict] = []
-        for message in rows:
-            payloads.append(await self.serialize_message(message, viewer_membership=membership))
-        return payloads
-
     async def post_message(
         self,
         conversation_id: uuid.UUID,
@@ -146,14 +83,15 @@ class ConversationMessagesMixin(ConversationBase):
         reply_to_id: uuid.UUID | None = None,
         forward_message_id: uuid.UUID | None = None,
     ) -> tuple[Message, dict]:
-        """Crée un message, attache les PJ décodées, vérifie les blocages et diffuse notifications."""
-        membership = await self._get_membership(conversation_id, author.id)
-        conversation = await self.session.get(Conversation, conversation_id)
-        if conversation is None:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation non trouvée.")
+        """Crée un message, attache les PJ décodées, vérifie les blocages et diffuse notifications.
+
+        Chemin d'envoi à faible nombre d'allers-retours : appartenance + conversation jointes,
+        références chargées ensemble, un seul flush (message + PJ), livraisons en INSERT multi-lignes
+        et payload construit depuis les objets en mémoire (pas de rechargement).
+        """
+        membership, conversation = await self._get_membership_with_conversation(conversation_id, author.id)
         if self._get_metadata(conversation).get("archived"):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Conversation est archivée")
-        block_states = {}
         if conversation.type == ConversationType.DIRECT:
             block_states = await self.get_block_states(author, [conversation])
             state = block_states.get(conversation.id, {})
@@ -183,37 +121,14 @@ class ConversationMessagesMixin(ConversationBase):
                     user_id=author.id,
                 )
                 attachment_descriptors.append(descriptor)
-        reply_to_message = None
-        if reply_to_id:
-            reply_to_message = await self._load_message(reply_to_id)
-            self._ensure_message_in_conversation(reply_to_message, conversation_id)
-        forward_source = None
-        if forward_message_id:
-            forward_source = await self._load_message(forward_message_id)
-            self._ensure_message_in_conversation(forward_source, conversation_id)
-
-        pos_stmt = select(func.coalesce(func.max(Message.stream_position), 0) + 1).where(Message.conversation_id == conversation_id)
-        pos_result = await self.session.execute(pos_stmt)
-        next_position = pos_result.scalar_one()
-
-        ciphertext, encryption_scheme, encryption_metadata = self._encrypt_content(
-            conversation_id=conversation_id, content=content
-        )
-
-        message = Message(
-            conversation_id=conversation_id,
-            author_id=author.id,
-            type=message_type,
-            stream_position=next_position,
-            ciphertext=ciphertext,
-            encryption_scheme=encryption_scheme,
-            encryption_metadata=encryption_metadata,
-            search_text=content,
-            reply_to_message_id=reply_to_message.id if reply_to_message else None,
-            forward_from_message_id=forward_source.id if forward_source else None,
-        )
-        self.session.add(message)
-        await self.session.flush()
+        references = await self._load_references({ref_id for ref_id in (reply_to_id, forward_message_id) if ref_id})
+        for ref_id in (reply_to_id, forward_message_id):
+            if ref_id is None:
+                continue
+            reference = references.get(ref_id)
+            if reference is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message introuvable.")
+            self._ensure_message_in_conversation(reference, conversation_id)
 
         now = datetime.now(timezone.utc)
         delivery_members_stmt = (
@@ -227,8 +142,6 @@ class ConversationMessagesMixin(ConversationBase):
         )
         result_members = await self.session.execute(delivery_members_stmt)
         members_info = result_members.all()
-        member_ids = [row.id for row in members_info]
-        member_user_ids = [row.user_id for row in members_info]
         notify_candidates = []
         for row in members_info:
             if row.user_id == author.id:
@@ -238,51 +151,102 @@ class ConversationMessagesMixin(ConversationBase):
             if row.muted_until and row.muted_until > now:
                 continue
             notify_candidates.append(row.user_id)
-        deliveries: list[MessageDelivery] = []
-        for member_id in member_ids:
-            if member_id == membership.id:
-                deliveries.append(
-                    MessageDelivery(
-                        message_id=message.id,
-                        member_id=member_id,
-                        state=MessageDeliveryState.READ,
-                        delivered_at=now,
-                        read_at=now,
-                    )
-                )
-            else:
-                deliveries.append(
-                    MessageDelivery(
-                        message_id=message.id,
-                        member_id=member_id,
-                        state=MessageDeliveryState.QUEUED,
-                        delivered_at=None,
-                    )
-                )
-        self.session.add_all(deliveries)
+
+        next_position = (await self.reserve_stream_positions(conversation_id))[0]
+        ciphertext, encryption_scheme, encryption_metadata = self._encrypt_content(
+            conversation_id=conversation_id,
+            content=content,
+            data_key=await self._current_data_key(conversation_id),
+        )
+        message = Message(
+            id=uuid.uuid4(),
+            conversation_id=conversation_id,
+            author_id=author.id,
+            type=message_type,
+            stream_position=next_position,
+            ciphertext=ciphertext,
+            encryption_scheme=encryption_scheme,
+            encryption_metadata=encryption_metadata,
+            **self._search_fields(content),
+            reply_to_message_id=reply_to_id,
+            forward_from_message_id=forward_message_id,
+            recipient_count=len(members_info) - 1,
+        )
+        attachments = self._build_attachments(message, attachment_descriptors)
+        self.session.add(message)
+        self.session.add_all(attachments)
         await self.session.flush()
-        await self._persist_attachments(message, attachment_descriptors)
-        hydrated = await self._load_message(message.id)
+        await self._inbox_message_posted(message, content, created_at=message.created_at or now)
 
-        payload = await self.serialize_message(hydrated, viewer_membership=membership)
+        if self._receipts_watermark:
+            # Pas de ligne par membre : l'auteur avance ses watermarks, les autres lisent via leurs positions.
+            await self._advance_watermarks(membership, read_to=next_position, last_read_message_id=message.id)
+            author_delivery = DerivedDelivery(MessageDeliveryState.READ)
+        else:
+            await self.session.execute(
+                insert(MessageDelivery),
+                [
+                    {
+                        "message_id": message.id,
+                        "member_id": row.id,
+                        "state": MessageDeliveryState.READ if row.id == membership.id else MessageDeliveryState.QUEUED,
+                        "delivered_at": now if row.id == membership.id else None,
+                        "read_at": now if row.id == membership.id else None,
+                    }
+                    for row in members_info
+                ],
+            )
+            author_delivery = DerivedDelivery(MessageDeliveryState.READ, delivered_at=now, read_at=now)
+
+        payload = await self._serialize_new_message(
+            message,
+            author=author,
+            membership=membership,
+            attachments=attachments,
+            references=references,
+            author_delivery=author_delivery,
+        )
 
         await self._log(author, "conversation.message", resource_id=str(message.id), metadata={"conversation": str(conversation_id)})
+        self._cache_message_payload(conversation_id, payload, new=True)
+        self._track_unread(
+            [row.user_id for row in members_info if row.user_id != author.id and row.state == MembershipState.ACTIVE],
+            conversation_id,
+            1,
+        )
+        self._invalidate_overview([row.user_id for row in members_info if row.state == MembershipState.ACTIVE])
         if self.realtime:
-            await self.realtime.publish_conversation(
-                str(conversation_id),
-                {
-                    "event": "message",
-                    **payload,
-                },
-            )
-            await self._push_message_notifications(
-                conversation_id=str(conversation_id),
-                payload=payload,
-                author_id=str(author.id),
-                member_user_ids=notify_candidates,
-                now=now,
-            )
-        return hydrated, payload
+            realtime = self.realtime
+            event = {"event": "message", **payload}
+            self.after_commit(lambda: realtime.publish_conversation(str(conversation_id), event))
+        self._enqueue_message_push(
+            conversation=conversation,
+            payload=payload,
+            author_id=str(author.id),
+            member_user_ids=notify_candidates,
+            now=now,
+        )
+        return message, payload
+
+    async def reserve_stream_positions(self, conversation_id: uuid.UUID, count: int = 1) -> range:
+        """Réserve atomiquement `count` positions consécutives dans le flux d'une conversation.
+
+        Un seul UPDATE ... RETURNING sur le compteur de la conversation : pas de scan max(), pas de
+        collision sur uix_message_stream. Une transaction annulée laisse un trou, toléré par la pagination.
+        """
+        if count < 1:
+            raise ValueError("count must be >= 1")
+        stmt = (
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(last_stream_position=Conversation.last_stream_position + count)
+            .returning(Conversation.last_stream_position)
+        )
+        result = await self.session.execute(stmt)
+        last = result.scalar_one_or_none()
+        if last is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation non trouvée.")
+        return range(last - count + 1, last + 1)
 
     async def edit_message(
         self,
@@ -300,13 +264,19 @@ class ConversationMessagesMixin(ConversationBase):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message supprimé.")
         if message.author_id != user.id and membership.role != ConversationMemberRole.OWNER:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Action non autorisée.")
-        ciphertext, scheme, metadata = self._encrypt_content(conversation_id=conversation_id, content=content)
+        ciphertext, scheme, metadata = self._encrypt_content(
+            conversation_id=conversation_id,
+            content=content,
+            data_key=await self._current_data_key(conversation_id),
+        )
         message.ciphertext = ciphertext
         message.encryption_scheme = scheme
         message.encryption_metadata = metadata
-        message.search_text = content
+        for field, value in self._search_fields(content).items():
+            setattr(message, field, value)
         message.edited_at = datetime.now(timezone.utc)
         await self.session.flush()
+        await self._inbox_message_changed(message, content)
         await self._log(
             user,
             "message.edit",
@@ -336,6 +306,7 @@ class ConversationMessagesMixin(ConversationBase):
         message.deleted_at = datetime.now(timezone.utc)
         message.deletion_reason = reason or "deleted_by_user"
         await self.session.flush()
+        await self._inbox_message_changed(message, None)
         await self._log(
             user,
             "message.delete",
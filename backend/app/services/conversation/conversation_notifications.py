@@ -1,105 +1,90 @@
 from __future__ import annotations
 
+import uuid
 from datetime import datetime, timezone
 from typing import Optional
 
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
-from app.models import NotificationChannel, NotificationPreference, UserAccount
-from ..auth_service import quiet_hours_active
+from app.models import Conversation, Message, NotificationChannel, OutboundNotification, UserProfile
 from .conversation_base import ConversationBase
 
+PUSH_PREVIEW_LENGTH = 160
+
 
 class ConversationNotificationMixin(ConversationBase):
-    """Notifications temps réel et push."""
+    """Notifications temps réel et push (mise en file outbox)."""
 
     async def _broadcast_message_update(self, message) -> None:
-        """Diffuse une mise a jour de message sur le canal temps reel."""
-        if not self.realtime:
+        """Diffuse une mise a jour de message (apres commit) et patche la fenetre chaude."""
+        if not self.realtime and not self.message_cache:
             return
         payload = await self.serialize_message(message)
-        await self.realtime.publish_conversation(
-            str(message.conversation_id),
-            {
-                "event": "message.updated",
-                **payload,
-            },
-        )
-
-    async def _filter_notification_targets(self, user_ids: list, *, now: datetime) -> list[str]:
-        """Filtre les cibles push selon leurs preferences et plages de silence."""
-        if not user_ids:
-            return []
-        normalized_ids = [uid for uid in dict.fromkeys(user_ids) if uid]
-        if not normalized_ids:
-            return []
-
-        stmt_prefs = (
-            select(NotificationPreference)
-            .where(NotificationPreference.user_id.in_(normalized_ids))
-            .where(NotificationPreference.channel == NotificationChannel.PUSH)
-        )
-        result_prefs = await self.session.execute(stmt_prefs)
-        prefs = {pref.user_id: pref for pref in result_prefs.scalars().all()}
+        self._cache_message_payload(message.conversation_id, payload)
+        if self.realtime:
+            realtime = self.realtime
+            event = {"event": "message.updated", **payload}
+            self.after_commit(lambda: realtime.publish_conversation(str(message.conversation_id), event))
 
-        stmt_profiles = (
-            select(UserAccount)
-            .options(selectinload(UserAccount.profile))
-            .where(UserAccount.id.in_(normalized_ids))
-        )
-        result_profiles = await self.session.execute(stmt_profiles)
-        profiles = {user.id: user.profile for user in result_profiles.scalars().all()}
-
-        eligible: list[str] = []
-        for uid in normalized_ids:
-            pref = prefs.get(uid)
-            profile = profiles.get(uid)
-            if pref:
-                if not pref.is_enabled:
-                    continue
-                if pref.quiet_hours and quiet_hours_active(pref.quiet_hours, now, profile):
-                    continue
-            eligible.append(str(uid))
-        return eligible
-
-    async def _push_message_notifications(
+    def _enqueue_message_push(
         self,
         *,
-        conversation_id: str,
+        conversation: Conversation,
         payload: dict,
         author_id: str,
         member_user_ids: list,
         now: Optional[datetime] = None,
     ) -> None:
-        """Envoie des notifications push aux membres eligibles (hors auteur), avec previsualisation."""
-        if not self.realtime or not member_user_ids:
+        """Met en file (outbox, même transaction) la notification push d'un nouveau message.
+
+        La ligne ne contient que des identifiants : l'aperçu est déchiffré par NotificationWorker au
+        moment de l'envoi (message_push_data), aucun contenu de message n'est stocké dans l'outbox.
+        """
+        recipients = [str(uid) for uid in dict.fromkeys(member_user_ids) if uid and str(uid) != author_id]
+        if not recipients:
             return
         current_time = now or datetime.now(timezone.utc)
-        target_user_ids = await self._filter_notification_targets(member_user_ids, now=current_time)
-        if not target_user_ids:
-            return
-        preview = (payload.get("content") or "").strip()
-        if not preview and payload.get("attachments"):
-            preview = "Message contenant des pièces jointes."
-        created_at = payload.get("created_at") or current_time.isoformat()
-        message_id = payload.get("id")
         data = {
             "type": "message.received",
-            "conversation_id": conversation_id,
-            "message_id": message_id,
-            "preview": preview,
-            "sender": payload.get("author_display_name") or "Participant",
-            "created_at": created_at,
+            "conversation_id": str(conversation.id),
+            "message_id": payload.get("id"),
+            "created_at": payload.get("created_at") or current_time.isoformat(),
             "author_id": author_id,
         }
-        for user_id in target_user_ids:
-            if user_id == author_id:
-                continue
-            await self.realtime.publish_user_event(
-                user_id,
-                {
-                    "event": "notification",
-                    "payload": data,
-                },
+        self.session.add(
+            OutboundNotification(
+                organization_id=conversation.organization_id,
+                channel=NotificationChannel.PUSH,
+                payload={"recipients": recipients, "data": data},
+                scheduled_at=current_time,
+                status="pending",
             )
+        )
+        if self.realtime:
+            self.after_commit(self.realtime.signal_outbox)
+
+    async def message_push_data(self, data: dict) -> dict | None:
+        """Complète un push en file (identifiants seuls) avec l'aperçu et l'expéditeur, lus à l'envoi.
+
+        Retourne None si le message a été supprimé entre-temps (rien à notifier).
+        """
+        stmt = (
+            select(Message, UserProfile.display_name)
+            .outerjoin(UserProfile, UserProfile.user_id == Message.author_id)
+            .options(selectinload(Message.attachments))
+            .where(Message.id == uuid.UUID(str(data["message_id"])))
+        )
+        row = (await self.session.execute(stmt)).first()
+        if row is None or row[0].deleted_at is not None:
+            return None
+        message, display_name = row
+        await self._prime_data_keys([message])
+        preview = (await self._decrypt_messages([message])).get(message.id, "").strip()
+        if not preview and message.attachments:
+            preview = "Message contenant des pièces jointes."
+        return {
+            **data,
+            "preview": preview[:PUSH_PREVIEW_LENGTH],
+            "sender": display_name or "Participant",
+        }
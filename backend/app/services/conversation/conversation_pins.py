@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import uuid
 
-from sqlalchemy import select
+from sqlalchemy import false, func, select
 
 from app.models import ConversationMember, ConversationMemberRole, Message, MessagePin, MessageReaction, UserAccount
 from .conversation_base import ConversationBase
@@ -117,3 +117,42 @@ class ConversationPinsMixin(ConversationBase):
         if changed:
             await self._broadcast_message_update(refreshed)
         return refreshed
+
+    async def _load_pins(self, message_ids: list[uuid.UUID]) -> dict[uuid.UUID, MessagePin]:
+        """Charge en une requête les épingles d'une page de messages."""
+        if not message_ids:
+            return {}
+        result = await self.session.execute(select(MessagePin).where(MessagePin.message_id.in_(message_ids)))
+        return {pin.message_id: pin for pin in result.scalars().all()}
+
+    async def _load_reaction_summaries(
+        self,
+        message_ids: list[uuid.UUID],
+        viewer_member_id: uuid.UUID | None,
+    ) -> dict[uuid.UUID, list[dict]]:
+        """Agrège les réactions par message/emoji et signale si le viewer a déjà réagi."""
+        if not message_ids:
+            return {}
+        reacted = (
+            func.bool_or(MessageReaction.member_id == viewer_member_id)
+            if viewer_member_id
+            else func.bool_or(false())
+        )
+        stmt = (
+            select(
+                MessageReaction.message_id,
+                MessageReaction.emoji,
+                func.count(MessageReaction.id),
+                reacted,
+            )
+            .where(MessageReaction.message_id.in_(message_ids))
+            .group_by(MessageReaction.message_id, MessageReaction.emoji)
+            .order_by(func.min(MessageReaction.created_at))
+        )
+        result = await self.session.execute(stmt)
+        summaries: dict[uuid.UUID, list[dict]] = {}
+        for message_id, emoji, count, has_reacted in result.all():
+            summaries.setdefault(message_id, []).append(
+                {"emoji": emoji, "count": int(count or 0), "reacted": bool(has_reacted)}
+            )
+        return summaries
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import html
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, literal, select, tuple_
+
+from app.models import (
+    Conversation,
+    ConversationMember,
+    MembershipState,
+    Message,
+    UserAccount,
+    UserProfile,
+)
+from ...core.blind_index import blind_tokens, highlight
+from .conversation_base import ConversationBase
+
+# ts_headline délimite les termes par des caractères d'usage privé (retirés du texte source) ;
+# _render_headline échappe ensuite le texte et les remplace par <mark>, seul balisage de l'extrait.
+_MARK_START = "\ue000"
+_MARK_STOP = "\ue001"
+_HEADLINE_OPTIONS = f'StartSel="{_MARK_START}", StopSel="{_MARK_STOP}", MaxWords=24, MinWords=8, MaxFragments=2'
+
+
+def _render_headline(raw: str | None) -> str:
+    """Extrait HTML sûr : texte échappé, termes trouvés entourés de <mark>."""
+    return html.escape(raw or "").replace(_MARK_START, "<mark>").replace(_MARK_STOP, "</mark>")
+
+
+class ConversationSearchMixin(ConversationBase):
+    """Recherche : tsvector stocké (plaintext) ou index aveugle de jetons HMAC (blind)."""
+
+    def _search_fields(self, content: str) -> dict:
+        """Colonnes de recherche à écrire pour un contenu : texte en clair ou jetons, jamais les deux."""
+        if self._blind_search:
+            return {"search_text": None, "search_tokens": blind_tokens(content)}
+        return {"search_text": content, "search_tokens": None}
+
+    def _search_clause(self, term: str):
+        """Prédicat indexé (GIN) correspondant au terme selon le mode de recherche."""
+        if self._blind_search:
+            tokens = blind_tokens(term)
+            if not tokens:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Terme de recherche trop court.")
+            return Message.search_tokens.contains(tokens)
+        return Message.search_vector.op("@@")(func.plainto_tsquery("simple", term))
+
+    async def search_messages(
+        self,
+        conversation_id: uuid.UUID,
+        *,
+        user: UserAccount,
+        query: str,
+        limit: int = 50,
+    ) -> list[dict]:
+        """Recherche plein texte dans une conversation pour l'utilisateur connecte."""
+        term = (query or "").strip()
+        if not term:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Un terme de recherche est requis.")
+        membership = await self._get_membership(conversation_id, user.id)
+        stmt = (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .where(Message.deleted_at.is_(None))
+            .where(self._search_clause(term))
+            .order_by(Message.created_at.desc())
+            .limit(max(1, min(limit, 200)))
+        )
+        result = await self.session.execute(stmt)
+        rows = result.scalars().all()
+        return await self.serialize_messages(list(rows), viewer_membership=membership)
+
+    async def search_all_messages(
+        self,
+        *,
+        user: UserAccount,
+        query: str,
+        limit: int = 20,
+        after: tuple[float | datetime, uuid.UUID] | None = None,
+    ) -> tuple[list[dict], tuple[float | datetime, uuid.UUID] | None]:
+        """Recherche dans toutes les conversations actives de l'utilisateur.
+
+        Mode plaintext : classement ts_rank, keyset sur (rang, id), extraits ts_headline calculés
+        pour la seule page retenue. Mode blind : pas de rang possible côté base, keyset sur
+        (created_at, id) et extraits construits après déchiffrement de la page.
+        """
+        term = (query or "").strip()
+        if not term:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Un terme de recherche est requis.")
+        fetch_limit = max(1, min(limit, 50))
+        if self._blind_search:
+            return await self._search_all_blind(user, term, fetch_limit, after)
+
+        ts_query = func.plainto_tsquery("simple", term)
+        rank = func.ts_rank(Message.search_vector, ts_query)
+        ranked = (
+            select(Message.id.label("id"), rank.label("rank"))
+            .join(
+                ConversationMember,
+                (ConversationMember.conversation_id == Message.conversation_id)
+                & (ConversationMember.user_id == user.id)
+                & (ConversationMember.state == MembershipState.ACTIVE),
+            )
+            .where(Message.deleted_at.is_(None))
+            .where(Message.search_vector.op("@@")(ts_query))
+        )
+        if after is not None:
+            ranked = ranked.where(tuple_(rank, Message.id) < tuple_(literal(after[0]), literal(after[1])))
+        page = ranked.order_by(rank.desc(), Message.id.desc()).limit(fetch_limit + 1).subquery()
+
+        source = func.translate(func.coalesce(Message.search_text, ""), _MARK_START + _MARK_STOP, "")
+        snippet = func.ts_headline("simple", source, ts_query, _HEADLINE_OPTIONS)
+        stmt = (
+            select(
+                Message.id,
+                Message.conversation_id,
+                Message.author_id,
+                Message.stream_position,
+                Message.created_at,
+                Conversation.title.label("conversation_title"),
+                func.coalesce(UserProfile.display_name, UserAccount.email).label("author_display_name"),
+                page.c.rank,
+                snippet.label("snippet"),
+            )
+            .join(page, page.c.id == Message.id)
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .outerjoin(UserAccount, UserAccount.id == Message.author_id)
+            .outerjoin(UserProfile, UserProfile.user_id == Message.author_id)
+            .order_by(page.c.rank.desc(), Message.id.desc())
+        )
+        result = await self.session.execute(stmt)
+        rows = result.all()
+        has_more = len(rows) > fetch_limit
+        rows = rows[:fetch_limit]
+        hits = [
+            self._search_hit(row, row, rank=float(row.rank), snippet=_render_headline(row.snippet))
+            for row in rows
+        ]
+        next_after = (float(rows[-1].rank), rows[-1].id) if has_more and rows else None
+        return hits, next_after
+
+    async def _search_all_blind(
+        self,
+        user: UserAccount,
+        term: str,
+        fetch_limit: int,
+        after: tuple[float | datetime, uuid.UUID] | None,
+    ) -> tuple[list[dict], tuple[datetime, uuid.UUID] | None]:
+        stmt = (
+            select(
+                Message,
+                Conversation.title.label("conversation_title"),
+                func.coalesce(UserProfile.display_name, UserAccount.email).label("author_display_name"),
+            )
+            .join(
+                ConversationMember,
+                (ConversationMember.conversation_id == Message.conversation_id)
+                & (ConversationMember.user_id == user.id)
+                & (ConversationMember.state == MembershipState.ACTIVE),
+            )
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .outerjoin(UserAccount, UserAccount.id == Message.author_id)
+            .outerjoin(UserProfile, UserProfile.user_id == Message.author_id)
+            .where(Message.deleted_at.is_(None))
+            .where(self._search_clause(term))
+        )
+        if after is not None:
+            if not isinstance(after[0], datetime):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.")
+            stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(literal(after[0]), literal(after[1])))
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(fetch_limit + 1)
+        result = await self.session.execute(stmt)
+        rows = result.all()
+        has_more = len(rows) > fetch_limit
+        rows = rows[:fetch_limit]
+
+        messages = [row.Message for row in rows]
+        await self._prime_data_keys(messages)
+        plaintexts = await self._decrypt_messages(messages)
+        hits = [
+            self._search_hit(row.Message, row, rank=0.0, snippet=highlight(plaintexts.get(row.Message.id, ""), [term]))
+            for row in rows
+        ]
+        last = rows[-1].Message if has_more and rows else None
+        return hits, (last.created_at, last.id) if last else None
+
+    @staticmethod
+    def _search_hit(message, row, *, rank: float, snippet: str) -> dict:
+        return {
+            "message_id": message.id,
+            "conversation_id": message.conversation_id,
+            "conversation_title": row.conversation_title,
+            "author_id": message.author_id,
+            "author_display_name": row.author_display_name,
+            "stream_position": message.stream_position,
+            "created_at": message.created_at,
+            "rank": rank,
+            "snippet": snippet,
+        }
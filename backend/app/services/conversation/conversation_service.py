@@ -8,20 +8,26 @@ Les responsabilités sont réparties par domaine pour faciliter la navigation.
 from .conversation_attachments import ConversationAttachmentMixin
 from .conversation_base import ConversationBase
 from .conversation_block import ConversationBlockMixin
+from .conversation_cache import ConversationCacheMixin
 from .conversation_crypto import ConversationCryptoMixin
 from .conversation_delivery import ConversationDeliveryMixin
+from .conversation_inbox import ConversationInboxMixin
 from .conversation_invites import ConversationInvitesMixin
 from .conversation_members import ConversationMembersMixin
 from .conversation_messages import ConversationMessagesMixin
 from .conversation_notifications import ConversationNotificationMixin
 from .conversation_pins import ConversationPinsMixin
+from .conversation_search import ConversationSearchMixin
 
 
 class ConversationService(
+    ConversationCacheMixin,
     ConversationMessagesMixin,
+    ConversationSearchMixin,
     ConversationPinsMixin,
     ConversationAttachmentMixin,
     ConversationDeliveryMixin,
+    ConversationInboxMixin,
     ConversationInvitesMixin,
     ConversationMembersMixin,
     ConversationBlockMixin,
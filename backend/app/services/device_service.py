@@ -8,6 +8,8 @@
 # - Inscription/synchronisation des appareils et mise  à jour des sessions associées.
 # - écode les métadonnées base64 (push_token) et dérive un trust_level.
 # - Audit optionnel via AuditService.
+# - commit() invalide l'overview en cache des utilisateurs dont les appareils ont change,
+#   puis propage les sessions revoquees au cache des principaux (auth:invalidate).
 ############################################################
 """
 
@@ -15,6 +17,7 @@ from __future__ import annotations
 
 import base64
 import json
+import uuid
 from datetime import datetime, timezone
 from typing import Any
 
@@ -25,15 +28,35 @@ from sqlalchemy.orm import selectinload
 
 from app.models import Device, SessionToken, UserAccount
 from .audit_service import AuditService
+from ..core.overview_cache import OverviewCache
+from ..core.principal import publish_invalidation
 
 
 class DeviceService:
     """Encapsule le cycle de vie des appareils et leurs sessions associées."""
 
-    def __init__(self, session: AsyncSession, audit_service: AuditService | None = None) -> None:
-        """Injecte la session SQLAlchemy et le service d'audit."""
+    def __init__(
+        self,
+        session: AsyncSession,
+        audit_service: AuditService | None = None,
+        overview_cache: OverviewCache | None = None,
+    ) -> None:
+        """Injecte la session SQLAlchemy, le service d'audit et le cache de l'overview."""
         self.session = session
         self.audit = audit_service
+        self.overview_cache = overview_cache if overview_cache and overview_cache.enabled else None
+        self._overview_stale: set[uuid.UUID] = set()
+        self._revoked_sessions: set[uuid.UUID] = set()
+
+    async def commit(self) -> None:
+        """Valide la transaction puis invalide l'overview et les sessions révoquées en cache."""
+        await self.session.commit()
+        revoked, self._revoked_sessions = self._revoked_sessions, set()
+        if revoked:
+            await publish_invalidation(session_ids=revoked)
+        stale, self._overview_stale = self._overview_stale, set()
+        if self.overview_cache and stale:
+            await self.overview_cache.invalidate(list(stale))
 
     async def list_devices(self, user: UserAccount) -> list[Device]:
         """Retourne les appareils d'un utilisateur avec leurs sessions."""
@@ -110,6 +133,7 @@ class DeviceService:
             )
 
         await self._update_sessions(device, ip_address=ip_address, user_agent=user_agent)
+        self._overview_stale.add(user.id)
         return device
 
     async def revoke_device(self, user: UserAccount, device_identifier: str) -> None:
@@ -123,7 +147,7 @@ class DeviceService:
         if device is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found.")
 
-        await self.session.execute(
+        result = await self.session.execute(
             update(SessionToken)
             .where(
                 SessionToken.user_id == user.id,
@@ -131,8 +155,11 @@ class DeviceService:
                 SessionToken.revoked_at.is_(None),
             )
             .values(revoked_at=datetime.now(timezone.utc))
+            .returning(SessionToken.id)
         )
+        self._revoked_sessions.update(result.scalars().all())
         await self.session.delete(device)
+        self._overview_stale.add(user.id)
         await self._log(user, "device.revoke", device_id=str(device.id))
 
     def _decode_metadata(self, payload: str) -> dict[str, Any]:
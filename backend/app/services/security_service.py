@@ -13,18 +13,18 @@
 
 from __future__ import annotations
 
-import base64
-import io
 import secrets
 import string
 from datetime import datetime, timedelta, timezone
 
 import pyotp
-import qrcode
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
+from ..core.executors import IMAGE, offload
+from ..core.imaging import render_qr_base64
+from ..db.session import load_relations
 from .audit_service import AuditService
 from app.models import (
     TotpSecret,
@@ -103,7 +103,7 @@ class SecurityService:
             name=user.email,
             issuer_name=settings.PROJECT_NAME,
         )
-        qr_png_b64 = self._generate_qr_base64(provisioning_uri)
+        qr_png_b64 = await offload(IMAGE, render_qr_base64, provisioning_uri)
 
         await self._log("security.totp.enrollment_started", user_id=str(user.id))
         return {
@@ -178,6 +178,8 @@ class SecurityService:
 
     async def _ensure_security_state(self, user: UserAccount) -> UserSecurityState:
         """S'assure que l'état de sécurité existe pour l'utilisateur avant manipulation."""
+        # get_current_user ne charge que le profil : état et secret TOTP sont lus ici, à la demande.
+        await load_relations(self.session, user, "security_state", "totp_secret")
         if user.security_state is None:
             user.security_state = UserSecurityState(user_id=user.id)
             self.session.add(user.security_state)
@@ -192,16 +194,6 @@ class SecurityService:
             state.totp_locked_until = _utcnow() + timedelta(minutes=15)
             state.failed_totp_attempts = 0
 
-    def _generate_qr_base64(self, provisioning_uri: str) -> str:
-        """Génère une image QR code encodée en base64 à partir de l'URI TOTP."""
-        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_Q, border=2)
-        qr.add_data(provisioning_uri)
-        qr.make(fit=True)
-        image = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("ascii")
-
     def _generate_recovery_codes(self, count: int = 8) -> list[str]:
         """Crée une liste de codes de récupération pseudo-aléatoires."""
         alphabet = string.ascii_uppercase + string.digits
@@ -7,6 +7,9 @@
 # Description:
 # - Consomme la file outbound_notifications et declenche les envois (email/push).
 # - Tourne en boucle async avec gestion elegante des interruptions (SIGINT/SIGTERM).
+# - Push : preferences chargees en une requete par lot, publications Redis en pipeline.
+# - Push message : apercu dechiffre a l'envoi, l'outbox ne contient que des identifiants.
+# - Attente de travail via BLPOP sur la cle de reveil outbox (repli sur un sommeil court).
 #
 # Points de vigilance:
 # - Nettoyer/mettre a jour les statuts en cas d'erreur pour eviter le stuck.
@@ -31,17 +34,23 @@ from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import selectinload
+import redis.asyncio as aioredis
 
 from ..config import Settings, get_settings
 from ..core.email import send_email
+from ..core.redis import OUTBOX_WAKEUP_KEY, RealtimeBroker
 from ..db.session import _make_async_url
-from app.models import NotificationChannel, OutboundNotification, UserAccount
+from ..services.auth_service import quiet_hours_active
+from ..services.conversation import ConversationService
+from app.models import NotificationChannel, NotificationPreference, OutboundNotification, UserAccount, UserProfile
 
 try:
     from app_old.utils._cova_logo_b64 import LOGO_PNG_BASE64 as _COVA_LOGO_B64
 except ImportError:
     _COVA_LOGO_B64 = None
 
+PUSH_BATCH_SIZE = 500
+
 # =====================
 # DTOs / Jobs en file
 # =====================
@@ -63,6 +72,8 @@ class NotificationWorker:
         db_url = _make_async_url(settings.DATABASE_URL)
         self.engine = create_async_engine(db_url, future=True, echo=False)
         self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self.redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True) if settings.REDIS_URL else None
+        self.realtime = RealtimeBroker(self.redis)
         self.running = True
 
     # --- Cycle principal ---
@@ -75,7 +86,7 @@ class NotificationWorker:
             try:
                 job = await self._acquire_notification()
                 if job is None:
-                    await asyncio.sleep(2)
+                    await self._wait_for_work(2)
                     continue
                 try:
                     await self._deliver_notification(job)
@@ -91,6 +102,16 @@ class NotificationWorker:
     def stop(self) -> None:
         self.running = False
 
+    async def _wait_for_work(self, timeout: int) -> None:
+        """Attend un reveil outbox (BLPOP) ou l'expiration du delai de polling."""
+        if self.redis is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await self.redis.blpop([OUTBOX_WAKEUP_KEY], timeout=timeout)
+        except Exception:  # noqa: BLE001
+            await asyncio.sleep(timeout)
+
     async def _acquire_notification(self) -> NotificationJob | None:
         async with self.session_factory() as session:
             async with session.begin():
@@ -121,9 +142,58 @@ class NotificationWorker:
         """Route un job vers le canal cible et met a jour les stats."""
         if job.channel == NotificationChannel.EMAIL:
             await self._send_email(job)
+        elif job.channel == NotificationChannel.PUSH:
+            await self._send_push(job)
         else:
             print(f"[notification-worker] channel {job.channel} not implemented")
 
+    # --- Push (fan-out des nouveaux messages) ---
+    async def _send_push(self, job: NotificationJob) -> None:
+        """Filtre les destinataires d'un push en lot puis publie sur leurs canaux en un pipeline."""
+        if self.redis is None:
+            raise RuntimeError("Realtime is not configured (missing REDIS_URL)")
+        recipients = [str(user_id) for user_id in job.payload.get("recipients") or []]
+        data = job.payload.get("data") or {}
+        if data.get("type") == "message.received" and "preview" not in data:
+            # L'outbox ne stocke que des identifiants : aperçu déchiffré au moment de l'envoi.
+            async with self.session_factory() as session:
+                data = await ConversationService(session).message_push_data(data)
+            if data is None:
+                return
+        now = datetime.now(timezone.utc)
+        for start in range(0, len(recipients), PUSH_BATCH_SIZE):
+            batch = recipients[start:start + PUSH_BATCH_SIZE]
+            targets = await self._filter_push_targets(batch, now=now)
+            await self.realtime.publish_user_events(targets, {"event": "notification", "payload": data})
+
+    async def _filter_push_targets(self, user_ids: list[str], *, now: datetime) -> list[str]:
+        """Ecarte les utilisateurs ayant coupe le push ou en plage de silence (une requete par lot)."""
+        async with self.session_factory() as session:
+            stmt = (
+                select(
+                    NotificationPreference.user_id,
+                    NotificationPreference.is_enabled,
+                    NotificationPreference.quiet_hours,
+                    UserProfile.timezone,
+                )
+                .outerjoin(UserProfile, UserProfile.user_id == NotificationPreference.user_id)
+                .where(NotificationPreference.user_id.in_([uuid.UUID(user_id) for user_id in user_ids]))
+                .where(NotificationPreference.channel == NotificationChannel.PUSH)
+            )
+            result = await session.execute(stmt)
+            prefs = {str(row.user_id): row for row in result.all()}
+        eligible: list[str] = []
+        for user_id in user_ids:
+            pref = prefs.get(user_id)
+            if pref is not None:
+                if not pref.is_enabled:
+                    continue
+                # La ligne expose `timezone`, seul attribut du profil lu par quiet_hours_active.
+                if pref.quiet_hours and quiet_hours_active(pref.quiet_hours, now, pref):
+                    continue
+            eligible.append(user_id)
+        return eligible
+
     async def _send_email(self, job: NotificationJob) -> None:
         """Construit et envoie un email selon le payload."""
         if not self.settings.SMTP_HOST:
@@ -0,0 +1,50 @@
+"""Store the message tsvector as a generated column.
+
+Revision ID: a2d6f0b7c914
+Revises: f1c5e8a93d20
+Create Date: 2025-05-22
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "a2d6f0b7c914"
+down_revision = "f1c5e8a93d20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Colonne generee stockee : reecrit la table messages (a planifier hors pointe).
+    op.add_column(
+        "messages",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', coalesce(search_text, ''))", persisted=True),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_search_vector",
+            "messages",
+            ["search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+        op.execute("drop index concurrently if exists ix_messages_search_text")
+
+
+def downgrade() -> None:
+    op.execute(
+        "create index if not exists ix_messages_search_text on messages "
+        "using gin (to_tsvector('simple', coalesce(search_text, '')))"
+    )
+    op.drop_index("ix_messages_search_vector", table_name="messages")
+    op.drop_column("messages", "search_vector")
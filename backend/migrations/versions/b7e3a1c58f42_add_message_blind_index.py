@@ -0,0 +1,44 @@
+"""Add blind-index search tokens and drop the ciphertext full-text index.
+
+Revision ID: b7e3a1c58f42
+Revises: a2d6f0b7c914
+Create Date: 2025-05-23
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "b7e3a1c58f42"
+down_revision = "a2d6f0b7c914"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("search_tokens", postgresql.ARRAY(sa.BigInteger()), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_search_tokens",
+            "messages",
+            ["search_tokens"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+        # Index sur convert_from(ciphertext) : inutilisable des que le contenu est chiffre.
+        op.execute("drop index concurrently if exists ix_messages_fulltext")
+    # La colonne search_text reste en place : elle est videe par scripts/reindex_blind_index.py
+    # (--purge-plaintext) et pourra etre supprimee une fois le mode blind generalise.
+
+
+def downgrade() -> None:
+    op.execute(
+        "create index if not exists ix_messages_fulltext on messages "
+        "using gin (to_tsvector('simple', coalesce(convert_from(ciphertext, 'UTF8'), '')))"
+    )
+    op.drop_index("ix_messages_search_tokens", table_name="messages")
+    op.drop_column("messages", "search_tokens")
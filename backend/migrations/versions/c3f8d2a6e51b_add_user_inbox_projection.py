@@ -0,0 +1,75 @@
+"""Add the user_inbox projection (per-user conversation list) and backfill it.
+
+Revision ID: c3f8d2a6e51b
+Revises: b7e3a1c58f42
+Create Date: 2025-05-25
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "c3f8d2a6e51b"
+down_revision = "b7e3a1c58f42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_inbox",
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("conversation_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("last_activity_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_message_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("last_message_author_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("last_message_preview", sa.String(length=200), nullable=True),
+        sa.Column("unread_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("muted_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived", sa.Boolean(), server_default="false", nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user_accounts.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["conversation_id"], ["conversations.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "conversation_id"),
+    )
+    op.create_index("ix_user_inbox_activity", "user_inbox", ["user_id", "last_activity_at", "conversation_id"])
+    op.create_index("ix_user_inbox_conversation", "user_inbox", ["conversation_id"])
+
+    # Les aperçus restent vides (résolus à la lecture) ; les non lus suivent le mode "rows".
+    # En mode watermark, relancer scripts/rebuild_user_inbox.py pour recalculer les compteurs.
+    op.execute(
+        """
+        insert into user_inbox (
+            user_id, conversation_id, last_activity_at, last_message_id, last_message_author_id,
+            unread_count, muted_until, archived
+        )
+        select
+            cm.user_id,
+            cm.conversation_id,
+            coalesce(lm.created_at, c.created_at),
+            lm.id,
+            lm.author_id,
+            (select count(*) from message_deliveries d where d.member_id = cm.id and d.state <> 'READ'),
+            cm.muted_until,
+            coalesce((c.extra_metadata ->> 'archived')::boolean, false)
+        from conversation_members cm
+        join conversations c on c.id = cm.conversation_id
+        left join lateral (
+            select m.id, m.author_id, m.created_at
+            from messages m
+            where m.conversation_id = cm.conversation_id and m.deleted_at is null
+            order by m.stream_position desc
+            limit 1
+        ) lm on true
+        where cm.state = 'ACTIVE'
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_inbox_conversation", table_name="user_inbox")
+    op.drop_index("ix_user_inbox_activity", table_name="user_inbox")
+    op.drop_table("user_inbox")
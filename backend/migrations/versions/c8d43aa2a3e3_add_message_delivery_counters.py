@@ -0,0 +1,51 @@
+"""Add denormalized delivery/read counters on messages.
+
+Revision ID: c8d43aa2a3e3
+Revises: 1f2b3c4d5e6f
+Create Date: 2025-05-12
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c8d43aa2a3e3"
+down_revision = "1f2b3c4d5e6f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("recipient_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("messages", sa.Column("delivered_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("messages", sa.Column("read_count", sa.Integer(), nullable=False, server_default="0"))
+    # Backfill depuis les livraisons existantes (la ligne de l'auteur n'est pas comptee).
+    op.execute(
+        """
+        update messages m
+        set recipient_count = s.total,
+            delivered_count = s.delivered,
+            read_count = s.read
+        from (
+            select d.message_id,
+                   count(*) as total,
+                   count(*) filter (where d.state in ('DELIVERED', 'READ')) as delivered,
+                   count(*) filter (where d.state = 'READ') as read
+            from message_deliveries d
+            join conversation_members cm on cm.id = d.member_id
+            join messages mm on mm.id = d.message_id
+            where mm.author_id is null or cm.user_id <> mm.author_id
+            group by d.message_id
+        ) s
+        where s.message_id = m.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "read_count")
+    op.drop_column("messages", "delivered_count")
+    op.drop_column("messages", "recipient_count")
@@ -0,0 +1,36 @@
+"""Index the conversation roster on (conversation_id, joined_at, user_id) for keyset paging.
+
+Revision ID: d5a9e3f17c62
+Revises: c3f8d2a6e51b
+Create Date: 2025-05-27
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "d5a9e3f17c62"
+down_revision = "c3f8d2a6e51b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversation_members_roster",
+            "conversation_members",
+            ["conversation_id", "joined_at", "user_id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_conversation_members_roster",
+            table_name="conversation_members",
+            postgresql_concurrently=True,
+        )
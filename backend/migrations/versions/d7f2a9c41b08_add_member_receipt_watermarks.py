@@ -0,0 +1,63 @@
+"""Add delivered/read watermarks on conversation members.
+
+Revision ID: d7f2a9c41b08
+Revises: c8d43aa2a3e3
+Create Date: 2025-05-14
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d7f2a9c41b08"
+down_revision = "c8d43aa2a3e3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversation_members",
+        sa.Column("delivered_position", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "conversation_members",
+        sa.Column("read_position", sa.Integer(), nullable=False, server_default="0"),
+    )
+    # Backfill depuis message_deliveries : le watermark s'arrete juste avant la premiere
+    # livraison non lue (resp. non livree), sinon au dernier message de la conversation.
+    op.execute(
+        """
+        update conversation_members cm
+        set read_position = coalesce(
+                (select min(m.stream_position) - 1
+                 from message_deliveries d join messages m on m.id = d.message_id
+                 where d.member_id = cm.id and d.state <> 'READ'),
+                (select max(m.stream_position) from messages m where m.conversation_id = cm.conversation_id),
+                0),
+            delivered_position = coalesce(
+                (select min(m.stream_position) - 1
+                 from message_deliveries d join messages m on m.id = d.message_id
+                 where d.member_id = cm.id and d.state not in ('DELIVERED', 'READ')),
+                (select max(m.stream_position) from messages m where m.conversation_id = cm.conversation_id),
+                0)
+        """
+    )
+    op.execute(
+        """
+        update conversation_members cm
+        set last_read_message_id = m.id
+        from messages m
+        where m.conversation_id = cm.conversation_id
+          and m.stream_position = cm.read_position
+          and cm.read_position > 0
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversation_members", "read_position")
+    op.drop_column("conversation_members", "delivered_position")
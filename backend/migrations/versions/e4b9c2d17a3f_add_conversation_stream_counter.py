@@ -0,0 +1,41 @@
+"""Add per-conversation stream position counter.
+
+Revision ID: e4b9c2d17a3f
+Revises: d7f2a9c41b08
+Create Date: 2025-05-15
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e4b9c2d17a3f"
+down_revision = "d7f2a9c41b08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversations",
+        sa.Column("last_stream_position", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        update conversations c
+        set last_stream_position = s.last_position
+        from (
+            select conversation_id, max(stream_position) as last_position
+            from messages
+            group by conversation_id
+        ) s
+        where s.conversation_id = c.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "last_stream_position")
@@ -0,0 +1,27 @@
+"""Record which keyring key wraps each conversation data key.
+
+Revision ID: f1c5e8a93d20
+Revises: e4b9c2d17a3f
+Create Date: 2025-05-20
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f1c5e8a93d20"
+down_revision = "e4b9c2d17a3f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nullable : les lignes existantes sont deballees en essayant chaque cle du trousseau.
+    op.add_column("conversation_encryption_keys", sa.Column("wrapping_key_id", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("conversation_encryption_keys", "wrapping_key_id")
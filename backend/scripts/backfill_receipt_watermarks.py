@@ -0,0 +1,75 @@
+"""Recalculer les watermarks livré/lu des membres depuis message_deliveries avant de passer en mode watermark."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import text
+
+from app.db.session import async_session_factory
+
+# Même calcul que la migration d7f2a9c41b08 : à relancer juste avant MESSAGE_RECEIPTS_MODE=watermark,
+# les lignes écrites entre-temps en mode "rows" étant plus récentes que le backfill initial.
+BACKFILL_POSITIONS = text(
+    """
+    update conversation_members cm
+    set read_position = coalesce(
+            (select min(m.stream_position) - 1
+             from message_deliveries d join messages m on m.id = d.message_id
+             where d.member_id = cm.id and d.state <> 'READ'),
+            (select max(m.stream_position) from messages m where m.conversation_id = cm.conversation_id),
+            0),
+        delivered_position = coalesce(
+            (select min(m.stream_position) - 1
+             from message_deliveries d join messages m on m.id = d.message_id
+             where d.member_id = cm.id and d.state not in ('DELIVERED', 'READ')),
+            (select max(m.stream_position) from messages m where m.conversation_id = cm.conversation_id),
+            0)
+    """
+)
+
+BACKFILL_LAST_READ = text(
+    """
+    update conversation_members cm
+    set last_read_message_id = m.id
+    from messages m
+    where m.conversation_id = cm.conversation_id
+      and m.stream_position = cm.read_position
+      and cm.read_position > 0
+    """
+)
+
+PRUNE_DELIVERIES = text("delete from message_deliveries")
+
+
+async def _main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete message_deliveries rows once the watermarks are written (watermark mode only).",
+    )
+    args = parser.parse_args(argv)
+
+    async with async_session_factory() as session:
+        result = await session.execute(BACKFILL_POSITIONS)
+        await session.execute(BACKFILL_LAST_READ)
+        pruned = 0
+        if args.prune:
+            pruned = (await session.execute(PRUNE_DELIVERIES)).rowcount or 0
+        await session.commit()
+
+    print("Members updated:", result.rowcount)
+    if args.prune:
+        print("Deliveries pruned:", pruned)
+    return 0
+
+
+def run() -> None:
+    asyncio.run(_main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
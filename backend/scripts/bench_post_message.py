@@ -0,0 +1,116 @@
+"""Mesurer les allers-retours SQL et la latence d'un envoi de message (ConversationService.post_message).
+
+Crée une organisation, des comptes et une conversation jetables, envoie des messages puis annule la
+transaction : la base n'est pas modifiée. Pour comparer avant/après une évolution du chemin d'envoi,
+lancer le script sur chacune des deux révisions avec les mêmes paramètres.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+from sqlalchemy import event
+
+from app.db.session import async_session_factory, engine
+from app.models import (
+    Conversation,
+    ConversationMember,
+    ConversationMemberRole,
+    ConversationType,
+    MembershipState,
+    MessageType,
+    Organization,
+    UserAccount,
+    UserProfile,
+)
+from app.services.conversation import ConversationService
+
+
+class StatementCounter:
+    """Compte les instructions envoyées au serveur (un executemany compte pour un aller-retour)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.count += 1
+
+
+async def _seed(session, members: int) -> tuple[Conversation, UserAccount]:
+    suffix = uuid.uuid4().hex[:10]
+    organization = Organization(name=f"bench-{suffix}", slug=f"bench-{suffix}")
+    session.add(organization)
+    await session.flush()
+    conversation = Conversation(
+        organization_id=organization.id,
+        title="bench",
+        type=ConversationType.GROUP,
+        extra_metadata={"archived": False},
+    )
+    users: list[UserAccount] = []
+    for index in range(members):
+        user = UserAccount(email=f"bench-{suffix}-{index}@example.invalid", hashed_password="!", is_confirmed=True)
+        user.profile = UserProfile(display_name=f"Bench {index}")
+        users.append(user)
+    session.add_all(users)
+    await session.flush()
+    conversation.created_by = users[0].id
+    for index, user in enumerate(users):
+        conversation.members.append(
+            ConversationMember(
+                user_id=user.id,
+                role=ConversationMemberRole.OWNER if index == 0 else ConversationMemberRole.MEMBER,
+                state=MembershipState.ACTIVE,
+            )
+        )
+    session.add(conversation)
+    await session.flush()
+    return conversation, users[0]
+
+
+async def _main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=50, help="Members in the benchmark conversation.")
+    parser.add_argument("--messages", type=int, default=20, help="Messages to send.")
+    args = parser.parse_args(argv)
+
+    counter = StatementCounter()
+    async with async_session_factory() as session:
+        conversation, author = await _seed(session, max(args.members, 2))
+        service = ConversationService(session)
+        event.listen(engine.sync_engine, "before_cursor_execute", counter)
+        per_send: list[int] = []
+        latencies: list[float] = []
+        try:
+            for index in range(args.messages):
+                before = counter.count
+                started = time.perf_counter()
+                await service.post_message(
+                    conversation_id=conversation.id,
+                    author=author,
+                    content=f"bench message {index}",
+                    message_type=MessageType.TEXT,
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                per_send.append(counter.count - before)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", counter)
+            await session.rollback()
+
+    print("Members:", max(args.members, 2), "Messages:", args.messages)
+    print("Statements per send: min", min(per_send), "max", max(per_send), "mean", round(statistics.mean(per_send), 2))
+    print("Latency ms: median", round(statistics.median(latencies), 2), "max", round(max(latencies), 2))
+    return 0
+
+
+def run() -> None:
+    asyncio.run(_main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
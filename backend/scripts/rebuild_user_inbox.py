@@ -0,0 +1,57 @@
+"""Recalculer les non lus de la projection user_inbox depuis les livraisons ou les watermarks.
+
+La migration c3f8d2a6e51b remplit user_inbox avec les compteurs du mode "rows" : à relancer après
+un passage en MESSAGE_RECEIPTS_MODE=watermark, ou pour réconcilier la projection après un incident.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select, update
+
+from app.db.session import async_session_factory
+from app.models import UserInbox
+from app.services.conversation import ConversationService
+
+
+async def _main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=200, help="Users per transaction.")
+    args = parser.parse_args(argv)
+
+    last_user_id = None
+    total = 0
+    while True:
+        async with async_session_factory() as session:
+            stmt = select(UserInbox.user_id).distinct().order_by(UserInbox.user_id).limit(args.batch_size)
+            if last_user_id is not None:
+                stmt = stmt.where(UserInbox.user_id > last_user_id)
+            user_ids = list((await session.execute(stmt)).scalars().all())
+            if not user_ids:
+                break
+            service = ConversationService(session)
+            for user_id in user_ids:
+                counts = await service.count_unread(user_id)
+                await session.execute(update(UserInbox).where(UserInbox.user_id == user_id).values(unread_count=0))
+                for conversation_id, unread in counts.items():
+                    await session.execute(
+                        update(UserInbox)
+                        .where(UserInbox.user_id == user_id, UserInbox.conversation_id == conversation_id)
+                        .values(unread_count=unread)
+                    )
+            await session.commit()
+            last_user_id = user_ids[-1]
+            total += len(user_ids)
+            print("Users reconciled:", total)
+    return 0
+
+
+def run() -> None:
+    asyncio.run(_main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
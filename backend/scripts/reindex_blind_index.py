@@ -0,0 +1,62 @@
+"""Calculer les jetons d'index aveugle (messages.search_tokens) avant de passer en MESSAGE_SEARCH_MODE=blind.
+
+À relancer après tout changement de MESSAGE_BLIND_INDEX_KEY. Le texte indexé provient de search_text
+quand il existe, sinon du contenu déchiffré. Avec --purge-plaintext, search_text est vidé au passage.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select, update
+
+from app.core.blind_index import blind_tokens
+from app.db.session import async_session_factory
+from app.models import Message
+from app.services.conversation import ConversationService
+
+
+async def _main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500, help="Messages per transaction.")
+    parser.add_argument(
+        "--purge-plaintext",
+        action="store_true",
+        help="Clear messages.search_text once tokens are written (blind mode only).",
+    )
+    args = parser.parse_args(argv)
+
+    last_id = None
+    total = 0
+    while True:
+        async with async_session_factory() as session:
+            stmt = select(Message).order_by(Message.id).limit(args.batch_size)
+            if last_id is not None:
+                stmt = stmt.where(Message.id > last_id)
+            messages = list((await session.execute(stmt)).scalars().all())
+            if not messages:
+                break
+            service = ConversationService(session)
+            encrypted = [message for message in messages if not message.search_text]
+            await service._prime_data_keys(encrypted)
+            plaintexts = await service._decrypt_messages(encrypted)
+            for message in messages:
+                values = {"search_tokens": blind_tokens(message.search_text or plaintexts.get(message.id))}
+                if args.purge_plaintext:
+                    values["search_text"] = None
+                await session.execute(update(Message).where(Message.id == message.id).values(**values))
+            await session.commit()
+            last_id = messages[-1].id
+            total += len(messages)
+            print("Messages indexed:", total)
+    return 0
+
+
+def run() -> None:
+    asyncio.run(_main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
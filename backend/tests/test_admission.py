@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from backend.app.core.admission import AdmissionController, AdmissionMiddleware, classify
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_one_organization_cannot_take_the_whole_class():
+    controller = AdmissionController({"write": 4}, tenant_share=0.5, queue_timeout_ms=50, max_queue=10)
+
+    held = [await controller.admit("write", "org:a") for _ in range(2)]
+    assert all(held)
+    # Troisieme requete de la meme organisation : attend sa part puis est rejetee a l'echeance.
+    assert await controller.admit("write", "org:a") is None
+    # Une autre organisation passe malgre le pic de la premiere.
+    other = await controller.admit("write", "org:b")
+    assert other is not None
+    assert controller.snapshot()["write"]["in_flight"] == 3
+
+    waiting = asyncio.create_task(controller.admit("write", "org:a"))
+    await asyncio.sleep(0.01)
+    assert controller.snapshot()["write"]["queued"] == 1
+    held[0]()
+    release = await waiting
+    assert release is not None
+
+    for done in (held[1], other, release):
+        done()
+    assert controller.snapshot()["write"] == {"limit": 4, "in_flight": 0, "queued": 0, "tenants": 0}
+
+
+async def test_classify_routes():
+    assert classify("POST", "/api/auth/login") == "auth"
+    assert classify("GET", "/api/conversations/") == "read"
+    assert classify("POST", "/api/conversations/123/attachments") == "upload"
+    assert classify("POST", "/api/conversations/123/messages") == "write"
+    assert classify("GET", "/healthz") is None
+    assert classify("OPTIONS", "/api/conversations/") is None
+
+
+async def test_database_cap_spans_classes_and_weighs_the_overview():
+    controller = AdmissionController(
+        {"read": 8, "write": 8}, tenant_share=1, queue_timeout_ms=50, max_queue=10, db_limit=6
+    )
+
+    overview = await controller.admit("read", "org:a", db_weight=5)
+    write = await controller.admit("write", "org:b")
+    assert overview and write
+    # Les classes ont encore de la place, mais le pool est plein.
+    assert await controller.admit("write", "org:c") is None
+    assert controller.snapshot()["db"] == {"limit": 6, "in_flight": 6, "queued": 0}
+    assert controller.snapshot()["write"]["in_flight"] == 1
+
+    overview()
+    others = [await controller.admit("read", "org:a") for _ in range(5)]
+    assert all(others)
+    for done in (write, *others):
+        done()
+    assert controller.snapshot()["db"] == {"limit": 6, "in_flight": 0, "queued": 0}
+
+
+async def test_anonymous_logins_behind_the_proxy_are_keyed_by_forwarded_client():
+    release_first = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if (b"x-forwarded-for", b"203.0.113.1") in scope["headers"]:
+            await release_first.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def login(stack, forwarded_for: str) -> int:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/auth/login",
+            "headers": [(b"x-forwarded-for", forwarded_for.encode())],
+            "client": ("172.28.0.1", 40000),
+        }
+        await stack(scope, None, send)
+        return sent[0]["status"]
+
+    def build(trusted: str):
+        controller = AdmissionController({"auth": 2}, tenant_share=0.5, queue_timeout_ms=30, max_queue=10)
+        return ProxyHeadersMiddleware(AdmissionMiddleware(app, controller), trusted_hosts=trusted)
+
+    # Passerelle de confiance : chaque client anonyme a sa propre part.
+    stack = build("127.0.0.1,172.28.0.1")
+    spammer = asyncio.create_task(login(stack, "203.0.113.1"))
+    await asyncio.sleep(0.01)
+    assert await login(stack, "203.0.113.1") == 503
+    assert await login(stack, "198.51.100.7") == 200
+
+    # Passerelle non déclarée : tous les anonymes partagent la part du proxy.
+    untrusted = build("127.0.0.1")
+    blocked = asyncio.create_task(login(untrusted, "203.0.113.1"))
+    await asyncio.sleep(0.01)
+    assert await login(untrusted, "198.51.100.7") == 503
+
+    release_first.set()
+    assert await spammer == 200 and await blocked == 200
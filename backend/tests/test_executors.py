@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.app.core.executors import OffloadRejected, Offloader, WorkClass
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_offloader_rejects_when_class_queue_is_full():
+    offloader = Offloader(
+        {"crypto": WorkClass("crypto", "thread", concurrency=1, max_waiting=1)},
+        process_workers=0,
+        thread_workers=2,
+    )
+    release = threading.Event()
+    try:
+        running = asyncio.create_task(offloader.run("crypto", release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(offloader.run("crypto", lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert offloader.waiting("crypto") == 1
+
+        with pytest.raises(OffloadRejected):
+            await offloader.run("crypto", lambda: "rejected")
+
+        release.set()
+        assert await running is True
+        assert await queued == "queued"
+        assert offloader.waiting("crypto") == 0
+    finally:
+        release.set()
+        offloader.shutdown()
+
+
+async def test_sighup_keyring_reload_goes_through_the_crypto_class(monkeypatch):
+    from backend.app.core import keyring
+
+    calls = []
+
+    async def fake_offload(work_class, fn, *args):
+        calls.append((work_class, fn))
+        if len(calls) > 1:
+            raise OffloadRejected(work_class)
+        return ["k1"]
+
+    monkeypatch.setattr(keyring, "offload", fake_offload)
+    loop = asyncio.get_running_loop()
+    await keyring._schedule_reload(loop)
+    # Pool sature : le refus est journalise, la tache ne leve pas.
+    await keyring._schedule_reload(loop)
+    assert [work_class for work_class, _ in calls] == [keyring.CRYPTO, keyring.CRYPTO]
+    assert calls[0][1] == keyring.get_keyring().reload
+    assert not keyring._reload_tasks
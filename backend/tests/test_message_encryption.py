@@ -0,0 +1,200 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+
+from backend.app.config import Settings
+from backend.app.core.blind_index import blind_tokens, highlight, normalize_words
+from backend.app.core.keyring import MessageKey, MessageKeyring
+from backend.app.core.metrics import MetricsRegistry
+from backend.app.services.conversation import ConversationService
+from backend.app.services.conversation import conversation_crypto
+from backend.app.services.conversation.conversation_crypto import DATA_KEY_SCHEME, LEGACY_SCHEME
+
+
+class WrappedKeyResult:
+    def __init__(self, rows) -> None:
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class WrappedKeySession:
+    def __init__(self, rows) -> None:
+        self.rows = rows
+        self.statements = 0
+
+    async def execute(self, stmt):
+        self.statements += 1
+        return WrappedKeyResult(self.rows)
+
+
+def _keyring(*key_ids: str) -> MessageKeyring:
+    keys = []
+    for key_id in key_ids:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        keys.append(MessageKey(key_id, private_key.public_key(), private_key))
+    return MessageKeyring(keys, active_key_id=key_ids[0])
+
+
+def _service(session, keyring: MessageKeyring) -> ConversationService:
+    service = ConversationService(session, keyring=keyring)
+    service._encryption_enabled = True
+    return service
+
+
+def _message(conversation_id, ciphertext, scheme, metadata):
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        conversation_id=conversation_id,
+        ciphertext=ciphertext,
+        encryption_scheme=scheme,
+        encryption_metadata=metadata,
+    )
+
+
+async def test_conversation_data_key_is_unwrapped_once_per_page(monkeypatch):
+    monkeypatch.setattr(conversation_crypto, "data_key_cache", conversation_crypto.DataKeyCache(16))
+    conversation_id = uuid.uuid4()
+    data_key = AESGCM.generate_key(bit_length=256)
+    session = WrappedKeySession([])
+    keyring = _keyring("k1")
+    writer = _service(session, keyring)
+
+    messages = []
+    for index in range(3):
+        ciphertext, scheme, metadata = writer._encrypt_content(
+            conversation_id=conversation_id, content=f"secret {index}", data_key=(1, data_key)
+        )
+        assert scheme == DATA_KEY_SCHEME and "enc_key" not in metadata
+        messages.append(_message(conversation_id, ciphertext, scheme, metadata))
+    legacy = _message(conversation_id, *writer._encrypt_content(conversation_id=conversation_id, content="old"))
+    assert legacy.encryption_scheme == LEGACY_SCHEME and legacy.encryption_metadata["key_id"] == "k1"
+
+    key_id, wrapped = keyring.wrap(data_key)
+    session.rows = [
+        SimpleNamespace(conversation_id=conversation_id, generation=1, encrypted_key=wrapped, wrapping_key_id=key_id)
+    ]
+    reader = _service(session, keyring)
+    await reader._prime_data_keys([*messages, legacy])
+    assert session.statements == 1
+    assert [reader._extract_plaintext(message) for message in messages] == ["secret 0", "secret 1", "secret 2"]
+    assert reader._extract_plaintext(legacy) == "old"
+
+    # Un second service du même processus trouve la clé dans le cache : aucune requête.
+    other = _service(session, keyring)
+    await other._prime_data_keys(messages)
+    assert session.statements == 1
+    assert other._extract_plaintext(messages[0]) == "secret 0"
+
+
+class NewKeyResult:
+    def first(self):
+        return None
+
+    def scalar_one_or_none(self):
+        return 1
+
+
+class NewKeySession:
+    """Aucune clé enregistrée : la génération 1 est créée par l'INSERT ... ON CONFLICT."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+
+    async def execute(self, stmt):
+        self.statements += 1
+        return NewKeyResult()
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+async def test_new_data_key_is_cached_only_after_commit(monkeypatch):
+    cache = conversation_crypto.DataKeyCache(16)
+    monkeypatch.setattr(conversation_crypto, "data_key_cache", cache)
+    conversation_id = uuid.uuid4()
+    keyring = _keyring("k1")
+
+    # Premier envoi annulé (rollback) : la clé n'a jamais été enregistrée, le processus l'oublie.
+    rolled_back = _service(NewKeySession(), keyring)
+    generation, first_key = await rolled_back._current_data_key(conversation_id)
+    assert generation == 1
+    assert await rolled_back._current_data_key(conversation_id) == (1, first_key)
+    assert cache.current(conversation_id) is None
+    assert cache.get(conversation_id, 1) is None
+
+    session = NewKeySession()
+    committed = _service(session, keyring)
+    _, key = await committed._current_data_key(conversation_id)
+    assert key != first_key and cache.current(conversation_id) is None
+    await committed.commit()
+    assert cache.current(conversation_id) == (1, key)
+
+
+def test_keyring_rotation_keeps_retired_keys_readable():
+    keyring = _keyring("old", "new")
+    key_id, wrapped = keyring.wrap(b"k" * 32)
+    assert key_id == "old"
+
+    keyring._snapshot = keyring._build(list(keyring._snapshot.keys.values()), "new")
+    assert keyring.wrap(b"x" * 32)[0] == "new"
+    assert keyring.unwrap(wrapped, "old") == b"k" * 32
+    # Données antérieures au trousseau (sans key_id) : chaque clé détenue est essayée.
+    assert keyring.unwrap(wrapped) == b"k" * 32
+
+
+async def test_large_pages_are_decrypted_on_the_thread_pool(monkeypatch):
+    monkeypatch.setattr(conversation_crypto.settings, "MESSAGE_DECRYPT_OFFLOAD_THRESHOLD", 4)
+    registry = MetricsRegistry()
+    monkeypatch.setattr(conversation_crypto, "metrics", registry)
+    conversation_id = uuid.uuid4()
+    service = _service(WrappedKeySession([]), _keyring("k1"))
+    data_key = (1, AESGCM.generate_key(bit_length=256))
+    service._data_keys[(conversation_id, 1)] = data_key[1]
+
+    def page(size):
+        return [
+            _message(conversation_id, *service._encrypt_content(conversation_id=conversation_id, content=f"m{index}", data_key=data_key))
+            for index in range(size)
+        ]
+
+    small, large = page(3), page(9)
+    assert list((await service._decrypt_messages(small)).values()) == ["m0", "m1", "m2"]
+    plaintexts = await service._decrypt_messages(large)
+    assert [plaintexts[message.id] for message in large] == [f"m{index}" for index in range(9)]
+    modes = {item["labels"]["mode"]: item["count"] for item in registry.snapshot()["distributions"]}
+    assert modes == {"inline": 1, "offload": 1}
+
+
+def test_blind_index_tokens_are_keyed_and_normalized(monkeypatch):
+    monkeypatch.setattr(conversation_crypto.settings, "MESSAGE_BLIND_INDEX_KEY", "index-secret")
+    assert normalize_words("Réunion BUDGET, réunion à 9h") == ["reunion", "budget", "9h"]
+    tokens = blind_tokens("Réunion budget")
+    assert tokens == blind_tokens("reunion BUDGET") and len(tokens) == 2
+    assert blind_tokens("reunion", key="other-secret") != blind_tokens("reunion")
+
+    service = ConversationService(WrappedKeySession([]))
+    service._blind_search = True
+    fields = service._search_fields("Réunion budget")
+    assert fields == {"search_text": None, "search_tokens": tokens}
+    clause = service._search_clause("budget")
+    assert "@>" in str(clause.compile(dialect=postgresql.dialect()))
+    assert highlight("Le budget est validé", ["BUDGET"]) == "Le <mark>budget</mark> est validé"
+    assert highlight('<img src=x onerror="alert(1)"> budget', ["budget"]) == (
+        "&lt;img src=x onerror=&quot;alert(1)&quot;&gt; <mark>budget</mark>"
+    )
+    assert highlight("<b>gras</b>", ["absent"]) == "&lt;b&gt;gras&lt;/b&gt;"
+
+
+def test_blind_search_mode_requires_an_index_key():
+    required = {"DATABASE_URL": "postgresql://u:p@localhost/x", "JWT_SECRET_KEY": "x" * 32}
+    with pytest.raises(ValidationError, match="MESSAGE_BLIND_INDEX_KEY"):
+        Settings(**required, MESSAGE_SEARCH_MODE="blind", MESSAGE_BLIND_INDEX_KEY=None)
+    assert Settings(**required, MESSAGE_SEARCH_MODE="blind", MESSAGE_BLIND_INDEX_KEY="index-secret")
@@ -0,0 +1,165 @@
+import uuid
+from types import SimpleNamespace
+
+from backend.app.models import NotificationChannel
+from backend.app.services.conversation import ConversationService
+
+
+class RecordingSession:
+    def __init__(self, events: list) -> None:
+        self.added = []
+        self.events = events
+
+    def add(self, entity) -> None:
+        self.added.append(entity)
+
+    async def commit(self) -> None:
+        self.events.append("commit")
+
+
+class RecordingBroker:
+    def __init__(self, events: list) -> None:
+        self.events = events
+
+    async def signal_outbox(self) -> None:
+        self.events.append("signal")
+
+    async def publish_user_event(self, user_id: str, payload: dict) -> None:
+        self.events.append(("user", user_id, payload))
+
+    async def publish_user_events(self, user_ids: list[str], payload: dict) -> None:
+        self.events.append(("users", list(user_ids), payload))
+
+
+class FakeUnreadCounters:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict] = {}
+
+    async def adjust(self, user_ids, conversation_id, delta):
+        values = {}
+        for user_id in user_ids:
+            if user_id in self.hashes:
+                current = self.hashes[user_id].get(str(conversation_id), 0) + delta
+                self.hashes[user_id][str(conversation_id)] = max(current, 0)
+                values[user_id] = max(current, 0)
+        return values
+
+
+async def test_push_is_enqueued_once_and_signalled_after_commit():
+    events: list = []
+    session = RecordingSession(events)
+    service = ConversationService(session, realtime_broker=RecordingBroker(events))
+    author_id = uuid.uuid4()
+    recipients = [uuid.uuid4() for _ in range(300)]
+    conversation = SimpleNamespace(id=uuid.uuid4(), organization_id=uuid.uuid4())
+
+    service._enqueue_message_push(
+        conversation=conversation,
+        payload={"id": "m1", "content": "hello", "author_display_name": "Alice"},
+        author_id=str(author_id),
+        member_user_ids=[author_id, *recipients],
+    )
+
+    assert len(session.added) == 1
+    outbox = session.added[0]
+    assert type(outbox).__tablename__ == "outbound_notifications"
+    assert outbox.channel == NotificationChannel.PUSH
+    assert outbox.payload["recipients"] == [str(uid) for uid in recipients]
+    # Identifiants seuls : aucun contenu de message au repos dans l'outbox.
+    assert outbox.payload["data"]["message_id"] == "m1"
+    assert "preview" not in outbox.payload["data"]
+    assert "hello" not in repr(outbox.payload)
+    assert events == []
+
+    await service.commit()
+    assert events == ["commit", "signal"]
+
+
+async def test_unread_deltas_update_counters_and_badges_after_commit():
+    events: list = []
+    counters = FakeUnreadCounters()
+    service = ConversationService(
+        RecordingSession(events), realtime_broker=RecordingBroker(events), unread_counters=counters
+    )
+    conversation_id = uuid.uuid4()
+    reader, other = str(uuid.uuid4()), str(uuid.uuid4())
+    counters.hashes[reader] = {str(conversation_id): 2}
+
+    service._track_unread([reader, other], conversation_id, 1)
+    service._track_unread([reader], conversation_id, -3)
+    assert events == []
+
+    await service.commit()
+    assert counters.hashes[reader] == {str(conversation_id): 0}
+    assert other not in counters.hashes
+    assert events[1] == ("users", [reader, other], {"event": "unread", "conversation_id": str(conversation_id), "delta": 1})
+    assert events[2] == (
+        "user",
+        reader,
+        {"event": "unread", "conversation_id": str(conversation_id), "delta": -3, "unread": 0},
+    )
+
+
+class StatementSession:
+    def __init__(self) -> None:
+        self.statements = []
+
+    async def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+
+
+async def test_inbox_projection_is_maintained_by_single_updates():
+    from sqlalchemy.dialects import postgresql
+
+    session = StatementSession()
+    service = ConversationService(session)
+    service._encryption_enabled = False
+    author_id, reader_id = uuid.uuid4(), uuid.uuid4()
+    message = SimpleNamespace(id=uuid.uuid4(), conversation_id=uuid.uuid4(), author_id=author_id)
+
+    await service._inbox_message_posted(message, "  hello\n world ", created_at=None)
+    await service._inbox_read(reader_id, message.conversation_id, 3)
+    await service._inbox_read(reader_id, message.conversation_id, 0)
+
+    assert len(session.statements) == 2
+    posted, read = (statement.compile(dialect=postgresql.dialect()) for statement in session.statements)
+    assert str(posted).startswith("UPDATE user_inbox SET")
+    assert "unread_count=(user_inbox.unread_count + CASE WHEN" in str(posted)
+    assert posted.params["last_message_preview"] == "hello world"
+    assert "greatest(user_inbox.unread_count - " in str(read)
+
+    # Tout marquer lu : chaque conversation décrémentée de son propre nombre, sans remise à zéro.
+    other_id = uuid.uuid4()
+    await service._inbox_read_counts(reader_id, {message.conversation_id: 2, other_id: 5})
+    read_all = session.statements[-1].compile(dialect=postgresql.dialect())
+    assert "unread_count - CASE user_inbox.conversation_id WHEN" in str(read_all)
+    assert [value for value in read_all.params.values() if value in (2, 5)] == [2, 5]
+
+    service._encryption_enabled = True
+    assert service._inbox_preview("secret") is None
+
+
+class RecordingOverviewCache:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.invalidated: list[list[str]] = []
+
+    async def invalidate(self, user_ids) -> None:
+        self.invalidated.append(list(user_ids))
+
+
+async def test_overview_snapshots_are_invalidated_after_commit():
+    events: list = []
+    cache = RecordingOverviewCache()
+    service = ConversationService(RecordingSession(events), overview_cache=cache)
+    member, other = uuid.uuid4(), uuid.uuid4()
+
+    service._invalidate_overview([member, other, member])
+    service._invalidate_unread([other])
+    assert cache.invalidated == []
+
+    await service.commit()
+    assert cache.invalidated == [[str(member), str(other)], [str(other)]]
@@ -0,0 +1,262 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from backend.app.models import MessageType
+from backend.app.services.conversation import ConversationService
+
+
+class EmptyResult:
+    def all(self):
+        return []
+
+    def scalars(self):
+        return self
+
+
+class CountingSession:
+    def __init__(self) -> None:
+        self.statements = 0
+
+    async def execute(self, stmt):
+        self.statements += 1
+        return EmptyResult()
+
+
+def _message(position: int, *, author_id: uuid.UUID, reply_to: uuid.UUID | None = None):
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        conversation_id=uuid.uuid4(),
+        author_id=author_id,
+        type=MessageType.TEXT,
+        stream_position=position,
+        ciphertext=f"message {position}".encode("utf-8"),
+        encryption_scheme="plaintext",
+        encryption_metadata={"encoding": "utf-8"},
+        is_system=False,
+        recipient_count=4,
+        delivered_count=2,
+        read_count=1,
+        created_at=datetime.now(timezone.utc),
+        edited_at=None,
+        deleted_at=None,
+        reply_to_message_id=reply_to,
+        forward_from_message_id=None,
+    )
+
+
+async def _count_statements(page_size: int) -> int:
+    session = CountingSession()
+    service = ConversationService(session)
+    viewer = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4())
+    authors = [uuid.uuid4() for _ in range(5)]
+    messages = [
+        _message(index, author_id=authors[index % len(authors)], reply_to=uuid.uuid4() if index % 3 == 0 else None)
+        for index in range(1, page_size + 1)
+    ]
+    payloads = await service.serialize_messages(messages, viewer_membership=viewer)
+    assert [payload["stream_position"] for payload in payloads] == list(range(1, page_size + 1))
+    assert payloads[0]["content"] == "message 1"
+    # Le viewer n'a pas de livraison chargee : la ligne de l'auteur (lue) s'ajoute aux compteurs.
+    assert payloads[0]["delivery_summary"] == {"total": 5, "delivered": 3, "read": 2, "pending": 2}
+    return session.statements
+
+
+async def test_serialize_messages_uses_constant_round_trips():
+    assert await _count_statements(3) == await _count_statements(200)
+
+
+def test_delivery_summary_from_counters_excludes_viewer():
+    from backend.app.models import MessageDeliveryState
+
+    service = ConversationService(CountingSession())
+    author_id = uuid.uuid4()
+    message = _message(1, author_id=author_id)
+    author_view = SimpleNamespace(id=uuid.uuid4(), user_id=author_id)
+    assert service._delivery_summary(message, author_view, None) == {
+        "total": 4,
+        "delivered": 2,
+        "read": 1,
+        "pending": 2,
+    }
+    reader_view = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4())
+    reader_delivery = SimpleNamespace(state=MessageDeliveryState.READ)
+    assert service._delivery_summary(message, reader_view, reader_delivery) == {
+        "total": 4,
+        "delivered": 2,
+        "read": 1,
+        "pending": 2,
+    }
+
+
+def test_watermark_delivery_state_from_member_positions():
+    from backend.app.models import MessageDeliveryState
+
+    service = ConversationService(CountingSession())
+    member = SimpleNamespace(
+        id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        joined_at=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        delivered_position=5,
+        read_position=3,
+    )
+    states = [service._watermark_delivery(_message(position, author_id=uuid.uuid4()), member) for position in (3, 5, 6)]
+    assert [delivery.state for delivery in states] == [
+        MessageDeliveryState.READ,
+        MessageDeliveryState.DELIVERED,
+        MessageDeliveryState.QUEUED,
+    ]
+    earlier = _message(1, author_id=uuid.uuid4())
+    late_member = SimpleNamespace(**{**vars(member), "joined_at": datetime.now(timezone.utc)})
+    assert service._watermark_delivery(earlier, late_member) is None
+
+
+async def test_mark_delivered_is_a_single_update():
+    session = CountingSession()
+    service = ConversationService(session)
+    member = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), conversation_id=uuid.uuid4())
+    messages = [_message(position, author_id=uuid.uuid4()) for position in range(1, 500)]
+    assert await service._mark_delivered(member, [message.id for message in messages], 499) == 0
+    assert session.statements == 1
+
+
+class ReturningResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class CounterSession:
+    def __init__(self, start: int) -> None:
+        self.last = start
+
+    async def execute(self, stmt):
+        increment = stmt.compile().params["last_stream_position_1"]
+        self.last += increment
+        return ReturningResult(self.last)
+
+
+async def test_reserve_stream_positions_hands_out_ranges():
+    service = ConversationService(CounterSession(41))
+    assert list(await service.reserve_stream_positions(uuid.uuid4())) == [42]
+    assert list(await service.reserve_stream_positions(uuid.uuid4(), 3)) == [43, 44, 45]
+
+
+class HotWindow:
+    def __init__(self, payloads):
+        self.payloads = payloads
+
+    async def read_page(self, conversation_id, *, limit, before=None, after=None):
+        items = self.payloads[-limit:]
+        return [dict(item) for item in items], {"next_before": 1, "next_after": len(items), "has_more_before": False, "has_more_after": False}
+
+
+async def test_hot_window_hit_only_overlays_viewer_state():
+    session = CountingSession()
+    service = ConversationService(session)
+    messages = [_message(position, author_id=uuid.uuid4()) for position in range(1, 101)]
+    neutral = [service._neutral_payload(payload) for payload in await service.serialize_messages(messages)]
+    service.message_cache = HotWindow(neutral)
+    session.statements = 0
+
+    viewer = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), conversation_id=uuid.uuid4())
+    payloads, meta = await service.list_message_payloads(uuid.uuid4(), limit=50, member=viewer)
+
+    assert [payload["stream_position"] for payload in payloads] == list(range(51, 101))
+    assert payloads[0]["delivery_state"] is None
+    # Marquage livré (un UPDATE) + overlay viewer (une requête), quel que soit le nombre de messages.
+    assert session.statements == 2
+
+
+class PostResult:
+    def __init__(self, rows=(), scalar=None) -> None:
+        self.rows = list(rows)
+        self.scalar = scalar
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return self.rows
+
+    def scalar_one_or_none(self):
+        return self.scalar
+
+    def scalars(self):
+        return self
+
+
+class PostMessageSession:
+    """Un aller-retour par execute, et au flush un INSERT par table (executemany) des objets ajoutés."""
+
+    def __init__(self, membership, conversation, members) -> None:
+        self.membership = membership
+        self.conversation = conversation
+        self.members = members
+        self.statements: list[str] = []
+        self.pending: list = []
+
+    def add(self, entity) -> None:
+        self.pending.append(entity)
+
+    def add_all(self, entities) -> None:
+        self.pending.extend(entities)
+
+    async def flush(self) -> None:
+        for entity in self.pending:
+            # Valeurs par défaut côté Python, comme l'INSERT de l'ORM.
+            for column in type(entity).__table__.columns:
+                default = column.default
+                if default is not None and default.is_callable and getattr(entity, column.key, None) is None:
+                    setattr(entity, column.key, default.arg(None))
+        for table in dict.fromkeys(type(entity).__tablename__ for entity in self.pending):
+            self.statements.append(f"INSERT INTO {table}")
+        self.pending = []
+
+    async def execute(self, stmt, *args):
+        from sqlalchemy.dialects import postgresql
+
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.statements.append(sql.split("\n")[0])
+        if sql.startswith("UPDATE conversations SET last_stream_position"):
+            return PostResult(scalar=42)
+        if sql.startswith("SELECT conversation_members.id, conversation_members.user_id"):
+            return PostResult(self.members)
+        if "JOIN conversations" in sql:
+            return PostResult([(self.membership, self.conversation)])
+        return PostResult()
+
+
+async def test_post_message_round_trips_do_not_grow_with_members():
+    from backend.app.models import Conversation, ConversationMember, ConversationType, MembershipState
+
+    async def post(member_count: int) -> list[str]:
+        author = SimpleNamespace(id=uuid.uuid4(), email="alice@example.test", profile=None)
+        conversation = Conversation(
+            id=uuid.uuid4(), organization_id=uuid.uuid4(), type=ConversationType.GROUP, extra_metadata={}
+        )
+        membership = ConversationMember(id=uuid.uuid4(), user_id=author.id, state=MembershipState.ACTIVE)
+        members = [SimpleNamespace(id=membership.id, user_id=author.id, state=MembershipState.ACTIVE, muted_until=None)]
+        members += [
+            SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), state=MembershipState.ACTIVE, muted_until=None)
+            for _ in range(member_count - 1)
+        ]
+        session = PostMessageSession(membership, conversation, members)
+        service = ConversationService(session)
+        service._encryption_enabled = False
+        service._receipts_watermark = False
+        message, payload = await service.post_message(conversation.id, author, "bonjour", MessageType.TEXT)
+        assert payload["stream_position"] == message.stream_position == 42
+        assert message.recipient_count == member_count - 1
+        # L'outbox push part au commit avec l'audit, hors du chemin mesuré.
+        assert [type(entity).__tablename__ for entity in session.pending] == ["outbound_notifications"]
+        return session.statements
+
+    statements = await post(3)
+    assert statements == await post(200)
+    # Appartenance + conversation, membres, position, message, inbox, livraisons (INSERT multi-lignes).
+    assert len(statements) == 6
+    assert statements[3] == "INSERT INTO messages"
+    assert statements[-1].startswith("INSERT INTO message_deliveries")
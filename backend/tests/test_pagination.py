@@ -0,0 +1,143 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy.dialects import postgresql
+
+from backend.app.api.routes.conversations import (
+    _apply_pagination_headers,
+    _decode_keyset_cursor,
+    _decode_message_cursor,
+)
+from backend.app.core.pagination import decode_cursor, encode_cursor
+from backend.app.services.conversation import ConversationService
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("messages", d="before", p=42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "messages") == {"d": "before", "p": 42}
+
+
+def test_cursor_kind_mismatch_is_rejected():
+    cursor = encode_cursor("search", r=0.5, id="abc")
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "messages")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor!!", "messages")
+
+
+def test_message_cursor_maps_to_bounds():
+    assert _decode_message_cursor(encode_cursor("messages", d="before", p=10)) == (10, None)
+    assert _decode_message_cursor(encode_cursor("messages", d="after", p=7)) == (None, 7)
+    with pytest.raises(HTTPException) as exc:
+        _decode_message_cursor(encode_cursor("messages", d="sideways", p=1))
+    assert exc.value.status_code == 400
+
+
+def test_pagination_headers_expose_opaque_cursors():
+    response = Response()
+    _apply_pagination_headers(
+        response,
+        {"next_before": 51, "next_after": 100, "has_more_before": True, "has_more_after": False},
+    )
+    assert response.headers["X-Pagination-Before"] == "51"
+    assert response.headers["X-Pagination-Has-Before"] == "true"
+    assert response.headers["X-Pagination-Has-After"] == "false"
+    before_cursor = response.headers["X-Pagination-Before-Cursor"]
+    assert _decode_message_cursor(before_cursor) == (51, None)
+    assert _decode_message_cursor(response.headers["X-Pagination-After-Cursor"]) == (None, 100)
+
+
+class RankedRowsSession:
+    def __init__(self, rows) -> None:
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        rows = self.rows
+        return SimpleNamespace(all=lambda: rows)
+
+
+async def test_global_search_pages_by_rank_then_id():
+    rows = [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            conversation_id=uuid.uuid4(),
+            conversation_title="Projet",
+            author_id=None,
+            author_display_name="Alice",
+            stream_position=index,
+            created_at=datetime.now(timezone.utc),
+            rank=1.0 / index,
+            snippet="\ue000budget\ue001 <img src=x onerror=alert(1)>",
+        )
+        for index in range(1, 4)
+    ]
+    session = RankedRowsSession(rows)
+    service = ConversationService(session)
+    user = SimpleNamespace(id=uuid.uuid4())
+
+    hits, next_after = await service.search_all_messages(user=user, query="budget", limit=2)
+    assert [hit["stream_position"] for hit in hits] == [1, 2]
+    assert hits[0]["snippet"] == "<mark>budget</mark> &lt;img src=x onerror=alert(1)&gt;"
+    assert next_after == (0.5, rows[1].id)
+    sql = session.statements[0]
+    assert "search_vector @@ plainto_tsquery" in sql and "ts_headline" in sql and "translate(" in sql
+    assert "to_tsvector" not in sql
+
+    await service.search_all_messages(user=user, query="budget", limit=2, after=next_after)
+    assert "(ts_rank(messages.search_vector" in session.statements[1]
+    assert ") < (" in session.statements[1]
+
+
+class ScriptedSession:
+    def __init__(self, *results) -> None:
+        self.results = list(results)
+        self.statements: list[str] = []
+
+    async def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        rows = self.results.pop(0)
+        return SimpleNamespace(all=lambda: rows, scalars=lambda: SimpleNamespace(all=lambda: rows))
+
+
+async def test_conversation_list_pages_inbox_with_capped_member_previews():
+    now = datetime.now(timezone.utc)
+    inbox_rows = [
+        SimpleNamespace(
+            UserInbox=SimpleNamespace(
+                conversation_id=conversation_id,
+                last_activity_at=now,
+                last_message_id=None,
+                last_message_preview="salut",
+                unread_count=index,
+                muted_until=None,
+                archived=False,
+            ),
+            Conversation=SimpleNamespace(id=conversation_id),
+        )
+        for index, conversation_id in enumerate([uuid.uuid4(), uuid.uuid4(), uuid.uuid4()])
+    ]
+    first = inbox_rows[0].Conversation.id
+    owner = SimpleNamespace(conversation_id=first, user_id=uuid.uuid4())
+    session = ScriptedSession(inbox_rows, [(first, 1200)], [owner])
+    service = ConversationService(session)
+    user = SimpleNamespace(id=uuid.uuid4())
+    before = _decode_keyset_cursor(encode_cursor("conversations", t=now.isoformat(), i=str(first)), "conversations")
+
+    entries, has_more = await service.list_conversations(user, limit=2, before=before)
+
+    assert has_more is True
+    assert [entry["conversation"].id for entry in entries] == [row.Conversation.id for row in inbox_rows[:2]]
+    assert entries[0]["member_count"] == 1200 and entries[0]["members"] == [owner]
+    assert entries[1]["member_count"] == 0 and entries[1]["members"] == []
+    inbox_sql, _, preview_sql = session.statements
+    assert "(user_inbox.last_activity_at, user_inbox.conversation_id) < (" in inbox_sql
+    assert "LIMIT" in inbox_sql
+    assert "row_number() OVER (PARTITION BY conversation_members.conversation_id" in preview_sql
+    with pytest.raises(HTTPException):
+        _decode_keyset_cursor(encode_cursor("members", t=now.isoformat(), i=str(first)), "conversations")
@@ -0,0 +1,156 @@
+import json
+
+import pytest
+
+from backend.app.api.ws.presence import PRESENCE_TIMEOUT_SECONDS, PresenceTracker, build_presence_payload
+from backend.app.core.redis import RealtimeBroker
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        self.calls = []
+        return results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeRedis:
+    def __init__(self):
+        self.zsets = {}
+        self.hashes = {}
+        self.published = []
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def zadd(self, key, mapping):
+        zset = self.zsets.setdefault(key, {})
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update(mapping)
+        return added
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    async def zrem(self, key, member):
+        return 1 if self.zsets.get(key, {}).pop(member, None) is not None else 0
+
+    async def zrange(self, key, start, end, withscores=False):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+
+    async def zrangebyscore(self, key, low, high, withscores=False):
+        return [(member, score) for member, score in self.zsets.get(key, {}).items() if score <= high]
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        stale = [member for member, score in zset.items() if score <= high]
+        for member in stale:
+            del zset[member]
+        return len(stale)
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        entries = dict(mapping or {})
+        if field is not None:
+            entries[field] = value
+        self.hashes.setdefault(key, {}).update(entries)
+        return len(entries)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def publish(self, channel, data):
+        self.published.append((channel, json.loads(data)))
+        return 1
+
+
+def _deltas(redis):
+    return [
+        [(user["user_id"], user["status"]) for user in message["payload"]["users"]]
+        for _, message in redis.published
+        if message["event"] == "presence:delta"
+    ]
+
+
+async def test_presence_broadcasts_only_join_and_leave_deltas():
+    redis = FakeRedis()
+    broker = RealtimeBroker(redis)
+    clock = [1000.0]
+    tracker = PresenceTracker(clock=lambda: clock[0], worker_id="w1")
+
+    snapshot = await tracker.join(broker, "c1", "alice")
+    assert snapshot["event"] == "presence:update"
+    assert snapshot["payload"]["users"][0]["status"] == "online"
+    # Deuxième appareil du même utilisateur : ni delta ni écriture de départ à sa fermeture.
+    await tracker.join(broker, "c1", "alice")
+    await tracker.leave(broker, "c1", "alice")
+    assert _deltas(redis) == [[("alice", "online")]]
+
+    await tracker.leave(broker, "c1", "alice")
+    assert _deltas(redis) == [[("alice", "online")], [("alice", "offline")]]
+    snapshot = await build_presence_payload(redis, "c1", now=clock[0])
+    assert [(user["user_id"], user["status"]) for user in snapshot["payload"]["users"]] == [("alice", "offline")]
+
+
+async def test_flush_batches_heartbeats_and_expires_crashed_entries():
+    redis = FakeRedis()
+    broker = RealtimeBroker(redis)
+    clock = [1000.0]
+    tracker = PresenceTracker(clock=lambda: clock[0], worker_id="w1")
+    await tracker.join(broker, "c1", "alice")
+    await tracker.join(broker, "c2", "alice")
+    # Entrées laissées par un worker tombé : plus aucun heartbeat (alice reste en ligne via w1).
+    redis.zsets["conversation:c1:presence"]["bob|dead"] = clock[0]
+    redis.zsets["conversation:c1:presence"]["alice|dead"] = clock[0]
+    redis.published.clear()
+
+    clock[0] += PRESENCE_TIMEOUT_SECONDS + 1
+    round_trips = redis.round_trips
+    await tracker.flush(broker)
+
+    # Un pipeline pour les heartbeats et la purge, un pour la diffusion du départ de bob.
+    assert redis.round_trips - round_trips == 2
+    assert redis.zsets["conversation:c1:presence"] == {"alice|w1": clock[0]}
+    assert redis.zsets["conversation:c2:presence"] == {"alice|w1": clock[0]}
+    assert _deltas(redis) == [[("bob", "offline")]]
+    assert "bob" in redis.hashes["conversation:c1:presence:last_seen"]
+
+
+async def test_leaving_one_worker_keeps_the_user_online_on_another():
+    redis = FakeRedis()
+    broker = RealtimeBroker(redis)
+    clock = [1000.0]
+    first = PresenceTracker(clock=lambda: clock[0], worker_id="w1")
+    second = PresenceTracker(clock=lambda: clock[0], worker_id="w2")
+
+    await first.join(broker, "c1", "alice")
+    await second.join(broker, "c1", "alice")
+    await first.leave(broker, "c1", "alice")
+    assert _deltas(redis) == [[("alice", "online")]]
+    snapshot = await build_presence_payload(redis, "c1", now=clock[0])
+    assert [(user["user_id"], user["status"]) for user in snapshot["payload"]["users"]] == [("alice", "online")]
+
+    await second.leave(broker, "c1", "alice")
+    assert _deltas(redis) == [[("alice", "online")], [("alice", "offline")]]
@@ -0,0 +1,45 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from backend.app.core import principal
+from backend.app.core.principal import PrincipalCache, SessionActivityTracker
+
+
+def test_principal_cache_expires_and_invalidates_by_session_and_user(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(principal.time, "monotonic", lambda: clock["now"])
+    now = datetime.now(timezone.utc)
+    cache = PrincipalCache(ttl_seconds=30, max_entries=10)
+    user, other = uuid.uuid4(), uuid.uuid4()
+    s1, s2, s3 = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    for session_id, owner in ((s1, user), (s2, user), (s3, other)):
+        cache.put(session_id, owner, now + timedelta(hours=1), generation=cache.generation)
+    assert cache.get(s1, now).user_id == user
+
+    cache.invalidate(user_ids=[user])
+    assert cache.get(s1, now) is None and cache.get(s2, now) is None
+    assert cache.get(s3, now) is not None
+
+    # Une lecture antérieure à l'invalidation ne doit pas être remise en cache.
+    stale_generation = cache.generation
+    monkeypatch.setattr(principal, "principal_cache", cache)
+    principal.apply_invalidation(json.dumps({"sessions": [str(s1)], "users": []}))
+    cache.put(s1, user, None, generation=stale_generation)
+    assert cache.get(s1, now) is None
+
+    clock["now"] += 31
+    assert cache.get(s3, now) is None
+    assert len(cache) == 0
+
+
+def test_session_activity_keeps_latest_touch_per_session():
+    tracker = SessionActivityTracker(interval_seconds=60)
+    session_id = uuid.uuid4()
+    first = datetime.now(timezone.utc)
+    tracker.touch(session_id, first)
+    tracker.touch(session_id, first + timedelta(seconds=5))
+
+    assert tracker.drain() == {session_id: first + timedelta(seconds=5)}
+    assert tracker.drain() == {}
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from backend.app.core.redis import PubSubHub
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakePubSub:
+    def __init__(self):
+        self.commands = []
+        self.inbox = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.commands.append(("subscribe", channel))
+
+    async def unsubscribe(self, channel):
+        self.commands.append(("unsubscribe", channel))
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        try:
+            return await asyncio.wait_for(self.inbox.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.pubsubs = []
+
+    def pubsub(self):
+        self.pubsubs.append(FakePubSub())
+        return self.pubsubs[-1]
+
+
+async def test_hub_subscribes_once_and_fans_out_to_local_listeners():
+    redis = FakeRedis()
+    hub = PubSubHub(redis, queue_size=2)
+    first, second = hub.open(), hub.open()
+    await first.add("conversation:1")
+    await second.add("conversation:1")
+    pubsub = redis.pubsubs[0]
+    assert len(redis.pubsubs) == 1
+    assert pubsub.commands == [("subscribe", "conversation:1")]
+
+    await pubsub.inbox.put({"type": "message", "channel": "conversation:1", "data": '{"event": "x"}'})
+    assert await asyncio.wait_for(first.__anext__(), 1) == ("conversation:1", '{"event": "x"}')
+    assert await asyncio.wait_for(second.__anext__(), 1) == ("conversation:1", '{"event": "x"}')
+
+    await first.close()
+    assert hub.listeners("conversation:1") == 1
+    assert ("unsubscribe", "conversation:1") not in pubsub.commands
+
+    # Abonné qui ne consomme plus : coupé au-delà de sa file.
+    for index in range(3):
+        await pubsub.inbox.put({"type": "message", "channel": "conversation:1", "data": str(index)})
+    await asyncio.sleep(0.05)
+    assert second.overflowed and second.closed
+    assert [item async for item in second] == [("conversation:1", "0"), ("conversation:1", "1")]
+
+    await second.close()
+    assert pubsub.commands[-1] == ("unsubscribe", "conversation:1")
+    await hub.close()
@@ -0,0 +1,23 @@
+from backend.app.core import storage
+from backend.app.core.storage import PresignedUrlCache
+
+
+def test_presigned_url_is_reused_until_margin_then_evicted(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(storage.time, "monotonic", lambda: clock["now"])
+    cache = PresignedUrlCache(maxsize=2, margin_seconds=60)
+
+    cache.put("a", 300, "url-a", signed_at=clock["now"])
+    clock["now"] += 200
+    assert cache.get("a", 300) == "url-a"
+    assert cache.get("a", 600) is None
+
+    clock["now"] += 41
+    assert cache.get("a", 300) is None
+
+    cache.put("a", 300, "url-a2", signed_at=clock["now"])
+    cache.put("b", 300, "url-b", signed_at=clock["now"])
+    assert cache.get("a", 300) == "url-a2"
+    cache.put("c", 300, "url-c", signed_at=clock["now"])
+    assert cache.get("b", 300) is None
+    assert cache.get("a", 300) == "url-a2"
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.app.api.ws import presence
+from backend.app.api.ws import session as ws_session
+from backend.app.api.ws.session import _conversation_id
+from backend.app.dependencies import get_realtime_broker
+
+
+def test_session_topics_and_relayed_client_events():
+    conversation_id = uuid.uuid4()
+    user_id = uuid.uuid4()
+    assert _conversation_id(f"conversation:{conversation_id}") == conversation_id
+    assert _conversation_id("conversation:not-a-uuid") is None
+    assert _conversation_id("user") is None
+
+    typing = presence.client_event(conversation_id, user_id, {"op": "publish", "event": "typing:start"})
+    assert typing["payload"]["user_id"] == str(user_id)
+    call = presence.client_event(
+        conversation_id,
+        user_id,
+        {"event": "call:offer", "payload": {"conversation_id": "spoofed", "sdp": "x"}},
+    )
+    assert call["payload"] == {"conversation_id": str(conversation_id), "from_user_id": str(user_id), "sdp": "x"}
+    assert presence.client_event(conversation_id, user_id, {"event": "message"}) is None
+
+
+class FakeSubscription:
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = set()
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+
+    async def add(self, channel):
+        self.channels.add(channel)
+
+    async def remove(self, channel):
+        self.channels.discard(channel)
+
+    async def close(self):
+        self.broker.subscriptions.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class FakeBroker:
+    redis = object()
+
+    def __init__(self):
+        self.subscriptions = []
+
+    def open_subscription(self):
+        subscription = FakeSubscription(self)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    async def deliver(self, channel, payload):
+        for subscription in self.subscriptions:
+            if channel in subscription.channels:
+                subscription.queue.put_nowait((channel, json.dumps(payload)))
+
+    async def publish_conversation(self, conversation_id, payload):
+        await self.deliver(f"conversation:{conversation_id}", payload)
+
+
+@pytest.fixture
+def session_socket(monkeypatch):
+    user_id, session_id = uuid.uuid4(), uuid.uuid4()
+    member_of = {uuid.uuid4()}
+    identity = {"value": (user_id, session_id)}
+
+    async def authenticate(token):
+        return identity["value"] if token == "good" else None
+
+    async def is_member(conversation_id, member_id):
+        return member_id == user_id and conversation_id in member_of
+
+    async def active_conversations(conversation_ids, member_id):
+        return {cid for cid in conversation_ids if cid in member_of}
+
+    async def join(broker, conversation_id, member_id):
+        return {"event": "presence:update", "conversation_id": str(conversation_id)}
+
+    async def leave(broker, conversation_id, member_id):
+        return None
+
+    monkeypatch.setattr(ws_session, "_authenticate", authenticate)
+    monkeypatch.setattr(ws_session, "_is_member", is_member)
+    monkeypatch.setattr(ws_session, "_active_conversations", active_conversations)
+    monkeypatch.setattr(presence.presence_tracker, "join", join)
+    monkeypatch.setattr(presence.presence_tracker, "leave", leave)
+    monkeypatch.setattr(ws_session.settings, "WS_SESSION_RECHECK_SECONDS", 3600)
+
+    broker = FakeBroker()
+    app = FastAPI()
+    app.include_router(ws_session.session_ws_router, prefix="/ws")
+    app.dependency_overrides[get_realtime_broker] = lambda: broker
+    return SimpleNamespace(
+        client=TestClient(app),
+        broker=broker,
+        user_id=user_id,
+        member_of=member_of,
+        identity=identity,
+        conversation_id=next(iter(member_of)),
+    )
+
+
+def test_session_socket_routes_topics_and_enforces_membership(session_socket):
+    ctx = session_socket
+    topic = f"conversation:{ctx.conversation_id}"
+    with ctx.client.websocket_connect("/ws/session?token=good") as ws:
+        assert ws.receive_json()["event"] == "ready"
+
+        stranger = f"conversation:{uuid.uuid4()}"
+        ws.send_json({"op": "subscribe", "topic": stranger, "ref": 1})
+        assert ws.receive_json() == {"event": "error", "topic": stranger, "ref": 1, "detail": "forbidden"}
+
+        ws.send_json({"op": "subscribe", "topic": topic, "ref": 2})
+        assert ws.receive_json() == {"event": "subscribed", "topic": topic, "ref": 2}
+        assert ws.receive_json()["message"]["event"] == "presence:update"
+
+        ws.send_json({"op": "publish", "topic": topic, "event": "typing:start"})
+        frame = ws.receive_json()
+        assert frame["topic"] == topic
+        assert frame["message"]["payload"]["user_id"] == str(ctx.user_id)
+
+        ws.send_json({"op": "subscribe", "topic": "user", "ref": 3})
+        assert ws.receive_json() == {"event": "subscribed", "topic": "user", "ref": 3}
+        ws.portal.call(ctx.broker.deliver, f"user:{ctx.user_id}:events", {"event": "notification"})
+        assert ws.receive_json() == {"topic": "user", "message": {"event": "notification"}}
+
+        ws.send_json({"op": "unsubscribe", "topic": topic, "ref": 4})
+        assert ws.receive_json() == {"event": "unsubscribed", "topic": topic, "ref": 4}
+        ws.portal.call(ctx.broker.publish_conversation, str(ctx.conversation_id), {"event": "message"})
+        ws.send_json({"op": "ping", "ref": 5})
+        assert ws.receive_json() == {"event": "pong", "ref": 5}
+
+
+def test_session_socket_drops_revoked_memberships_and_sessions(session_socket, monkeypatch):
+    ctx = session_socket
+    monkeypatch.setattr(ws_session.settings, "WS_SESSION_RECHECK_SECONDS", 0.02)
+    topic = f"conversation:{ctx.conversation_id}"
+    with ctx.client.websocket_connect("/ws/session?token=good") as ws:
+        ws.receive_json()
+        ws.send_json({"op": "subscribe", "topic": topic})
+        assert ws.receive_json()["event"] == "subscribed"
+        ws.receive_json()
+
+        ctx.member_of.clear()
+        assert ws.receive_json() == {"event": "error", "topic": topic, "detail": "forbidden"}
+        ws.send_json({"op": "publish", "topic": topic, "event": "typing:start"})
+        assert ws.receive_json()["detail"] == "not_subscribed"
+
+        ctx.identity["value"] = None
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 4401
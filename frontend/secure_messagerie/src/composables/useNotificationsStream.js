@@ -2,22 +2,18 @@
 // Composable: useNotificationsStream
 // Author: Valentin Masurelle
 // Date: 2025-11-26
-// Role: Gestion d'un flux WebSocket pour les notifications utilisateur (reconnexion/backoff).
+// Role: Flux des notifications utilisateur sur le topic "user" de la socket de session partagee.
 // Usage:
 //  - Appeler useNotificationsStream({ token, onNotification, onStatus }).
-//  - updateToken(nextToken) pour rafraîchir le JWT (déclenche reconnexion automatique).
-//  - connect/disconnect contrôlent manuellement la socket ; connected indique l'état.
-//  - Backoff exponentiel et reconnexion planifiée en cas de fermeture ou d'erreur réseau.
+//  - updateToken(nextToken) pour rafraîchir le JWT (la socket de session se reconnecte, l'abonnement est conserve).
+//  - connect/disconnect contrôlent manuellement l'abonnement ; connected indique l'état.
+//  - Reconnexion et backoff sont assurés par la socket de session (services/realtime).
 import { onBeforeUnmount, onMounted, ref, watch } from 'vue'
-import { buildWsUrl } from '@/utils/realtime'
+import { subscribeUserEvents } from '@/services/realtime'
 
 export function useNotificationsStream(options = {}) {
-  const socket = ref(null)
+  const subscription = ref(null)
   const connected = ref(false)
-  const reconnectTimer = ref(null)
-  const backoffStep = ref(0)
-  const baseDelay = 1500
-  const maxDelay = 20000
   const token = ref(options.token || null)
 
   const handlers = {
@@ -25,73 +21,41 @@ export function useNotificationsStream(options = {}) {
     onStatus: options.onStatus || (() => {}),
   }
 
-  function clearReconnect() {
-    if (reconnectTimer.value) {
-      clearTimeout(reconnectTimer.value)
-      reconnectTimer.value = null
-    }
-  }
-
-  function scheduleReconnect() {
-    clearReconnect()
-    const delay = Math.min(maxDelay, baseDelay * Math.pow(2, backoffStep.value))
-    reconnectTimer.value = setTimeout(connect, delay)
-    backoffStep.value = Math.min(backoffStep.value + 1, 8)
+  function setConnected(value) {
+    if (connected.value === value) return
+    connected.value = value
+    handlers.onStatus(value)
   }
 
-  function makeUrl() {
-    if (!token.value) return null
-    return buildWsUrl('notifications', { token: token.value })
+  function handleEvent(data) {
+    if (data?.event === 'notification') {
+      handlers.onNotification(data.payload || {})
+    }
   }
 
   function connect() {
-    const url = makeUrl()
-    if (!url) {
+    if (!token.value) {
       disconnect()
       return
     }
-    disconnect(false)
-    const ws = new WebSocket(url)
-    socket.value = ws
-    ws.onopen = () => {
-      connected.value = true
-      backoffStep.value = 0
-      handlers.onStatus(true)
-    }
-    ws.onclose = () => {
-      connected.value = false
-      handlers.onStatus(false)
-      scheduleReconnect()
-    }
-    ws.onerror = () => {
-      connected.value = false
-    }
-    ws.onmessage = (evt) => {
-      try {
-        const data = JSON.parse(evt.data)
-        if (data.event === 'notification') {
-          handlers.onNotification(data.payload || {})
-        }
-      } catch (err) {
-        if (import.meta.env.DEV) {
-          console.warn('[notifications] unable to parse event', err)
-        }
-      }
+    if (subscription.value) {
+      subscription.value.updateToken(token.value)
+      return
     }
+    subscription.value = subscribeUserEvents({
+      token: token.value,
+      onEvent: handleEvent,
+      onOpen: () => setConnected(true),
+      onClose: () => setConnected(false),
+    })
   }
 
-  function disconnect(clearTimer = true) {
-    if (clearTimer) clearReconnect()
-    if (socket.value) {
-      try {
-        socket.value.close()
-      } catch {
-        // ignore
-      }
-      socket.value = null
+  function disconnect() {
+    if (subscription.value) {
+      subscription.value.close()
+      subscription.value = null
     }
-    connected.value = false
-    handlers.onStatus(false)
+    setConnected(false)
   }
 
   function updateToken(nextToken) {
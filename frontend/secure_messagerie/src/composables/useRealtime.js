@@ -20,7 +20,8 @@ import { buildWsUrl } from '@/utils/realtime'
  *  - message:update     { id, ... }
  *  - message:delete     { id }
  *  - typing:start/stop  { user_id, ... }
- *  - presence:update    { users: [...] }
+ *  - presence:update    { users: [...] }  (snapshot complet, a l'ouverture ou sur demande)
+ *  - presence:delta     { users: [...] }  (arrivees/departs uniquement)
  *
  * Options d’URL:
  *  - VITE_WS_BASE = wss://api.cova.be/ws   (ou ws://localhost:8000/ws)
@@ -32,6 +33,7 @@ import { buildWsUrl } from '@/utils/realtime'
  * @param {Function} [handlers.onMessageDelete]
  * @param {Function} [handlers.onTyping]
  * @param {Function} [handlers.onPresence]
+ * @param {Function} [handlers.onPresenceDelta]
  */
 export function useRealtime(initialConversationId, handlers = {}) {
   const socket = ref(null)
@@ -144,6 +146,9 @@ export function useRealtime(initialConversationId, handlers = {}) {
           case 'presence:update':
             handlers.onPresence?.(data.payload)
             break
+          case 'presence:delta':
+            handlers.onPresenceDelta?.(data.payload)
+            break
           case 'pong': // si ton backend répond au ping
             // no-op
             break
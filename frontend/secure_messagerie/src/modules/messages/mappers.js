@@ -78,7 +78,7 @@ export function normalizeConversation(payload, { selfId, baseUrl = backendBase }
     displayName = names.join(', ')
   }
   if (!displayName) {
-    displayName = members.length > 1 ? 'Conversation' : 'Nouvelle conversation'
+    displayName = (payload.member_count ?? members.length) > 1 ? 'Conversation' : 'Nouvelle conversation'
   }
   let conversationAvatar = payload.avatar_url || null
   if (!conversationAvatar && payload.type === 'direct' && activeParticipants.length === 1) {
@@ -93,6 +93,10 @@ export function normalizeConversation(payload, { selfId, baseUrl = backendBase }
     archived: Boolean(payload.archived),
     createdAt,
     members,
+    // Nombre de membres actifs cote serveur : `members` n'est qu'un apercu borne
+    memberCount: Number.isFinite(payload.member_count)
+      ? payload.member_count
+      : members.filter((member) => member.state === 'active').length,
     participants: activeParticipants,
     displayName,
     initials: computeInitials(displayName),
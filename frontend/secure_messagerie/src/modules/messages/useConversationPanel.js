@@ -1,6 +1,6 @@
 // ===== Module Header =====
 // Module: messages/useConversationPanel
-// Role: Actions du panneau conversation (edition, invites, roles, suppression/quitte).
+// Role: Actions du panneau conversation (edition, roster pagine, invites, roles, suppression/quitte).
 // Notes:
 //  - Utilise des services conversations.* pour muter/quitter/supprimer/inviter.
 //  - Manipule des refs partages (showConversationPanel, invites, conversationForm) mais ne gere pas l'UI.
@@ -11,11 +11,14 @@ import {
   leaveConversation,
   deleteConversation,
   updateConversationMember,
+  listConversationMembers,
   listConversationInvites,
   createConversationInvite,
   revokeConversationInvite,
 } from '@/services/conversations'
-import { memberUserId } from './mappers'
+import { memberUserId, normalizeMember } from './mappers'
+
+const ROSTER_PAGE_SIZE = 50
 
 export function useConversationPanel({
   selectedConversationId,
@@ -49,6 +52,12 @@ export function useConversationPanel({
   const inviteBusy = ref(false)
   const inviteRevokeBusy = reactive({})
 
+  // ---- Roster complet (pagine) : la conversation ne porte qu'un apercu des membres ----
+  const rosterMembers = ref([])
+  const rosterCursor = ref(null)
+  const loadingRoster = ref(false)
+  let rosterRequest = 0
+
   // ---- Etats de busy pour operations membres/suppression ----
   const memberBusy = reactive({})
   const leavingConversation = ref(false)
@@ -109,9 +118,54 @@ export function useConversationPanel({
   function closeConversationPanel() {
     showConversationPanel.value = false
     invites.value = []
+    resetRoster()
     clearConversationNotice()
   }
 
+  function resetRoster() {
+    rosterRequest += 1
+    rosterMembers.value = []
+    rosterCursor.value = null
+    loadingRoster.value = false
+  }
+
+  // ---- Charge une page du roster (premiere page, ou suivante via le curseur) ----
+  async function loadConversationRoster(convId, { more = false } = {}) {
+    if (!convId) return
+    if (!more) resetRoster()
+    else if (!rosterCursor.value || loadingRoster.value) return
+    const request = ++rosterRequest
+    loadingRoster.value = true
+    try {
+      const { members, nextCursor } = await listConversationMembers(convId, {
+        cursor: more ? rosterCursor.value : null,
+        limit: ROSTER_PAGE_SIZE,
+      })
+      if (request !== rosterRequest) return
+      const page = members.map((member) => normalizeMember(member)).filter(Boolean)
+      rosterMembers.value = more ? [...rosterMembers.value, ...page] : page
+      rosterCursor.value = nextCursor
+    } catch (err) {
+      if (request !== rosterRequest) return
+      conversationInfoError.value = extractError(err, 'Impossible de charger les membres.')
+    } finally {
+      if (request === rosterRequest) loadingRoster.value = false
+    }
+  }
+
+  function loadMoreRosterMembers() {
+    return loadConversationRoster(selectedConversationId.value, { more: true })
+  }
+
+  // ---- Reporte une mise a jour de membre sur le roster et sur la conversation ----
+  function applyRosterMember(member, payload) {
+    const normalized = normalizeMember(payload)
+    if (normalized) {
+      rosterMembers.value = rosterMembers.value.map((entry) => (entry.id === normalized.id ? normalized : entry))
+    }
+    applyMemberPayload(payload, { wasActive: member.state === 'active' })
+  }
+
   async function saveConversationSettings() {
     if (!selectedConversationId.value) return
     savingConversation.value = true
@@ -263,7 +317,7 @@ export function useConversationPanel({
     clearConversationNotice()
     try {
       const data = await updateConversationMember(selectedConversationId.value, userId, { role })
-      applyMemberPayload(data)
+      applyRosterMember(member, data)
       setConversationNotice('Role du membre mis a jour.')
     } catch (err) {
       conversationInfoError.value = extractError(err, 'Impossible de mettre a jour le membre.')
@@ -281,7 +335,7 @@ export function useConversationPanel({
     const mutedUntil = new Date(Date.now() + minutes * 60000).toISOString()
     try {
       const data = await updateConversationMember(selectedConversationId.value, userId, { muted_until: mutedUntil })
-      applyMemberPayload(data)
+      applyRosterMember(member, data)
       setConversationNotice(`Membre mis en sourdine pendant ${minutes} min.`)
     } catch (err) {
       conversationInfoError.value = extractError(err, 'Impossible de mettre le membre en sourdine.')
@@ -298,7 +352,7 @@ export function useConversationPanel({
     clearConversationNotice()
     try {
       const data = await updateConversationMember(selectedConversationId.value, userId, { muted_until: null })
-      applyMemberPayload(data)
+      applyRosterMember(member, data)
       setConversationNotice('Sourdine desactivee pour ce membre.')
     } catch (err) {
       conversationInfoError.value = extractError(err, 'Impossible de retablir le membre.')
@@ -315,7 +369,7 @@ export function useConversationPanel({
     clearConversationNotice()
     try {
       const data = await updateConversationMember(selectedConversationId.value, userId, { state: 'left' })
-      applyMemberPayload(data)
+      applyRosterMember(member, data)
       setConversationNotice('Membre retire de la conversation.')
     } catch (err) {
       conversationInfoError.value = extractError(err, 'Impossible de retirer le membre.')
@@ -350,6 +404,7 @@ export function useConversationPanel({
   watch(showConversationPanel, (open) => {
     if (open) {
       syncConversationFormFromSelected()
+      loadConversationRoster(selectedConversationId.value)
       if (canManageConversation.value && selectedConversationId.value) {
         loadConversationInvites(selectedConversationId.value)
       } else {
@@ -358,6 +413,12 @@ export function useConversationPanel({
     }
   })
 
+  watch(selectedConversationId, (convId) => {
+    if (!showConversationPanel.value) return
+    if (convId) loadConversationRoster(convId)
+    else resetRoster()
+  })
+
   watch(canManageConversation, (canManage) => {
     if (!showConversationPanel.value) return
     if (canManage && selectedConversationId.value) {
@@ -375,6 +436,11 @@ export function useConversationPanel({
     conversationInfoNotice,
     invites,
     loadingInvites,
+    rosterMembers,
+    rosterCursor,
+    loadingRoster,
+    loadConversationRoster,
+    loadMoreRosterMembers,
     inviteForm,
     inviteBusy,
     inviteRevokeBusy,
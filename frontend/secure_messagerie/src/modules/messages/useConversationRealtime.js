@@ -21,6 +21,7 @@ export function useConversationRealtime({
   notifyNewIncomingMessage,
   handleRealtimeTyping,
   applyPresencePayload,
+  applyPresenceDelta,
   resetPresenceState,
   processNotificationPayload,
   isConversationMuted,
@@ -179,6 +180,9 @@ export function useConversationRealtime({
           case 'presence:update':
             applyPresencePayload(payload.payload)
             return
+          case 'presence:delta':
+            applyPresenceDelta(payload.payload)
+            return
           case 'call:offer':
           case 'call:answer':
           case 'call:candidate':
@@ -3,12 +3,16 @@
 // Role: Charge et maintient la liste des conversations + meta (unread, previews, avatars).
 // Notes:
 //  - Encapsule les appels API /conversations et /messages/unread_summary.
+//  - Liste paginee : premiere page au chargement, pages suivantes a la demande (loadMoreConversations).
 //  - expose applyConversationPatch/applyMemberPayload pour mettre a jour localement depuis d'autres modules.
 
-import { reactive, ref } from 'vue'
+import { computed, reactive, ref } from 'vue'
 import { api } from '@/utils/api'
+import { listConversationsPage } from '@/services/conversations'
 import { normalizeConversation, normalizeMember, memberUserId } from './mappers'
 
+const CONVERSATION_PAGE_SIZE = 50
+
 export function useConversationsState({
   route,
   selectConversation,
@@ -21,6 +25,9 @@ export function useConversationsState({
   const conversationMeta = reactive({})
   const loadingConversations = ref(true)
   const conversationError = ref('')
+  const conversationsCursor = ref(null)
+  const loadingMoreConversations = ref(false)
+  const hasMoreConversations = computed(() => Boolean(conversationsCursor.value))
   const unreadSummary = ref({ total: 0, conversations: [] })
 
   // ---- Initialise un container meta pour une conversation si absent ----
@@ -155,8 +162,8 @@ export function useConversationsState({
     }
   }
 
-  // ---- Met a jour/ajoute un membre dans la conversation selectionnee ----
-  function applyMemberPayload(payload) {
+  // ---- Met a jour un membre de la conversation selectionnee (apercu + nombre de membres) ----
+  function applyMemberPayload(payload, { wasActive: wasActiveHint } = {}) {
     const normalized = normalizeMember(payload)
     if (!normalized) return
     const convId = selectedConversationId.value
@@ -167,10 +174,14 @@ export function useConversationsState({
       target.members = []
     }
     const idx = target.members.findIndex((member) => member.id === normalized.id)
+    const wasActive = idx >= 0 ? target.members[idx].state === 'active' : Boolean(wasActiveHint)
+    // `members` est l'apercu borne renvoye par la liste : un membre hors apercu n'y est pas ajoute
     if (idx >= 0) {
       target.members[idx] = normalized
-    } else {
-      target.members.push(normalized)
+    }
+    const isActive = normalized.state === 'active'
+    if (wasActive !== isActive && Number.isFinite(target.memberCount)) {
+      target.memberCount = Math.max(0, target.memberCount + (isActive ? 1 : -1))
     }
     const activeMembers = target.members.filter((member) => member.state === 'active')
     const selfId = currentUserId.value ? String(currentUserId.value) : null
@@ -199,21 +210,31 @@ export function useConversationsState({
     meta.avatarUrl = null
   }
 
-  // ---- Charge toutes les conversations et initialise les metas ----
+  // ---- Ajoute une page a la liste (sans doublon si l'activite a deplace une conversation) ----
+  async function fetchConversationsPage(cursor) {
+    const page = await listConversationsPage({ cursor, limit: CONVERSATION_PAGE_SIZE })
+    const selfId = currentUserId.value
+    const list = page.conversations.map((item) => normalizeConversation(item, { selfId })).filter(Boolean)
+    const known = new Set(cursor ? conversations.value.map((conv) => conv.id) : [])
+    const fresh = list.filter((conv) => !known.has(conv.id))
+    conversations.value = cursor ? [...conversations.value, ...fresh] : fresh
+    fresh.forEach((conv) => initializeMeta(conv))
+    conversationsCursor.value = page.nextCursor
+  }
+
+  // ---- Charge la premiere page des conversations et initialise les metas ----
   async function loadConversations() {
     loadingConversations.value = true
     conversationError.value = ''
     try {
-      const { data } = await api.get('/conversations/')
-      const selfId = currentUserId.value
-      const list = Array.isArray(data)
-        ? data.map((item) => normalizeConversation(item, { selfId })).filter(Boolean)
-        : []
-      conversations.value = list
-      list.forEach((conv) => initializeMeta(conv))
-      if (!selectedConversationId.value && list.length) {
-        const initial = route.query.conversation ? String(route.query.conversation) : list[0].id
-        await selectConversation(initial)
+      await fetchConversationsPage(null)
+      const requested = route.query.conversation ? String(route.query.conversation) : null
+      // Lien direct vers une conversation plus ancienne : pages suivantes jusqu'a la trouver.
+      while (requested && conversationsCursor.value && !conversations.value.some((conv) => conv.id === requested)) {
+        await fetchConversationsPage(conversationsCursor.value)
+      }
+      if (!selectedConversationId.value && conversations.value.length) {
+        await selectConversation(requested || conversations.value[0].id)
       }
       await loadUnreadSummary()
     } catch (err) {
@@ -225,14 +246,33 @@ export function useConversationsState({
     }
   }
 
+  // ---- Page suivante (defilement de la liste ou bouton "Afficher plus") ----
+  async function loadMoreConversations() {
+    if (!conversationsCursor.value || loadingMoreConversations.value || loadingConversations.value) return
+    loadingMoreConversations.value = true
+    try {
+      await fetchConversationsPage(conversationsCursor.value)
+      applyUnreadMeta()
+    } catch (err) {
+      conversationError.value = extractError
+        ? extractError(err, "Impossible de charger plus de conversations.")
+        : "Impossible de charger plus de conversations."
+    } finally {
+      loadingMoreConversations.value = false
+    }
+  }
+
   return {
     conversations,
     conversationMeta,
     loadingConversations,
+    loadingMoreConversations,
+    hasMoreConversations,
     conversationError,
     unreadSummary,
     ensureMeta,
     loadConversations,
+    loadMoreConversations,
     loadUnreadSummary,
     setUnreadForConversation,
     markConversationAsRead,
@@ -304,6 +304,27 @@ export function usePresenceStatus({
     return OFFLINE_ENTRY
   }
 
+  // ---- Normalise une entree de presence realtime (null pour soi-meme) ----
+  function toPresenceUser(entry, convId, selfId) {
+    const userId = entry?.user_id ? String(entry.user_id) : entry?.id ? String(entry.id) : ''
+    if (!userId) return null
+    if (selfId && userId === selfId) return null
+    const baseStatus = normalizePresenceStatus(entry?.status || 'offline')
+    const member = convId ? findMemberInConversation(convId, userId) : findMemberById(userId)
+    const manualStatus = member?.statusMessage ? deriveStatusFromMessage(member.statusMessage) : null
+    const status = manualStatus || baseStatus
+    const label =
+      manualStatus && member?.statusMessage
+        ? member.statusMessage
+        : STATUS_LABELS[status] || STATUS_LABELS.offline
+    return {
+      userId,
+      status,
+      label,
+      lastSeen: entry?.last_seen ? new Date(entry.last_seen) : null,
+    }
+  }
+
   // ---- Applique un payload de presence realtime (users + last_seen) ----
   function applyPresencePayload(payload) {
     if (!payload) return
@@ -314,27 +335,7 @@ export function usePresenceStatus({
     const selfId = currentUserId.value ? String(currentUserId.value) : null
 
     const rawUsers = Array.isArray(payload.users) ? payload.users : []
-    const users = rawUsers
-      .map((entry) => {
-        const userId = entry?.user_id ? String(entry.user_id) : entry?.id ? String(entry.id) : ''
-        if (!userId) return null
-        if (selfId && userId === selfId) return null
-        const baseStatus = normalizePresenceStatus(entry?.status || 'offline')
-        const member = convId ? findMemberInConversation(convId, userId) : findMemberById(userId)
-        const manualStatus = member?.statusMessage ? deriveStatusFromMessage(member.statusMessage) : null
-        const status = manualStatus || baseStatus
-        const label =
-          manualStatus && member?.statusMessage
-            ? member.statusMessage
-            : STATUS_LABELS[status] || STATUS_LABELS.offline
-        return {
-          userId,
-          status,
-          label,
-          lastSeen: entry?.last_seen ? new Date(entry.last_seen) : null,
-        }
-      })
-      .filter(Boolean)
+    const users = rawUsers.map((entry) => toPresenceUser(entry, convId, selfId)).filter(Boolean)
     if (isCurrentConversation) {
       presenceSnapshot.value = {
         users,
@@ -362,6 +363,28 @@ export function usePresenceStatus({
     }
   }
 
+  // ---- Applique un delta de presence (arrivees/departs) sur le snapshot courant ----
+  function applyPresenceDelta(payload) {
+    if (!payload) return
+    const currentConvId = selectedConversationId.value ? String(selectedConversationId.value) : null
+    const convId = payload.conversation_id ? String(payload.conversation_id) : currentConvId
+    // Le snapshot n'est tenu que pour la conversation ouverte
+    if (!convId || convId !== currentConvId) return
+    const selfId = currentUserId.value ? String(currentUserId.value) : null
+    const changes = (Array.isArray(payload.users) ? payload.users : [])
+      .map((entry) => toPresenceUser(entry, convId, selfId))
+      .filter(Boolean)
+    if (!changes.length) return
+    const byUser = new Map((presenceSnapshot.value?.users || []).map((entry) => [entry.userId, entry]))
+    changes.forEach((entry) => byUser.set(entry.userId, entry))
+    const users = [...byUser.values()]
+    presenceSnapshot.value = {
+      users,
+      timestamp: payload.timestamp ? new Date(payload.timestamp) : new Date(),
+    }
+    setConversationPresence(convId, summarizePresenceEntries(users), 'realtime')
+  }
+
   function resetRemoteTyping() {
     Object.keys(typingTimestamps).forEach((key) => delete typingTimestamps[key])
     typingUsers.value = []
@@ -514,6 +537,7 @@ export function usePresenceStatus({
     refreshManualPresenceForAll,
     resetPresenceState,
     applyPresencePayload,
+    applyPresenceDelta,
     handleRealtimeTyping,
     cleanupRemoteTyping,
     loadAvailabilityStatus,
@@ -1,16 +1,14 @@
-// Bridge WebSocket pour convertir les evenements serveur en notifications navigateur
-import { buildWsUrl } from '@/utils/realtime'
+// Bridge temps reel (topic "user" de la socket de session) pour convertir les evenements serveur en notifications navigateur
+import { subscribeUserEvents } from '@/services/realtime'
 
 const PREF_KEY = 'notif_browser'
 
 // --- Gestion des notifications push cote navigateur ---
 class BrowserNotificationsBridge {
   constructor() {
-    // Installe les ecouteurs pour suivre token/prefs, puis ouvre un WS si possible
+    // Installe les ecouteurs pour suivre token/prefs, puis s'abonne au topic "user" si possible
     if (typeof window === 'undefined') return
-    this.socket = null
-    this.reconnectTimer = null
-    this.backoff = 0
+    this.subscription = null
     this.token = this.readToken()
     this.enabled = this.readPreference()
     window.__covaGlobalBrowserNotifications = true
@@ -62,88 +60,46 @@ class BrowserNotificationsBridge {
   }
 
   handleSessionUpdate(event) {
-    // Ouvre ou reouvre le WS lorsqu'un token change
+    // Transmet le nouveau token a la socket de session (l'abonnement est conserve)
     const nextToken = event?.detail?.token || this.readToken()
     if (nextToken === this.token) return
     this.token = nextToken
-    this.connect(true)
+    this.connect()
   }
 
   handleSessionClear() {
-    // Nettoie la connexion des que la session est supprimee
+    // Libere l'abonnement des que la session est supprimee
     this.token = null
-    this.disposeSocket()
+    this.disposeSubscription()
   }
 
-  scheduleReconnect() {
-    // Backoff exponentiel (limite a 20s) pour retenter une connexion stable
-    if (this.reconnectTimer) {
-      clearTimeout(this.reconnectTimer)
+  disposeSubscription() {
+    // Se desabonne du topic "user" (la socket de session se ferme s'il n'y a plus d'abonne)
+    if (this.subscription) {
+      this.subscription.close()
+      this.subscription = null
     }
-    if (!this.token) return
-    const baseDelay = 1500
-    const delay = Math.min(20000, baseDelay * Math.pow(2, this.backoff))
-    this.backoff = Math.min(this.backoff + 1, 8)
-    this.reconnectTimer = setTimeout(() => this.connect(true), delay)
   }
 
-  disposeSocket() {
-    // Ferme proprement la socket et annule les timers associes
-    if (this.reconnectTimer) {
-      clearTimeout(this.reconnectTimer)
-      this.reconnectTimer = null
-    }
-    if (this.socket) {
-      try {
-        this.socket.close()
-      } catch {
-        // ignore
-      }
-      this.socket = null
-    }
-  }
-
-  connect(force = false) {
-    // Etablit la connexion WS vers le pont notifications (ou force le refresh)
+  connect() {
+    // S'abonne au topic "user" ; reconnexion et backoff sont geres par la socket de session
     if (!this.token) {
-      this.disposeSocket()
+      this.disposeSubscription()
       return
     }
-    if (this.socket && !force) {
+    if (this.subscription) {
+      this.subscription.updateToken(this.token)
       return
     }
-    this.disposeSocket()
-    if (this.reconnectTimer) {
-      clearTimeout(this.reconnectTimer)
-      this.reconnectTimer = null
-    }
-    const url = new URL(buildWsUrl('notifications', { token: this.token }))
-    const ws = new WebSocket(url)
-    ws.onopen = () => {
-      this.backoff = 0
-    }
-    ws.onerror = () => {
-      ws.close()
-    }
-    ws.onclose = () => {
-      this.scheduleReconnect()
-    }
-    ws.onmessage = (event) => {
-      this.handleMessage(event)
-    }
-    this.socket = ws
+    this.subscription = subscribeUserEvents({
+      token: this.token,
+      onEvent: (data) => this.handleMessage(data),
+    })
   }
 
-  handleMessage(event) {
-    // Parse les evenements WS et redispatche un CustomEvent exploitable par l'UI
-    if (!event?.data) return
-    let data
-    try {
-      data = JSON.parse(event.data)
-    } catch {
-      return
-    }
-    if (data.event !== 'notification') return
+  handleMessage(data) {
+    // Redispatche les evenements "notification" en CustomEvent exploitable par l'UI
+    if (data?.event !== 'notification') return
     const payload = { ...(data.payload || {}), __origin: 'bridge' }
     window.dispatchEvent(new CustomEvent('cova:notification-event', { detail: payload }))
     this.maybeTriggerBrowserNotification(payload)
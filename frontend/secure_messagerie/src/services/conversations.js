@@ -77,6 +77,26 @@ export async function updateConversationMember(conversationId, memberId, payload
   return data
 }
 
+// Liste paginee (activite decroissante) : page suivante via X-Pagination-Before-Cursor
+export async function listConversationsPage({ cursor, limit = 50 } = {}) {
+  const params = cursor ? { limit, cursor } : { limit }
+  const { data, headers } = await api.get(`${CONVERSATIONS_BASE}/`, { params })
+  return {
+    conversations: Array.isArray(data) ? data : [],
+    nextCursor: headers?.['x-pagination-before-cursor'] || null,
+  }
+}
+
+// Roster complet pagine (keyset) : la liste des conversations n'embarque qu'un apercu des membres
+export async function listConversationMembers(conversationId, { cursor, limit = 100 } = {}) {
+  const params = cursor ? { limit, cursor } : { limit }
+  const { data, headers } = await api.get(`${CONVERSATIONS_BASE}/${conversationId}/members`, { params })
+  return {
+    members: Array.isArray(data) ? data : [],
+    nextCursor: headers?.['x-pagination-has-after'] === 'true' ? headers?.['x-pagination-after-cursor'] || null : null,
+  }
+}
+
 // --- Invitations ---
 export async function listConversationInvites(conversationId) {
   const { data } = await api.get(`${CONVERSATIONS_BASE}/${conversationId}/invites`)
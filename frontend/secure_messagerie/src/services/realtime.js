@@ -2,23 +2,29 @@
 import { buildWsUrl } from '@/utils/realtime'
 
 /**
- * WebSocket conversation avec:
- * - auto-reconnexion exponentielle (jusqu'à 20s)
- * - heartbeat (ping toutes 30s, timeout 15s)
- * - API identique à la version historique : createConversationSocket(convId, { token, onEvent, onOpen, onError, onClose })
+ * Socket de session multiplexee (/ws/session) partagee par tout l'onglet :
+ * - une seule connexion quel que soit le nombre de conversations suivies
+ * - topics "conversation:<id>" souscrits/desouscrits par trames de controle (re-souscrits a la reconnexion)
+ * - topic "user" : notifications de l'utilisateur (remplace /ws/notifications), voir subscribeUserEvents
+ * - changement de token : reconnexion sur la meme instance, les abonnes sont conserves (onClose puis onOpen)
+ * - auto-reconnexion exponentielle (jusqu'à 20s) et heartbeat (ping toutes 30s, timeout 15s)
  *
- * Retourne un objet compatible WebSocket pour .close() et expose .send(data) en plus.
+ * createConversationSocket(convId, { token, onEvent, onOpen, onError, onClose }) garde l'API historique :
+ * l'objet retourne expose .send(data) et .close(), mais s'appuie sur la socket de session.
  */
-export function createConversationSocket(conversationId, { token, onEvent, onOpen, onError, onClose } = {}) {
-  // Point d'entree unique pour ouvrir une socket conversation avec reconnexion/heartbeat
-  const url = new URL(buildWsUrl(`conversations/${conversationId}`, token ? { token } : undefined))
+export function createSessionSocket({ token } = {}) {
+  let currentToken = token || null
+  let url = makeSessionUrl(currentToken)
 
   // Etat runtime de la socket
   let socket = null
   let closedManually = false
+  // topic -> Set des abonnes { onEvent, onOpen, onError, onClose }
+  const topics = new Map()
 
   // Parametrage de la reco exponentielle
   let retry = 0
+  let reconnectTimer = null
   const minDelay = 800
   const maxDelay = 20000
 
@@ -28,9 +34,34 @@ export function createConversationSocket(conversationId, { token, onEvent, onOpe
   const HEARTBEAT_INTERVAL = 30000 // 30s
   const HEARTBEAT_DEADLINE = 15000 // 15s
 
+  function isOpen() {
+    return socket && socket.readyState === WebSocket.OPEN
+  }
+
+  function sendFrame(frame) {
+    if (!isOpen()) return
+    try {
+      socket.send(JSON.stringify(frame))
+    } catch {
+      // silencieux
+    }
+  }
+
+  function notify(topic, callback, ...args) {
+    // Topic sans abonne (ex. "user", toujours relaye par le serveur) : rien a transmettre
+    if (topic && !topics.has(topic)) return
+    const targets = topic ? [...topics.get(topic)] : [...topics.values()].flatMap((set) => [...set])
+    targets.forEach((listener) => {
+      try {
+        listener[callback] && listener[callback](...args)
+      } catch (err) {
+        console.warn('Realtime listener failed', err)
+      }
+    })
+  }
+
   // --- Gestion du heartbeat ---
   function clearHeartbeat() {
-    // Coupe les timers pour eviter les faux positifs lors des reconnections
     if (heartbeatTimer) {
       clearInterval(heartbeatTimer)
       heartbeatTimer = null
@@ -42,15 +73,10 @@ export function createConversationSocket(conversationId, { token, onEvent, onOpe
   }
 
   function startHeartbeat() {
-    // Envoie periodiquement un ping et ferme si aucun pong n'arrive avant la deadline
     clearHeartbeat()
     heartbeatTimer = setInterval(() => {
-      if (!socket || socket.readyState !== WebSocket.OPEN) return
-      try {
-        socket.send(JSON.stringify({ event: 'ping' }))
-      } catch {
-        // silencieux
-      }
+      if (!isOpen()) return
+      sendFrame({ op: 'ping' })
       heartbeatTimeout = setTimeout(() => {
         try {
           socket.close()
@@ -62,73 +88,220 @@ export function createConversationSocket(conversationId, { token, onEvent, onOpe
   }
 
   function handleMessage(evt) {
-    // Parse le payload JSON et transmet a l'abonne en fournissant l'event brut
     if (heartbeatTimeout) {
       clearTimeout(heartbeatTimeout)
       heartbeatTimeout = null
     }
-
-    if (!onEvent) return
+    let frame
     try {
-      const payload = JSON.parse(evt.data)
-      onEvent(payload, evt)
+      frame = JSON.parse(evt.data)
     } catch (err) {
       console.warn('Unable to parse realtime payload', err)
+      return
+    }
+    if (!frame || typeof frame !== 'object') return
+    // Evenement publie sur un topic : on transmet le message d'origine aux abonnes du topic
+    if (frame.topic && frame.message !== undefined) {
+      notify(frame.topic, 'onEvent', frame.message, evt)
+      return
+    }
+    switch (frame.event) {
+      case 'subscribed':
+        notify(frame.topic, 'onEvent', { event: 'ready', conversation_id: conversationIdOf(frame.topic) }, evt)
+        return
+      case 'error':
+        if (frame.topic) notify(frame.topic, 'onError', frame)
+        return
+      default:
+        return
     }
   }
 
   // --- Connexion / reconnexion ---
   function connect() {
-    // (Re)ouverture de la socket avec callbacks et backoff exponentiel
+    reconnectTimer = null
     if (closedManually) return
 
-    socket = new WebSocket(url.toString())
+    const ws = new WebSocket(url.toString())
+    socket = ws
 
-    socket.addEventListener('open', () => {
+    ws.addEventListener('open', () => {
+      if (socket !== ws) return
       retry = 0
       startHeartbeat()
-      onOpen && onOpen()
+      topics.forEach((_, topic) => sendFrame({ op: 'subscribe', topic }))
+      notify(null, 'onOpen')
     })
 
-    socket.addEventListener('message', handleMessage)
+    ws.addEventListener('message', (evt) => {
+      if (socket === ws) handleMessage(evt)
+    })
 
-    socket.addEventListener('error', (e) => {
-      onError && onError(e)
+    ws.addEventListener('error', (e) => {
+      if (socket === ws) notify(null, 'onError', e)
     })
 
-    socket.addEventListener('close', () => {
+    ws.addEventListener('close', () => {
+      // Socket remplacee (changement de token) : la nouvelle connexion est deja en cours
+      if (socket !== ws) return
       clearHeartbeat()
-      onClose && onClose()
+      notify(null, 'onClose')
       if (closedManually) return
       const delay = Math.min(maxDelay, Math.floor(minDelay * Math.pow(2, retry++)))
-      setTimeout(connect, delay)
+      reconnectTimer = setTimeout(connect, delay)
     })
   }
 
-  connect()
+  // Nouveau token : on rouvre la connexion tout de suite, topics et abonnes sont conserves
+  function updateToken(nextToken) {
+    const trimmed = nextToken || null
+    if (trimmed === currentToken) return
+    currentToken = trimmed
+    url = makeSessionUrl(trimmed)
+    if (closedManually || !socket) return
+    const previous = socket
+    socket = null
+    clearHeartbeat()
+    if (reconnectTimer) {
+      clearTimeout(reconnectTimer)
+      reconnectTimer = null
+    }
+    try {
+      previous.close()
+    } catch {
+      // silencieux
+    }
+    notify(null, 'onClose')
+    retry = 0
+    connect()
+  }
 
-  // Interface exposee: mimique WebSocket avec helpers pour close/send/raw
-  return {
-    send(data) {
+  function close(code, reason) {
+    closedManually = true
+    clearHeartbeat()
+    if (reconnectTimer) {
+      clearTimeout(reconnectTimer)
+      reconnectTimer = null
+    }
+    const listeners = [...topics.values()].flatMap((set) => [...set])
+    topics.clear()
+    // Fermeture explicite : les abonnes encore presents sont prevenus (la socket ne leur enverra plus rien)
+    listeners.forEach((listener) => {
       try {
-        if (socket && socket.readyState === WebSocket.OPEN) {
-          socket.send(typeof data === 'string' ? data : JSON.stringify(data))
-        }
-      } catch {
-        // silencieux
+        listener.onClose && listener.onClose()
+      } catch (err) {
+        console.warn('Realtime listener failed', err)
       }
+    })
+    try {
+      socket && socket.close(code, reason)
+    } catch {
+      // silencieux
+    }
+  }
+
+  return {
+    get token() {
+      return currentToken
     },
-    close(code, reason) {
-      closedManually = true
-      clearHeartbeat()
-      try {
-        socket && socket.close(code, reason)
-      } catch {
-        // silencieux
+    updateToken,
+    get closed() {
+      return closedManually
+    },
+    // Ajoute un abonne au topic ; retourne la fonction de desabonnement
+    subscribe(topic, listener) {
+      let listeners = topics.get(topic)
+      if (!listeners) {
+        listeners = new Set()
+        topics.set(topic, listeners)
+        if (!socket) connect()
+        else sendFrame({ op: 'subscribe', topic })
+      }
+      listeners.add(listener)
+      if (isOpen()) {
+        listener.onOpen && listener.onOpen()
       }
+      return () => {
+        const current = topics.get(topic)
+        if (!current) return
+        current.delete(listener)
+        if (current.size) return
+        topics.delete(topic)
+        sendFrame({ op: 'unsubscribe', topic })
+        // Plus aucun topic suivi : la socket est liberee
+        if (!topics.size) close()
+      }
+    },
+    publish(topic, data) {
+      const frame = typeof data === 'string' ? JSON.parse(data) : { ...data }
+      sendFrame({ ...frame, op: 'publish', topic })
     },
+    close,
     get raw() {
       return socket
     },
   }
 }
+
+function makeSessionUrl(token) {
+  return new URL(buildWsUrl('session', token ? { token } : undefined))
+}
+
+function conversationIdOf(topic) {
+  return typeof topic === 'string' && topic.startsWith('conversation:') ? topic.slice('conversation:'.length) : null
+}
+
+// Socket de session courante de l'onglet (reconnectee avec le nouveau token si celui-ci change)
+let sharedSession = null
+
+function getSessionSocket(token) {
+  if (!sharedSession || sharedSession.closed) {
+    sharedSession = createSessionSocket({ token })
+  } else if (sharedSession.token !== (token || null)) {
+    sharedSession.updateToken(token)
+  }
+  return sharedSession
+}
+
+/**
+ * Abonnement au topic "user" de la socket de session (notifications de l'utilisateur).
+ * Retourne { updateToken(token), close() } ; onEvent recoit les evenements publies tels quels.
+ */
+export function subscribeUserEvents({ token, onEvent, onOpen, onError, onClose } = {}) {
+  let unsubscribe = getSessionSocket(token).subscribe('user', { onEvent, onOpen, onError, onClose })
+
+  return {
+    // La socket partagee se reconnecte avec le nouveau token ; l'abonnement est conserve
+    updateToken(nextToken) {
+      if (unsubscribe) getSessionSocket(nextToken)
+    },
+    close() {
+      if (unsubscribe) {
+        unsubscribe()
+        unsubscribe = null
+      }
+    },
+  }
+}
+
+export function createConversationSocket(conversationId, { token, onEvent, onOpen, onError, onClose } = {}) {
+  // Point d'entree historique : un "socket" conversation = un topic sur la socket de session
+  const topic = `conversation:${conversationId}`
+  const session = getSessionSocket(token)
+  let unsubscribe = session.subscribe(topic, { onEvent, onOpen, onError, onClose })
+
+  return {
+    send(data) {
+      session.publish(topic, data)
+    },
+    close() {
+      if (unsubscribe) {
+        unsubscribe()
+        unsubscribe = null
+      }
+    },
+    get raw() {
+      return session.raw
+    },
+  }
+}